@@ -21,4 +21,7 @@ setup(
 
     py_modules=['xheap'],
     install_requires=[],
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
@@ -2,11 +2,36 @@
 
 from __future__ import unicode_literals
 
+import os
+import pickle
 import re
+import tempfile
+import threading
 import unittest
+from itertools import islice
 from string import ascii_uppercase, ascii_lowercase, digits, punctuation
 
-from xheap import Heap, InvalidHeapError, OrderHeap, RemovalHeap, XHeap
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = ThreadPoolExecutor = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from xheap import ArrayHeap, AsyncXHeap, BoundedHeap, CompactHeap, ConcurrentXHeap, DaryHeap, ExternalHeap, Heap, IndexHeap, InvalidHeapError, MaxHeap, OrderHeap, PairingHeap, RemovalHeap, ShardedXHeap, TimerHeap, XHeap, merge_iter
 
 
 class HeapBaseTestCase(unittest.TestCase):
@@ -21,6 +46,12 @@ class HeapBaseTestCase(unittest.TestCase):
             self.assertNotIn(item, heap)
         self.assertEqual(len(expected_set), len(heap))
 
+    def snapshot_path(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        return path
+
 
 class HeapTestCase(HeapBaseTestCase):
 
@@ -55,6 +86,14 @@ class HeapTestCase(HeapBaseTestCase):
             self.assertHeap(wanted, not_wanted, heap)
         self.assertHeap(ascii_uppercase, [], heap)
 
+    def test_push_many(self):
+        heap = Heap(ascii_uppercase)
+        heap.push_many('abc')
+        self.assertHeap(ascii_uppercase + 'abc', [], heap)
+        heap.push_many(ascii_lowercase[3:] + digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('0', heap.peek())
+
     def test_pop(self):
         heap = Heap(reversed(ascii_uppercase))
         wanted = set(ascii_uppercase)
@@ -68,6 +107,20 @@ class HeapTestCase(HeapBaseTestCase):
             sorted_items.append(c)
         self.assertHeap([], ascii_uppercase, heap)
 
+    def test_pop_many(self):
+        heap = Heap(reversed(ascii_uppercase))
+        self.assertSequenceEqual(list('ABC'), heap.pop_many(3))
+        self.assertHeap(ascii_uppercase[3:], 'ABC', heap)
+        self.assertSequenceEqual(list(ascii_uppercase[3:20]), heap.pop_many(17))
+        self.assertHeap(ascii_uppercase[20:], ascii_uppercase[:20], heap)
+        self.assertSequenceEqual(list(ascii_uppercase[20:]), heap.pop_many(100))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_drain(self):
+        heap = Heap(reversed(ascii_uppercase))
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.drain()))
+        self.assertHeap([], ascii_uppercase, heap)
+
     def test_poppush(self):
         heap = Heap(reversed(ascii_uppercase))
         wanted = set(ascii_uppercase)
@@ -111,11 +164,274 @@ class HeapTestCase(HeapBaseTestCase):
         heap = Heap(reversed(ascii_uppercase))
         self.assertRaises(NotImplementedError, heap.remove, 'A')
 
+    def test_merge(self):
+        heap = Heap(ascii_uppercase)
+        other = Heap(ascii_lowercase)
+        heap.merge(other)
+        self.assertHeap(ascii_uppercase + ascii_lowercase, [], heap)
+        self.assertHeap(ascii_lowercase, [], other)
+        heap |= RemovalHeap(digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('0', heap.peek())
+
+    def test_iter_sorted(self):
+        heap = Heap(reversed(ascii_uppercase))
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.iter_sorted()))
+        self.assertSequenceEqual(list('ABC'), list(islice(heap.iter_sorted(), 3)))
+        self.assertHeap(ascii_uppercase, [], heap)
+        self.assertSequenceEqual([], list(Heap().iter_sorted()))
+
+    def test_nsmallest(self):
+        heap = Heap(reversed(ascii_uppercase))
+        self.assertSequenceEqual(list('ABC'), heap.nsmallest(3))
+        self.assertSequenceEqual(list(ascii_uppercase), heap.nsmallest(100))
+        self.assertSequenceEqual([], heap.nsmallest(0))
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_pickle(self):
+        heap = Heap(reversed(ascii_uppercase))
+        restored_heap = pickle.loads(pickle.dumps(heap, pickle.HIGHEST_PROTOCOL))
+        self.assertIs(Heap, type(restored_heap))
+        self.assertEqual(list(heap), list(restored_heap))
+        self.assertHeap(ascii_uppercase, [], restored_heap)
+
+    def test_snapshot_restore(self):
+        path = self.snapshot_path()
+        heap = Heap([0.5, 2.5, 1.5])
+        heap.snapshot(path)
+        restored_heap = Heap.restore(path)
+        self.assertEqual(list(heap), list(restored_heap))
+        self.assertEqual([0.5, 1.5, 2.5], list(restored_heap.drain()))
+        heap = Heap([2**70, 1])
+        heap.snapshot(path)
+        self.assertEqual([1, 2**70], list(Heap.restore(path).drain()))
+
     def test_repr(self):
         heap = Heap(reversed(ascii_uppercase))
         self.assertHeap(heap, [], eval(repr(heap)))
 
 
+class MaxHeapTestCase(HeapBaseTestCase):
+
+    def test_init(self):
+        self.assertHeap([], [], MaxHeap())
+        self.assertHeap([], [], MaxHeap([]))
+        self.assertHeap(ascii_uppercase, [], MaxHeap(ascii_uppercase))
+
+    def test_check(self):
+        MaxHeap().check()
+        MaxHeap(ascii_uppercase).check()
+        MaxHeap(reversed(ascii_uppercase)).check()
+
+    def test_check_variant_invalid(self):
+        heap = MaxHeap(range(100))
+        heap[3] = -1
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_peek(self):
+        heap = MaxHeap(ascii_uppercase)
+        self.assertEqual('Z', heap.peek())
+        self.assertEqual('Z', heap[0])
+
+    def test_push(self):
+        heap = MaxHeap()
+        wanted = set()
+        not_wanted = set(ascii_uppercase)
+        for c in ascii_uppercase:
+            heap.push(c)
+            wanted.add(c)
+            not_wanted.remove(c)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_push_many(self):
+        heap = MaxHeap(ascii_uppercase)
+        heap.push_many('abc')
+        self.assertHeap(ascii_uppercase + 'abc', [], heap)
+        heap.push_many(ascii_lowercase[3:] + digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('z', heap.peek())
+
+    def test_pop(self):
+        heap = MaxHeap(ascii_uppercase)
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for c in reversed(ascii_uppercase):
+            self.assertEqual(c, heap.pop())
+            wanted.remove(c)
+            not_wanted.add(c)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_pop_many(self):
+        heap = MaxHeap(ascii_uppercase)
+        self.assertSequenceEqual(list('ZYX'), heap.pop_many(3))
+        self.assertHeap(ascii_uppercase[:-3], 'XYZ', heap)
+        self.assertSequenceEqual(list(reversed(ascii_uppercase[6:-3])), heap.pop_many(17))
+        self.assertHeap(ascii_uppercase[:6], ascii_uppercase[6:], heap)
+        self.assertSequenceEqual(list(reversed(ascii_uppercase[:6])), heap.pop_many(100))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_drain(self):
+        heap = MaxHeap(ascii_uppercase)
+        self.assertSequenceEqual(list(reversed(ascii_uppercase)), list(heap.drain()))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_poppush(self):
+        heap = MaxHeap(ascii_lowercase)
+        wanted = set(ascii_lowercase)
+        not_wanted = set()
+        for u, l in reversed(list(zip(ascii_uppercase, ascii_lowercase))):
+            self.assertEqual(l, heap.poppush(u))
+            wanted.add(u)
+            wanted.remove(l)
+            not_wanted.add(l)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_uppercase, ascii_lowercase, heap)
+
+    def test_pushpop_on_empty_heap(self):
+        self.assertEqual('A', MaxHeap().pushpop('A'))
+
+    def test_pushpop(self):
+        heap = MaxHeap(ascii_lowercase)
+        wanted = set(ascii_lowercase)
+        not_wanted = set()
+        for u, l in reversed(list(zip(ascii_uppercase, ascii_lowercase))):
+            self.assertEqual(l, heap.pushpop(u))
+            wanted.add(u)
+            wanted.remove(l)
+            not_wanted.add(l)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_uppercase, ascii_lowercase, heap)
+        self.assertEqual('z', heap.pushpop('z'))
+
+    def test_remove_not_implemented(self):
+        heap = MaxHeap(ascii_uppercase)
+        self.assertRaises(NotImplementedError, heap.remove, 'A')
+
+    def test_iter_sorted(self):
+        heap = MaxHeap(ascii_uppercase)
+        self.assertSequenceEqual(list(reversed(ascii_uppercase)), list(heap.iter_sorted()))
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_nsmallest(self):
+        self.assertSequenceEqual(list('ZYX'), MaxHeap(ascii_uppercase).nsmallest(3))
+
+    def test_repr(self):
+        heap = MaxHeap(ascii_uppercase)
+        self.assertHeap(heap, [], eval(repr(heap)))
+
+
+class DaryHeapTestCase(HeapBaseTestCase):
+
+    def test_init(self):
+        self.assertHeap([], [], DaryHeap())
+        self.assertHeap([], [], DaryHeap([]))
+        for arity in (2, 3, 4, 8):
+            self.assertHeap(ascii_uppercase, [], DaryHeap(reversed(ascii_uppercase), arity=arity))
+
+    def test_init_error(self):
+        self.assertRaises(RuntimeError, DaryHeap, ascii_uppercase, arity=1)
+
+    def test_check_variant_invalid(self):
+        heap = DaryHeap(range(100))
+        heap[3] = 10000
+        self.assertRaises(InvalidHeapError, heap.check)
+        heap = DaryHeap(range(100))
+        heap[4] = 10000
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_peek(self):
+        heap = DaryHeap(reversed(ascii_uppercase))
+        self.assertEqual('A', heap.peek())
+
+    def test_push(self):
+        for arity in (2, 3, 4, 8):
+            heap = DaryHeap(arity=arity)
+            wanted = set()
+            not_wanted = set(ascii_uppercase)
+            for c in reversed(ascii_uppercase):
+                heap.push(c)
+                wanted.add(c)
+                not_wanted.remove(c)
+                self.assertHeap(wanted, not_wanted, heap)
+            self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_push_many(self):
+        heap = DaryHeap(ascii_uppercase)
+        heap.push_many('abc')
+        self.assertHeap(ascii_uppercase + 'abc', [], heap)
+        heap.push_many(ascii_lowercase[3:] + digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('0', heap.peek())
+
+    def test_pop(self):
+        for arity in (2, 3, 4, 8):
+            heap = DaryHeap(reversed(ascii_uppercase), arity=arity)
+            wanted = set(ascii_uppercase)
+            not_wanted = set()
+            for c in ascii_uppercase:
+                self.assertEqual(c, heap.pop())
+                wanted.remove(c)
+                not_wanted.add(c)
+                self.assertHeap(wanted, not_wanted, heap)
+            self.assertHeap([], ascii_uppercase, heap)
+
+    def test_pop_many(self):
+        heap = DaryHeap(reversed(ascii_uppercase))
+        self.assertSequenceEqual(list('ABC'), heap.pop_many(3))
+        self.assertHeap(ascii_uppercase[3:], 'ABC', heap)
+        self.assertSequenceEqual(list(ascii_uppercase[3:20]), heap.pop_many(17))
+        self.assertHeap(ascii_uppercase[20:], ascii_uppercase[:20], heap)
+        self.assertSequenceEqual(list(ascii_uppercase[20:]), heap.pop_many(100))
+
+    def test_drain(self):
+        heap = DaryHeap(reversed(ascii_uppercase), arity=3)
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.drain()))
+
+    def test_poppush(self):
+        heap = DaryHeap(reversed(ascii_uppercase))
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for u, l in zip(ascii_uppercase, ascii_lowercase):
+            self.assertEqual(u, heap.poppush(l))
+            wanted.add(l)
+            wanted.remove(u)
+            not_wanted.add(u)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_lowercase, ascii_uppercase, heap)
+
+    def test_pushpop_on_empty_heap(self):
+        self.assertEqual('A', DaryHeap().pushpop('A'))
+
+    def test_pushpop(self):
+        heap = DaryHeap(reversed(ascii_uppercase))
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for u, l in zip(ascii_uppercase, ascii_lowercase):
+            self.assertEqual(u, heap.pushpop(l))
+            wanted.add(l)
+            wanted.remove(u)
+            not_wanted.add(u)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_lowercase, ascii_uppercase, heap)
+
+    def test_merge(self):
+        heap = DaryHeap(ascii_uppercase)
+        heap |= Heap(ascii_lowercase)
+        self.assertHeap(ascii_uppercase + ascii_lowercase, [], heap)
+
+    def test_iter_sorted(self):
+        heap = DaryHeap(reversed(ascii_uppercase), arity=3)
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.iter_sorted()))
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_repr(self):
+        heap = DaryHeap(reversed(ascii_uppercase), arity=3)
+        self.assertHeap(heap, [], eval(repr(heap)))
+        self.assertEqual(3, eval(repr(heap)).arity)
+
+
 class OrderHeapTestCase(HeapBaseTestCase):
 
     @staticmethod
@@ -156,6 +472,23 @@ class OrderHeapTestCase(HeapBaseTestCase):
             self.assertHeap(wanted, not_wanted, heap)
         self.assertHeap(ascii_uppercase, [], heap)
 
+    def test_push_many(self):
+        heap = OrderHeap(ascii_uppercase, key=self.key)
+        heap.push_many('abc')
+        self.assertHeap(ascii_uppercase + 'abc', [], heap)
+        heap.push_many(ascii_lowercase[3:] + digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('z', heap.peek())
+
+    @unittest.skipIf(ThreadPoolExecutor is None, 'concurrent.futures not installed')
+    def test_executor(self):
+        items = (ascii_uppercase + ascii_lowercase) * 100
+        with ThreadPoolExecutor(2) as executor:
+            heap = OrderHeap(items, key=self.key, stable=True, executor=executor)
+            self.assertEqual(OrderHeap(items, key=self.key, stable=True)[:], heap[:])
+            heap.push_many(digits * 1000)
+        self.assertEqual(list(heap.drain()), sorted(items + digits * 1000, key=self.key))
+
     def test_pop(self):
         heap = OrderHeap(reversed(ascii_uppercase), key=self.key)
         wanted = set(ascii_uppercase)
@@ -170,6 +503,20 @@ class OrderHeapTestCase(HeapBaseTestCase):
         self.assertSequenceEqual(list(reversed(ascii_uppercase)), sorted_items)
         self.assertHeap([], ascii_uppercase, heap)
 
+    def test_pop_many(self):
+        heap = OrderHeap(ascii_uppercase, key=self.key)
+        self.assertSequenceEqual(list('ZYX'), heap.pop_many(3))
+        self.assertHeap(ascii_uppercase[:-3], 'XYZ', heap)
+        self.assertSequenceEqual(list(reversed(ascii_uppercase[6:-3])), heap.pop_many(17))
+        self.assertHeap(ascii_uppercase[:6], ascii_uppercase[6:], heap)
+        self.assertSequenceEqual(list(reversed(ascii_uppercase[:6])), heap.pop_many(100))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_drain(self):
+        heap = OrderHeap(ascii_uppercase, key=self.key)
+        self.assertSequenceEqual(list(reversed(ascii_uppercase)), list(heap.drain()))
+        self.assertHeap([], ascii_uppercase, heap)
+
     def test_poppush(self):
         heap = OrderHeap(reversed(ascii_lowercase), key=self.key)
         wanted = set(ascii_lowercase)
@@ -213,6 +560,81 @@ class OrderHeapTestCase(HeapBaseTestCase):
         heap = OrderHeap(reversed(ascii_uppercase), key=self.key)
         self.assertRaises(NotImplementedError, heap.remove, 'A')
 
+    def test_stable(self):
+        items = [object() for _ in range(10)]
+        heap = OrderHeap(items[:5], key=lambda item: items.index(item) % 2, stable=True)
+        heap.push_many(items[5:8])
+        heap.push(items[8])
+        self.assertIs(items[0], heap.pushpop(items[9]))
+        self.assertSequenceEqual([items[2], items[4], items[6], items[8], items[1], items[3], items[5], items[7], items[9]], list(heap.drain()))
+
+    def test_membership(self):
+        heap = OrderHeap('ABC', key=self.key, membership=True)
+        self.assertIn('A', heap)
+        self.assertNotIn('D', heap)
+        heap.push('D')
+        heap.push_many('EF')
+        self.assertEqual('F', heap.pop())
+        self.assertNotIn('F', heap)
+        self.assertEqual('E', heap.poppush('a'))
+        self.assertEqual('a', heap.pushpop('Z'))
+        self.assertHeap('ABCDZ', 'Ea', heap)
+        self.assertSequenceEqual(list('ZDC'), heap.pop_many(3))
+        self.assertHeap('AB', 'CDZ', heap)
+        self.assertSequenceEqual(list('BA'), list(heap.drain()))
+        self.assertHeap([], 'AB', heap)
+
+    def test_membership_duplicates(self):
+        heap = OrderHeap('AAB', key=self.key, membership=True)
+        self.assertEqual('B', heap.pop())
+        self.assertEqual('A', heap.pop())
+        self.assertIn('A', heap)
+        self.assertEqual('A', heap.pop())
+        self.assertNotIn('A', heap)
+
+    def test_merge(self):
+        heap = OrderHeap(ascii_uppercase, key=self.key, membership=True)
+        heap.merge(OrderHeap(ascii_lowercase, key=self.key))
+        self.assertHeap(ascii_uppercase + ascii_lowercase, [], heap)
+        heap |= XHeap(digits, key=ord)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('z', heap.peek())
+
+    def test_merge_stable(self):
+        items = [object() for _ in range(4)]
+        heap = OrderHeap(items[:2], key=lambda item: 0, stable=True)
+        other = OrderHeap(items[2:], key=heap.key, stable=True)
+        heap |= other
+        self.assertSequenceEqual(items, list(heap.drain()))
+
+    def test_iter_sorted(self):
+        heap = OrderHeap(ascii_uppercase, key=self.key)
+        self.assertSequenceEqual(list(reversed(ascii_uppercase)), list(heap.iter_sorted()))
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_pickle(self):
+        heap = OrderHeap(ascii_uppercase, key=self.key, stable=True, membership=True)
+        restored_heap = pickle.loads(pickle.dumps(heap, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(heap[:], restored_heap[:])
+        heap.push('a')
+        restored_heap.push('a')
+        self.assertEqual(heap[:], restored_heap[:])
+        self.assertIn('a', restored_heap)
+        self.assertEqual(heap.pop_many(27), restored_heap.pop_many(27))
+
+    def test_snapshot_restore(self):
+        path = self.snapshot_path()
+        key_calls = []
+        key = lambda item: key_calls.append(item) or -ord(item)
+        heap = OrderHeap(ascii_uppercase, key=key)
+        heap.snapshot(path)
+        del key_calls[:]
+        restored_heap = OrderHeap.restore(path, key=key)
+        self.assertEqual([], key_calls)
+        self.assertEqual(heap[:], restored_heap[:])
+        restored_heap.check()
+        self.assertRaises(RuntimeError, OrderHeap.restore, path)
+
     def test_repr(self):
         heap = OrderHeap(reversed(ascii_uppercase), key=self.key)
         self.assertHeap(heap, [], eval(re.sub(r'key=<.*>', 'key=self.key', repr(heap))))
@@ -267,6 +689,21 @@ class RemovalHeapTestCase(HeapBaseTestCase):
     def test_push_error(self):
         self.assertRaises(RuntimeError, self.filled_heap.push, 'A')
 
+    def test_push_many(self):
+        heap = self.filled_heap
+        heap.push_many('abc')
+        self.assertHeap(ascii_uppercase + 'abc', digits, heap)
+        heap.push_many(ascii_lowercase[3:] + digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('0', heap.peek())
+        heap = self.empty_heap
+        heap.push_many(ascii_uppercase)
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_push_many_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.push_many, 'aA')
+        self.assertRaises(RuntimeError, self.filled_heap.push_many, 'aa')
+
     def test_pop(self):
         heap = self.filled_heap
         wanted = set(ascii_uppercase)
@@ -278,6 +715,24 @@ class RemovalHeapTestCase(HeapBaseTestCase):
             self.assertHeap(wanted, not_wanted, heap)
         self.assertHeap([], ascii_uppercase, heap)
 
+    def test_pop_many(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list('ABC'), heap.pop_many(3))
+        self.assertHeap(ascii_uppercase[3:], 'ABC', heap)
+        self.assertSequenceEqual(list(ascii_uppercase[3:20]), heap.pop_many(17))
+        self.assertHeap(ascii_uppercase[20:], ascii_uppercase[:20], heap)
+        self.assertSequenceEqual(list(ascii_uppercase[20:]), heap.pop_many(100))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_drain(self):
+        heap = self.filled_heap
+        drain = heap.drain()
+        self.assertSequenceEqual(list(ascii_uppercase[:10]), [next(drain) for _ in range(10)])
+        drain.close()
+        self.assertHeap(ascii_uppercase[10:], ascii_uppercase[:10], heap)
+        self.assertSequenceEqual(list(ascii_uppercase[10:]), list(heap.drain()))
+        self.assertHeap([], ascii_uppercase, heap)
+
     def test_remove(self):
         heap = self.filled_heap
         wanted = set(ascii_uppercase)
@@ -289,6 +744,54 @@ class RemovalHeapTestCase(HeapBaseTestCase):
             self.assertHeap(wanted, not_wanted, heap)
         self.assertHeap([], ascii_uppercase, heap)
 
+    def test_remove_incremental_sweep(self):
+        heap = RemovalHeap(digits + ascii_uppercase + ascii_lowercase, sweep_ratio=1, sweep_step=4)
+        wanted = set(digits + ascii_uppercase + ascii_lowercase)
+        for old in ascii_uppercase + digits:
+            heap.remove(old)
+            wanted.remove(old)
+            self.assertHeap(wanted, [old], heap)
+        self.assertLess(super(Heap, heap).__len__(), len(digits + ascii_uppercase + ascii_lowercase))
+        self.assertSequenceEqual(list(ascii_lowercase), [heap.pop() for _ in ascii_lowercase])
+        self.assertHeap([], ascii_lowercase, heap)
+
+    def test_sweep_ratio(self):
+        heap = RemovalHeap(ascii_uppercase, sweep_ratio=1)
+        heap.remove('M')
+        self.assertEqual(len(ascii_uppercase)-1, super(Heap, heap).__len__())
+        heap = RemovalHeap(ascii_uppercase, sweep_ratio=0)
+        for old in ascii_uppercase:
+            heap.remove(old)
+        self.assertEqual(len(ascii_uppercase), super(Heap, heap).__len__())
+
+    def test_duplicates(self):
+        heap = RemovalHeap('ABCBAB', duplicates=True)
+        self.assertEqual(6, len(heap))
+        self.assertSequenceEqual(sorted('AABBBC'), sorted(heap))
+        heap.push('A')
+        heap.push_many('CC')
+        heap.remove('B')
+        heap.remove('A')
+        self.assertIn('B', heap)
+        self.assertEqual(7, len(heap))
+        heap.check()
+        self.assertEqual('A', heap.pushpop('B'))
+        self.assertEqual('A', heap.poppush('A'))
+        self.assertSequenceEqual(list('ABBBCCC'), heap.pop_many(7))
+        self.assertHeap([], 'ABC', heap)
+
+    def test_duplicates_sweep(self):
+        heap = RemovalHeap('A'*10 + 'B', duplicates=True)
+        for _ in range(9):
+            heap.remove('A')
+        self.assertEqual(2, len(heap))
+        self.assertEqual(2, super(Heap, heap).__len__())
+        self.assertSequenceEqual(list('AB'), list(heap.drain()))
+
+    def test_duplicates_repr(self):
+        heap = RemovalHeap('ABA', duplicates=True)
+        self.assertSequenceEqual(sorted('AAB'), sorted(eval(re.sub(r'key=<.*>,', 'key=self.key,', repr(heap)))))
+
     def test_poppush(self):
         heap = self.filled_heap
         wanted = set(ascii_uppercase)
@@ -337,6 +840,37 @@ class RemovalHeapTestCase(HeapBaseTestCase):
     def test_pushpop_error(self):
         self.assertRaises(RuntimeError, self.filled_heap.pushpop, 'A')
 
+    def test_merge(self):
+        heap = self.filled_heap
+        other = RemovalHeap(ascii_lowercase)
+        other.remove('a')
+        heap.merge(other)
+        self.assertHeap(ascii_uppercase + ascii_lowercase[1:], digits + 'a', heap)
+        self.assertHeap(ascii_lowercase[1:], 'a', other)
+        heap |= RemovalHeap(digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase[1:] + digits, 'a', heap)
+        self.assertEqual('0', heap.peek())
+
+    def test_merge_error(self):
+        heap = self.filled_heap
+        self.assertRaises(RuntimeError, heap.merge, RemovalHeap('AB'))
+
+    def test_iter_sorted(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.iter_sorted()))
+        self.assertHeap(ascii_uppercase, digits, heap)
+        heap = RemovalHeap('AABBC', duplicates=True)
+        heap.remove('A')
+        heap.remove('B')
+        heap.remove('B')
+        self.assertSequenceEqual(list('AC'), list(heap.iter_sorted()))
+
+    def test_nsmallest(self):
+        heap = self.filled_heap
+        heap.remove('B')
+        self.assertSequenceEqual(list('ACD'), heap.nsmallest(3))
+        self.assertHeap(set(ascii_uppercase) - set('B'), 'B', heap)
+
     def test_repr(self):
         heap = self.filled_heap
         self.assertHeap(heap, [], eval(repr(heap)))
@@ -397,6 +931,32 @@ class XHeapTestCase(HeapBaseTestCase):
     def test_push_error(self):
         self.assertRaises(RuntimeError, self.filled_heap.push, 'A')
 
+    def test_push_many(self):
+        heap = self.filled_heap
+        heap.push_many('abc')
+        self.assertHeap(ascii_uppercase + 'abc', digits, heap)
+        heap.push_many(ascii_lowercase[3:] + digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('0', heap.peek())
+        heap = self.empty_heap
+        heap.push_many(ascii_uppercase)
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_push_many_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.push_many, 'aA')
+        self.assertRaises(RuntimeError, self.filled_heap.push_many, 'aa')
+
+    @unittest.skipIf(ProcessPoolExecutor is None, 'concurrent.futures not installed')
+    def test_executor(self):
+        items = ascii_uppercase + ascii_lowercase
+        with ProcessPoolExecutor(2) as executor:
+            heap = XHeap(items, key=self.key, executor=executor)
+            heap.push_many(digits)
+            self.assertRaises(RuntimeError, heap.push_many, 'aA')
+        self.assertHeap(items + digits, [], heap)
+        heap.snapshot(self.snapshot_path())
+        self.assertIs(executor, heap.executor)
+
     def test_pop(self):
         heap = self.filled_heap
         wanted = set(ascii_uppercase)
@@ -408,6 +968,24 @@ class XHeapTestCase(HeapBaseTestCase):
             self.assertHeap(wanted, not_wanted, heap)
         self.assertHeap([], ascii_uppercase, heap)
 
+    def test_pop_many(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list('ABC'), heap.pop_many(3))
+        self.assertHeap(ascii_uppercase[3:], 'ABC', heap)
+        self.assertSequenceEqual(list(ascii_uppercase[3:20]), heap.pop_many(17))
+        self.assertHeap(ascii_uppercase[20:], ascii_uppercase[:20], heap)
+        self.assertSequenceEqual(list(ascii_uppercase[20:]), heap.pop_many(100))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_drain(self):
+        heap = self.filled_heap
+        drain = heap.drain()
+        self.assertSequenceEqual(list(ascii_uppercase[:10]), [next(drain) for _ in range(10)])
+        drain.close()
+        self.assertHeap(ascii_uppercase[10:], ascii_uppercase[:10], heap)
+        self.assertSequenceEqual(list(ascii_uppercase[10:]), list(heap.drain()))
+        self.assertHeap([], ascii_uppercase, heap)
+
     def test_remove(self):
         heap = self.filled_heap
         wanted = set(ascii_uppercase)
@@ -419,6 +997,54 @@ class XHeapTestCase(HeapBaseTestCase):
             self.assertHeap(wanted, not_wanted, heap)
         self.assertHeap([], ascii_uppercase, heap)
 
+    def test_remove_incremental_sweep(self):
+        heap = XHeap(digits + ascii_uppercase + ascii_lowercase, key=self.key, sweep_ratio=1, sweep_step=4)
+        wanted = set(digits + ascii_uppercase + ascii_lowercase)
+        for old in ascii_uppercase + digits:
+            heap.remove(old)
+            wanted.remove(old)
+            self.assertHeap(wanted, [old], heap)
+        self.assertLess(super(Heap, heap).__len__(), len(digits + ascii_uppercase + ascii_lowercase))
+        self.assertSequenceEqual(list(ascii_lowercase), [heap.pop() for _ in ascii_lowercase])
+        self.assertHeap([], ascii_lowercase, heap)
+
+    def test_sweep_ratio(self):
+        heap = XHeap(ascii_uppercase, key=self.key, sweep_ratio=1)
+        heap.remove('M')
+        self.assertEqual(len(ascii_uppercase)-1, super(Heap, heap).__len__())
+        heap = XHeap(ascii_uppercase, key=self.key, sweep_ratio=0)
+        for old in ascii_uppercase:
+            heap.remove(old)
+        self.assertEqual(len(ascii_uppercase), super(Heap, heap).__len__())
+
+    def test_duplicates(self):
+        heap = XHeap('ABCBAB', key=self.key, duplicates=True)
+        self.assertEqual(6, len(heap))
+        self.assertSequenceEqual(sorted('AABBBC'), sorted(heap))
+        heap.push('A')
+        heap.push_many('CC')
+        heap.remove('B')
+        heap.remove('A')
+        self.assertIn('B', heap)
+        self.assertEqual(7, len(heap))
+        heap.check()
+        self.assertEqual('A', heap.pushpop('B'))
+        self.assertEqual('A', heap.poppush('A'))
+        self.assertSequenceEqual(list('ABBBCCC'), heap.pop_many(7))
+        self.assertHeap([], 'ABC', heap)
+
+    def test_duplicates_sweep(self):
+        heap = XHeap('A'*10 + 'B', key=self.key, duplicates=True)
+        for _ in range(9):
+            heap.remove('A')
+        self.assertEqual(2, len(heap))
+        self.assertEqual(2, super(Heap, heap).__len__())
+        self.assertSequenceEqual(list('AB'), list(heap.drain()))
+
+    def test_duplicates_repr(self):
+        heap = XHeap('ABA', key=self.key, duplicates=True)
+        self.assertSequenceEqual(sorted('AAB'), sorted(eval(re.sub(r'key=<.*>,', 'key=self.key,', repr(heap)))))
+
     def test_poppush(self):
         heap = self.filled_heap
         wanted = set(ascii_uppercase)
@@ -467,6 +1093,1285 @@ class XHeapTestCase(HeapBaseTestCase):
     def test_pushpop_error(self):
         self.assertRaises(RuntimeError, self.filled_heap.pushpop, 'A')
 
+    def test_stable(self):
+        items = [object() for _ in range(11)]
+        heap = XHeap(items[:5], key=lambda item: items.index(item) % 2, stable=True)
+        heap.push_many(items[5:8])
+        heap.push(items[8])
+        heap.remove(items[4])
+        self.assertIs(items[0], heap.pushpop(items[9]))
+        self.assertIs(items[2], heap.poppush(items[10]))
+        self.assertSequenceEqual([items[6], items[8], items[10], items[1], items[3], items[5], items[7], items[9]], list(heap.drain()))
+
+    def test_merge(self):
+        heap = self.filled_heap
+        other = XHeap(ascii_lowercase, key=self.key)
+        other.remove('a')
+        heap.merge(other)
+        self.assertHeap(ascii_uppercase + ascii_lowercase[1:], digits + 'a', heap)
+        self.assertHeap(ascii_lowercase[1:], 'a', other)
+        heap |= RemovalHeap(digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase[1:] + digits, 'a', heap)
+        self.assertEqual('0', heap.peek())
+
+    def test_merge_error(self):
+        heap = self.filled_heap
+        self.assertRaises(RuntimeError, heap.merge, XHeap('AB', key=self.key))
+
+    def test_iter_sorted(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.iter_sorted()))
+        self.assertHeap(ascii_uppercase, digits, heap)
+
+    def test_nsmallest(self):
+        heap = self.filled_heap
+        heap.remove('B')
+        self.assertSequenceEqual(list('ACD'), heap.nsmallest(3))
+        self.assertHeap(set(ascii_uppercase) - set('B'), 'B', heap)
+
+    def test_pickle(self):
+        heap = self.filled_heap
+        restored_heap = pickle.loads(pickle.dumps(heap, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(heap[:], restored_heap[:])
+        self.assertHeap(ascii_uppercase, digits, restored_heap)
+
+    def test_snapshot_restore(self):
+        path = self.snapshot_path()
+        heap = XHeap(digits + ascii_uppercase, key=lambda item: ord(item)**2, stable=True, duplicates=True)
+        heap.remove('A')
+        heap.push('B')
+        heap.snapshot(path)
+        restored_heap = XHeap.restore(path, key=heap.key)
+        self.assertEqual(heap[:], restored_heap[:])
+        self.assertEqual(list(heap.drain()), list(restored_heap.drain()))
+
     def test_repr(self):
         heap = self.filled_heap
         self.assertHeap(heap, [], eval(re.sub(r'key=<.*>', 'key=self.key', repr(heap))))
+
+
+class ShardedXHeapTestCase(unittest.TestCase):
+
+    @staticmethod
+    def key(x):
+        return ord(x)**2
+
+    def sharded_heap(self, iterable=[], **kwargs):
+        heap = ShardedXHeap(iterable, key=self.key, shards=3, **kwargs)
+        self.addCleanup(heap.close)
+        return heap
+
+    def test_init_error(self):
+        self.assertRaises(RuntimeError, ShardedXHeap)
+
+    def test_push_pop(self):
+        heap = self.sharded_heap(reversed(ascii_uppercase))
+        self.assertEqual(26, len(heap))
+        self.assertEqual('A', heap.peek())
+        self.assertEqual('A', heap.pop())
+        heap.push('0')
+        self.assertEqual('0', heap.pop())
+        self.assertEqual(list('BCD'), heap.pop_many(3))
+        self.assertEqual(list(ascii_uppercase[4:]), list(heap.drain()))
+        self.assertRaises(IndexError, heap.pop)
+        self.assertRaises(IndexError, heap.peek)
+        heap.check()
+
+    def test_pop_many(self):
+        heap = self.sharded_heap(digits + ascii_uppercase)
+        self.assertEqual(list(digits), heap.pop_many(10))
+        self.assertEqual(list(ascii_uppercase), heap.pop_many(100))
+        self.assertEqual([], heap.pop_many(3))
+        self.assertEqual(0, len(heap))
+
+    def test_remove(self):
+        heap = self.sharded_heap(ascii_uppercase)
+        heap.remove('A')
+        heap.remove('M')
+        self.assertNotIn('M', heap)
+        self.assertIn('N', heap)
+        self.assertRaises(KeyError, heap.remove, 'M')
+        self.assertEqual('B', heap.peek())
+        self.assertEqual(24, len(heap))
+        self.assertEqual([c for c in ascii_uppercase if c not in 'AM'], heap.pop_many(30))
+
+    def test_duplicates(self):
+        heap = self.sharded_heap(ascii_uppercase)
+        self.assertRaises(RuntimeError, heap.push, 'A')
+        self.assertRaises(RuntimeError, heap.push_many, 'aA')
+        heap = self.sharded_heap('AB', duplicates=True)
+        heap.push('A')
+        self.assertEqual(list('AAB'), heap.pop_many(3))
+
+    def test_close(self):
+        with ShardedXHeap(ascii_uppercase, key=self.key, shards=2) as heap:
+            processes = list(heap._processes)
+            self.assertEqual('A', heap.pop())
+        self.assertEqual(0, len(heap))
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+    def test_repr(self):
+        heap = self.sharded_heap('ba')
+        self.assertEqual('ShardedXHeap(2 items, shards=3, key={key})'.format(key=self.key), repr(heap))
+
+
+class IndexHeapTestCase(HeapBaseTestCase):
+
+    @property
+    def empty_heap(self):
+        return IndexHeap(key=self.key)
+
+    @property
+    def filled_heap(self):
+        heap = IndexHeap(digits + ascii_uppercase, key=self.key)
+        for c in digits:
+            heap.remove(c)
+        return heap
+
+    @staticmethod
+    def key(x):
+        return ord(x)**2
+
+    def test_init(self):
+        self.assertHeap([], [], IndexHeap(key=self.key))
+        self.assertHeap([], [], IndexHeap([], key=self.key))
+        self.assertHeap(ascii_uppercase, [], IndexHeap(ascii_uppercase, key=self.key))
+
+    def test_init_error(self):
+        self.assertRaises(RuntimeError, IndexHeap)
+        self.assertRaises(RuntimeError, IndexHeap, ascii_uppercase+ascii_uppercase)
+        self.assertRaises(RuntimeError, IndexHeap, ascii_uppercase+ascii_uppercase, key=self.key)
+
+    def test_check_variant_invalid(self):
+        heap = self.filled_heap
+        heap[3].key = self.key('t')
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_check_index_invalid(self):
+        heap = self.filled_heap
+        heap._index['A'] = 5
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_peek(self):
+        heap = self.filled_heap
+        self.assertEqual('A', heap.peek())
+
+    def test_push(self):
+        heap = self.empty_heap
+        wanted = set()
+        not_wanted = set(ascii_uppercase)
+        for new in reversed(ascii_uppercase):
+            heap.push(new)
+            wanted.add(new)
+            not_wanted.remove(new)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_push_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.push, 'A')
+
+    def test_push_many(self):
+        heap = self.filled_heap
+        heap.push_many('abc')
+        self.assertHeap(ascii_uppercase + 'abc', digits, heap)
+        heap.push_many(ascii_lowercase[3:] + digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase + digits, [], heap)
+        self.assertEqual('0', heap.peek())
+        heap = self.empty_heap
+        heap.push_many(ascii_uppercase)
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_push_many_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.push_many, 'aA')
+        self.assertRaises(RuntimeError, self.filled_heap.push_many, 'aa')
+
+    @unittest.skipIf(ThreadPoolExecutor is None, 'concurrent.futures not installed')
+    def test_executor(self):
+        with ThreadPoolExecutor(2) as executor:
+            heap = IndexHeap(ascii_uppercase, key=self.key, executor=executor)
+            heap.push_many(ascii_lowercase)
+        self.assertHeap(ascii_uppercase + ascii_lowercase, [], heap)
+        self.assertEqual('A', heap.pop())
+
+    def test_pop(self):
+        heap = self.filled_heap
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for old in ascii_uppercase:
+            self.assertEqual(old, heap.pop())
+            wanted.remove(old)
+            not_wanted.add(old)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_pop_many(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list('ABC'), heap.pop_many(3))
+        self.assertHeap(ascii_uppercase[3:], 'ABC', heap)
+        self.assertSequenceEqual(list(ascii_uppercase[3:20]), heap.pop_many(17))
+        self.assertHeap(ascii_uppercase[20:], ascii_uppercase[:20], heap)
+        self.assertSequenceEqual(list(ascii_uppercase[20:]), heap.pop_many(100))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_drain(self):
+        heap = self.filled_heap
+        drain = heap.drain()
+        self.assertSequenceEqual(list(ascii_uppercase[:10]), [next(drain) for _ in range(10)])
+        drain.close()
+        self.assertHeap(ascii_uppercase[10:], ascii_uppercase[:10], heap)
+        self.assertSequenceEqual(list(ascii_uppercase[10:]), list(heap.drain()))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_remove(self):
+        heap = self.filled_heap
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for old in ascii_uppercase[::3] + ascii_uppercase[1::3] + ascii_uppercase[2::3]:
+            heap.remove(old)
+            wanted.remove(old)
+            not_wanted.add(old)
+            self.assertHeap(wanted, not_wanted, heap)
+            self.assertEqual(len(wanted), super(Heap, heap).__len__())
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_remove_error(self):
+        self.assertRaises(KeyError, self.filled_heap.remove, '0')
+
+    def test_update(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = IndexHeap(ascii_uppercase, key=priorities.__getitem__)
+        priorities['M'] = -1
+        heap.update('M')
+        self.assertHeap(ascii_uppercase, [], heap)
+        self.assertEqual('M', heap.peek())
+        priorities['M'] = 100
+        heap.update('M')
+        priorities['A'] = 50
+        heap.update('A')
+        self.assertHeap(ascii_uppercase, [], heap)
+        self.assertEqual([c for c in ascii_uppercase[1:] if c != 'M'] + ['A', 'M'], [heap.pop() for _ in ascii_uppercase])
+
+    def test_decrease_key(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = IndexHeap(ascii_uppercase, key=priorities.__getitem__)
+        for i, c in enumerate(reversed(ascii_uppercase)):
+            priorities[c] = i - 100
+            heap.decrease_key(c)
+            self.assertHeap(ascii_uppercase, [], heap)
+        self.assertEqual(list(reversed(ascii_uppercase)), [heap.pop() for _ in ascii_uppercase])
+
+    def test_decrease_key_error(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = IndexHeap(ascii_uppercase, key=priorities.__getitem__)
+        priorities['A'] = 100
+        self.assertRaises(RuntimeError, heap.decrease_key, 'A')
+
+    def test_increase_key(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = IndexHeap(ascii_uppercase, key=priorities.__getitem__)
+        for i, c in enumerate(ascii_uppercase):
+            priorities[c] = 100 - i
+            heap.increase_key(c)
+            self.assertHeap(ascii_uppercase, [], heap)
+        self.assertEqual(list(reversed(ascii_uppercase)), [heap.pop() for _ in ascii_uppercase])
+
+    def test_increase_key_error(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = IndexHeap(ascii_uppercase, key=priorities.__getitem__)
+        priorities['Z'] = -1
+        self.assertRaises(RuntimeError, heap.increase_key, 'Z')
+
+    def test_poppush(self):
+        heap = self.filled_heap
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for old, new in zip(ascii_uppercase, ascii_lowercase):
+            self.assertEqual(old, heap.poppush(new))
+            wanted.add(new)
+            wanted.remove(old)
+            not_wanted.add(old)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_lowercase, ascii_uppercase, heap)
+
+    def test_poppush_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.poppush, 'A')
+
+    def test_pushpop_on_empty_heap(self):
+        self.assertEqual('A', self.empty_heap.pushpop('A'))
+
+    def test_pushpop(self):
+        heap = self.filled_heap
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for old, new in zip(ascii_uppercase, ascii_lowercase):
+            self.assertEqual(old, heap.pushpop(new))
+            wanted.add(new)
+            wanted.remove(old)
+            not_wanted.add(old)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_lowercase, ascii_uppercase, heap)
+
+    def test_pushpop_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.pushpop, 'A')
+
+    def test_stable(self):
+        items = [object() for _ in range(11)]
+        heap = IndexHeap(items[:5], key=lambda item: items.index(item) % 2, stable=True)
+        heap.push_many(items[5:8])
+        heap.push(items[8])
+        heap.remove(items[4])
+        self.assertIs(items[0], heap.pushpop(items[9]))
+        self.assertIs(items[2], heap.poppush(items[10]))
+        self.assertSequenceEqual([items[6], items[8], items[10], items[1], items[3], items[5], items[7], items[9]], list(heap.drain()))
+
+    def test_stable_update(self):
+        priorities = dict.fromkeys(range(10), 0)
+        heap = IndexHeap(range(10), key=priorities.__getitem__, stable=True)
+        priorities[3] = -1
+        heap.decrease_key(3)
+        priorities[3] = 0
+        heap.increase_key(3)
+        heap.update(5)
+        self.assertSequenceEqual(list(range(10)), list(heap.drain()))
+
+    def test_merge(self):
+        heap = self.filled_heap
+        other = IndexHeap(ascii_lowercase, key=self.key)
+        other.remove('a')
+        heap.merge(other)
+        self.assertHeap(ascii_uppercase + ascii_lowercase[1:], digits + 'a', heap)
+        self.assertHeap(ascii_lowercase[1:], 'a', other)
+        heap |= RemovalHeap(digits)
+        self.assertHeap(ascii_uppercase + ascii_lowercase[1:] + digits, 'a', heap)
+        self.assertEqual('0', heap.peek())
+
+    def test_merge_error(self):
+        heap = self.filled_heap
+        self.assertRaises(RuntimeError, heap.merge, IndexHeap('AB', key=self.key))
+
+    def test_iter_sorted(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.iter_sorted()))
+        self.assertHeap(ascii_uppercase, digits, heap)
+
+    def test_pickle(self):
+        heap = self.filled_heap
+        restored_heap = pickle.loads(pickle.dumps(heap, pickle.HIGHEST_PROTOCOL))
+        self.assertHeap(ascii_uppercase, digits, restored_heap)
+        restored_heap.remove('M')
+        restored_heap.check()
+
+    def test_snapshot_restore(self):
+        path = self.snapshot_path()
+        keys = dict((c, float(ord(c))) for c in ascii_uppercase)
+        heap = IndexHeap(ascii_uppercase, key=keys.get, stable=True)
+        heap.snapshot(path)
+        restored_heap = IndexHeap.restore(path, key=keys.get)
+        self.assertHeap(ascii_uppercase, [], restored_heap)
+        keys['Z'] = 0.0
+        restored_heap.decrease_key('Z')
+        self.assertEqual('Z', restored_heap.pop())
+
+    def test_repr(self):
+        heap = self.filled_heap
+        self.assertHeap(heap, [], eval(re.sub(r'key=<.*>', 'key=self.key', repr(heap))))
+
+
+class PairingHeapTestCase(HeapBaseTestCase):
+
+    @property
+    def empty_heap(self):
+        return PairingHeap(key=self.key)
+
+    @property
+    def filled_heap(self):
+        heap = PairingHeap(digits + ascii_uppercase, key=self.key)
+        for c in digits:
+            heap.remove(c)
+        return heap
+
+    @staticmethod
+    def key(x):
+        return ord(x)**2
+
+    def test_init(self):
+        self.assertHeap([], [], PairingHeap())
+        self.assertHeap([], [], PairingHeap([], key=self.key))
+        self.assertHeap(ascii_uppercase, [], PairingHeap(ascii_uppercase))
+        self.assertHeap(ascii_uppercase, [], PairingHeap(ascii_uppercase, key=self.key))
+
+    def test_init_error(self):
+        self.assertRaises(RuntimeError, PairingHeap, ascii_uppercase+ascii_uppercase)
+
+    def test_check_variant_invalid(self):
+        heap = self.filled_heap
+        heap.pop()
+        heap._root.child.key = 0
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_peek(self):
+        self.assertEqual('A', self.filled_heap.peek())
+        self.assertRaises(IndexError, self.empty_heap.peek)
+
+    def test_push(self):
+        heap = self.empty_heap
+        wanted = set()
+        not_wanted = set(ascii_uppercase)
+        for new in reversed(ascii_uppercase):
+            heap.push(new)
+            wanted.add(new)
+            not_wanted.remove(new)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_uppercase, [], heap)
+
+    def test_push_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.push, 'A')
+
+    def test_pop(self):
+        heap = self.filled_heap
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for old in ascii_uppercase:
+            self.assertEqual(old, heap.pop())
+            wanted.remove(old)
+            not_wanted.add(old)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap([], ascii_uppercase, heap)
+        self.assertRaises(IndexError, heap.pop)
+
+    def test_pop_many(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list('ABC'), heap.pop_many(3))
+        self.assertHeap(ascii_uppercase[3:], 'ABC', heap)
+        self.assertSequenceEqual(list(ascii_uppercase[3:]), heap.pop_many(100))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_drain(self):
+        self.assertSequenceEqual(list(ascii_uppercase), list(self.filled_heap.drain()))
+
+    def test_remove(self):
+        heap = self.filled_heap
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for old in ascii_uppercase[::3] + ascii_uppercase[1::3] + ascii_uppercase[2::3]:
+            heap.remove(old)
+            wanted.remove(old)
+            not_wanted.add(old)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_remove_error(self):
+        self.assertRaises(KeyError, self.filled_heap.remove, '0')
+
+    def test_update(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = PairingHeap(ascii_uppercase, key=priorities.__getitem__)
+        heap.pop_many(2)
+        priorities['M'] = -1
+        heap.update('M')
+        self.assertHeap(ascii_uppercase[2:], 'AB', heap)
+        self.assertEqual('M', heap.peek())
+        priorities['M'] = 100
+        heap.update('M')
+        priorities['P'] = 50
+        heap.update('P')
+        self.assertHeap(ascii_uppercase[2:], 'AB', heap)
+        self.assertEqual([c for c in ascii_uppercase[2:] if c not in 'MP'] + ['P', 'M'], list(heap.drain()))
+
+    def test_decrease_key(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = PairingHeap(ascii_uppercase, key=priorities.__getitem__)
+        heap.pop_many(2)
+        for i, c in enumerate(reversed(ascii_uppercase[2:])):
+            priorities[c] = i - 100
+            heap.decrease_key(c)
+            self.assertHeap(ascii_uppercase[2:], 'AB', heap)
+        self.assertEqual(list(reversed(ascii_uppercase[2:])), list(heap.drain()))
+
+    def test_decrease_key_error(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = PairingHeap(ascii_uppercase, key=priorities.__getitem__)
+        priorities['A'] = 100
+        self.assertRaises(RuntimeError, heap.decrease_key, 'A')
+
+    def test_increase_key(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = PairingHeap(ascii_uppercase, key=priorities.__getitem__)
+        heap.pop_many(2)
+        for i, c in enumerate(ascii_uppercase[2:]):
+            priorities[c] = 100 - i
+            heap.increase_key(c)
+            self.assertHeap(ascii_uppercase[2:], 'AB', heap)
+        self.assertEqual(list(reversed(ascii_uppercase[2:])), list(heap.drain()))
+
+    def test_increase_key_error(self):
+        priorities = {c: i for i, c in enumerate(ascii_uppercase)}
+        heap = PairingHeap(ascii_uppercase, key=priorities.__getitem__)
+        priorities['Z'] = -1
+        self.assertRaises(RuntimeError, heap.increase_key, 'Z')
+
+    def test_poppush(self):
+        heap = self.filled_heap
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for old, new in zip(ascii_uppercase, ascii_lowercase):
+            self.assertEqual(old, heap.poppush(new))
+            wanted.add(new)
+            wanted.remove(old)
+            not_wanted.add(old)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_lowercase, ascii_uppercase, heap)
+
+    def test_poppush_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.poppush, 'A')
+
+    def test_pushpop_on_empty_heap(self):
+        self.assertEqual('A', self.empty_heap.pushpop('A'))
+
+    def test_pushpop(self):
+        heap = self.filled_heap
+        wanted = set(ascii_uppercase)
+        not_wanted = set()
+        for old, new in zip(ascii_uppercase, ascii_lowercase):
+            self.assertEqual(old, heap.pushpop(new))
+            wanted.add(new)
+            wanted.remove(old)
+            not_wanted.add(old)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(ascii_lowercase, ascii_uppercase, heap)
+
+    def test_merge(self):
+        heap = self.filled_heap
+        other = PairingHeap(ascii_lowercase, key=self.key)
+        heap |= other
+        self.assertHeap(ascii_uppercase + ascii_lowercase, digits, heap)
+        self.assertHeap(ascii_lowercase, [], other)
+
+    def test_meld(self):
+        heap = self.filled_heap
+        other = PairingHeap(ascii_lowercase, key=self.key)
+        heap.meld(other)
+        self.assertHeap(ascii_uppercase + ascii_lowercase, digits, heap)
+        self.assertHeap([], ascii_lowercase, other)
+        self.assertSequenceEqual(list(ascii_uppercase + ascii_lowercase), list(heap.drain()))
+
+    def test_meld_error(self):
+        self.assertRaises(RuntimeError, self.filled_heap.meld, PairingHeap('A', key=self.key))
+        self.assertRaises(RuntimeError, self.filled_heap.meld, PairingHeap('a'))
+
+    def test_iter_sorted(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.iter_sorted()))
+        heap.pop()
+        self.assertSequenceEqual(list(ascii_uppercase[1:]), list(heap.iter_sorted()))
+        self.assertSequenceEqual([], list(self.empty_heap.iter_sorted()))
+
+    def test_nsmallest(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list('ABC'), heap.nsmallest(3))
+        self.assertHeap(ascii_uppercase, digits, heap)
+
+    def test_repr(self):
+        heap = self.filled_heap
+        self.assertHeap(heap, [], eval(re.sub(r'key=<.*>', 'key=self.key', repr(heap))))
+
+
+@unittest.skipIf(numpy is None, 'numpy not installed')
+class ArrayHeapTestCase(HeapBaseTestCase):
+
+    keys = [float(i % 7) + i / 100.0 for i in range(26)]
+
+    @property
+    def filled_heap(self):
+        return ArrayHeap(self.keys, range(26))
+
+    def sorted_pairs(self):
+        return sorted(zip(self.keys, range(26)))
+
+    def test_init(self):
+        self.assertHeap([], [], ArrayHeap())
+        self.assertHeap([], [], ArrayHeap([], []))
+        self.assertHeap(range(26), [26], ArrayHeap(self.keys, range(26)))
+        self.assertHeap(range(26), [26], ArrayHeap(numpy.array(self.keys), numpy.arange(26), capacity=1))
+
+    def test_init_error(self):
+        self.assertRaises(RuntimeError, ArrayHeap, [1.0, 2.0], [1])
+
+    def test_check_variant_invalid(self):
+        heap = self.filled_heap
+        heap._keys[1] = -1
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_peek(self):
+        self.assertEqual(self.sorted_pairs()[0], self.filled_heap.peek())
+        self.assertRaises(IndexError, ArrayHeap().peek)
+
+    def test_push(self):
+        heap = ArrayHeap(capacity=1)
+        for key, payload in zip(self.keys, range(26)):
+            heap.push(key, payload)
+            self.assertHeap(range(payload+1), [payload+1], heap)
+        self.assertEqual(self.sorted_pairs(), list(heap.drain()))
+
+    def test_push_many(self):
+        heap = ArrayHeap(range(1000), range(1000))
+        heap.push_many([-1.0], [-1])
+        self.assertHeap(range(-1, 1000), [1000], heap)
+        heap.push_many(numpy.arange(1000, 2000), numpy.arange(1000, 2000))
+        self.assertHeap(range(-1, 2000), [2000], heap)
+        self.assertEqual((-1.0, -1), heap.peek())
+
+    def test_pop(self):
+        heap = self.filled_heap
+        wanted = set(range(26))
+        for key, payload in self.sorted_pairs():
+            self.assertEqual((key, payload), heap.pop())
+            wanted.remove(payload)
+            self.assertHeap(wanted, [payload], heap)
+        self.assertRaises(IndexError, heap.pop)
+
+    def test_pop_many(self):
+        heap = ArrayHeap(range(999, -1, -1), range(1000))
+        keys, payloads = heap.pop_many(1)
+        self.assertEqual([0.0], keys.tolist())
+        self.assertEqual([999], payloads.tolist())
+        keys, payloads = heap.pop_many(500)
+        self.assertEqual(list(range(1, 501)), keys.tolist())
+        self.assertEqual(list(range(998, 498, -1)), payloads.tolist())
+        self.assertHeap(range(499), [499], heap)
+        keys, payloads = heap.pop_many(1000)
+        self.assertEqual(499, len(keys))
+        self.assertHeap([], [0], heap)
+
+    def test_remove(self):
+        heap = self.filled_heap
+        wanted = set(range(26))
+        for payload in list(range(0, 26, 3)) + list(range(1, 26, 3)) + list(range(2, 26, 3)):
+            heap.remove(payload)
+            wanted.remove(payload)
+            self.assertHeap(wanted, [payload], heap)
+
+    def test_remove_error(self):
+        self.assertRaises(KeyError, self.filled_heap.remove, 26)
+
+    def test_poppush(self):
+        heap = self.filled_heap
+        for i, (key, payload) in enumerate(self.sorted_pairs()):
+            self.assertEqual((key, payload), heap.poppush(100.0 + i, 100 + i))
+            heap.check()
+        self.assertHeap(range(100, 126), range(26), heap)
+        self.assertRaises(IndexError, ArrayHeap().poppush, 1.0, 1)
+
+    def test_pushpop(self):
+        heap = self.filled_heap
+        self.assertEqual((-1.0, 100), heap.pushpop(-1.0, 100))
+        self.assertEqual(self.sorted_pairs()[0], heap.pushpop(100.0, 100))
+        self.assertHeap(list(range(1, 26)) + [100], [0], heap)
+        self.assertEqual((1.0, 1), ArrayHeap().pushpop(1.0, 1))
+
+    def test_merge(self):
+        heap = self.filled_heap
+        other = ArrayHeap([-1.0, 100.0], [100, 101])
+        heap |= other
+        self.assertHeap(list(range(26)) + [100, 101], [], heap)
+        self.assertHeap([100, 101], [], other)
+        self.assertEqual((-1.0, 100), heap.peek())
+
+    def test_iter_sorted(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(self.sorted_pairs(), list(heap.iter_sorted()))
+        self.assertHeap(range(26), [], heap)
+
+    def test_nsmallest(self):
+        heap = ArrayHeap(range(999, -1, -1), range(1000))
+        for k in (0, 1, 3, 500, 1000, 2000):
+            keys, payloads = heap.nsmallest(k)
+            self.assertEqual(list(range(min(k, 1000))), keys.tolist())
+            self.assertEqual(list(range(999, 999 - min(k, 1000), -1)), payloads.tolist())
+        self.assertHeap(range(1000), [], heap)
+
+    def test_repr(self):
+        heap = self.filled_heap
+        self.assertEqual(self.sorted_pairs(), list(eval(repr(heap)).drain()))
+
+
+class CompactHeapTestCase(HeapBaseTestCase):
+
+    small = list(range(26))
+    large = list(range(100, 126))
+
+    def test_init(self):
+        self.assertHeap([], [], CompactHeap())
+        self.assertHeap([], [], CompactHeap([]))
+        self.assertHeap(self.small, [], CompactHeap(reversed(self.small)))
+        self.assertHeap(self.small, [], CompactHeap(reversed(self.small), typecode='l'))
+        self.assertEqual('l', CompactHeap(typecode='l').typecode)
+        self.assertRaises(TypeError, CompactHeap, [1.5], typecode='l')
+
+    def test_check_variant_invalid(self):
+        heap = CompactHeap(range(100))
+        heap[3] = 10000
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_peek(self):
+        self.assertEqual(0, CompactHeap(reversed(self.small)).peek())
+
+    def test_push(self):
+        heap = CompactHeap()
+        wanted = set()
+        not_wanted = set(self.small)
+        for i in reversed(self.small):
+            heap.push(i)
+            wanted.add(i)
+            not_wanted.remove(i)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(self.small, [], heap)
+
+    def test_push_many(self):
+        heap = CompactHeap(self.large)
+        heap.push_many([50, 60, 70])
+        self.assertHeap(self.large + [50, 60, 70], [], heap)
+        heap.push_many(self.small)
+        self.assertHeap(self.large + [50, 60, 70] + self.small, [], heap)
+        self.assertEqual(0, heap.peek())
+
+    def test_pop(self):
+        heap = CompactHeap(reversed(self.small))
+        wanted = set(self.small)
+        not_wanted = set()
+        for i in self.small:
+            self.assertEqual(i, heap.pop())
+            wanted.remove(i)
+            not_wanted.add(i)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertRaises(IndexError, heap.pop)
+
+    def test_pop_many(self):
+        heap = CompactHeap(reversed(self.small))
+        self.assertSequenceEqual([0, 1, 2], heap.pop_many(3))
+        self.assertHeap(self.small[3:], self.small[:3], heap)
+        self.assertSequenceEqual(self.small[3:20], heap.pop_many(17))
+        self.assertHeap(self.small[20:], self.small[:20], heap)
+        self.assertSequenceEqual(self.small[20:], heap.pop_many(100))
+        self.assertHeap([], self.small, heap)
+
+    def test_drain(self):
+        heap = CompactHeap(reversed(self.small))
+        self.assertSequenceEqual(self.small, list(heap.drain()))
+        self.assertHeap([], self.small, heap)
+
+    def test_poppush(self):
+        heap = CompactHeap(reversed(self.small))
+        wanted = set(self.small)
+        not_wanted = set()
+        for s, l in zip(self.small, self.large):
+            self.assertEqual(s, heap.poppush(l))
+            wanted.add(l)
+            wanted.remove(s)
+            not_wanted.add(s)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(self.large, self.small, heap)
+
+    def test_pushpop_on_empty_heap(self):
+        self.assertEqual(1.5, CompactHeap().pushpop(1.5))
+
+    def test_pushpop(self):
+        heap = CompactHeap(reversed(self.small))
+        wanted = set(self.small)
+        not_wanted = set()
+        for s, l in zip(self.small, self.large):
+            self.assertEqual(s, heap.pushpop(l))
+            wanted.add(l)
+            wanted.remove(s)
+            not_wanted.add(s)
+            self.assertHeap(wanted, not_wanted, heap)
+        self.assertHeap(self.large, self.small, heap)
+
+    def test_remove_not_implemented(self):
+        self.assertRaises(NotImplementedError, CompactHeap(self.small).remove, 0)
+
+    def test_merge(self):
+        heap = CompactHeap(self.large)
+        heap |= Heap(self.small)
+        self.assertHeap(self.large + self.small, [], heap)
+        self.assertEqual(0, heap.peek())
+
+    def test_iter_sorted(self):
+        heap = CompactHeap(reversed(self.small))
+        self.assertSequenceEqual(self.small, list(heap.iter_sorted()))
+        self.assertSequenceEqual(self.small[:3], heap.nsmallest(3))
+        self.assertHeap(self.small, [], heap)
+
+    def test_repr(self):
+        heap = CompactHeap(reversed(self.small), typecode='l')
+        copy = eval(repr(heap))
+        self.assertHeap(heap, [], copy)
+        self.assertEqual('l', copy.typecode)
+
+
+class ConcurrentXHeapTestCase(HeapBaseTestCase):
+
+    @property
+    def filled_heap(self):
+        heap = ConcurrentXHeap(digits + ascii_uppercase, key=self.key)
+        for c in digits:
+            heap.remove(c)
+        return heap
+
+    @staticmethod
+    def key(x):
+        return ord(x)**2
+
+    def test_init(self):
+        self.assertHeap([], [], ConcurrentXHeap(key=self.key))
+        self.assertHeap(ascii_uppercase, [], ConcurrentXHeap(ascii_uppercase, key=self.key))
+        self.assertRaises(RuntimeError, ConcurrentXHeap)
+
+    def test_push_pop_remove(self):
+        heap = self.filled_heap
+        heap.push('a')
+        heap.push_many('bc')
+        self.assertRaises(RuntimeError, heap.push, 'a')
+        heap.remove('B')
+        self.assertEqual('A', heap.peek())
+        self.assertEqual('A', heap.pop())
+        self.assertSequenceEqual(list('CDE'), heap.pop_many(3))
+        self.assertEqual('F', heap.pushpop('d'))
+        self.assertEqual('G', heap.poppush('e'))
+        self.assertHeap(ascii_uppercase[7:] + 'abcde', ascii_uppercase[:7] + digits, heap)
+        self.assertSequenceEqual(list(ascii_uppercase[7:] + 'abcde'), list(heap.drain()))
+
+    def test_pop_non_blocking(self):
+        heap = ConcurrentXHeap(key=self.key)
+        self.assertRaises(Empty, heap.pop, block=False)
+        heap.push('A')
+        self.assertEqual('A', heap.pop(block=False))
+
+    def test_pop_timeout(self):
+        heap = ConcurrentXHeap('A', key=self.key)
+        self.assertEqual('A', heap.pop(timeout=0.01))
+        self.assertRaises(Empty, heap.pop, timeout=0.01)
+        self.assertRaises(ValueError, heap.pop, timeout=-1)
+
+    def test_pop_blocking(self):
+        heap = ConcurrentXHeap(key=self.key)
+        timer = threading.Timer(0.01, heap.push_many, ['BA'])
+        timer.start()
+        self.assertEqual('A', heap.pop())
+        self.assertEqual('B', heap.pop(timeout=10))
+        timer.join()
+
+    def test_threads(self):
+        heap = ConcurrentXHeap(key=lambda x: x)
+        items = list(range(4000))
+        popped = []
+        removed = [threading.Event() for _ in range(4)]
+
+        def produce(offset):
+            heap.push(items[offset])
+            heap.remove(items[offset])
+            removed[offset].set()
+            for item in items[offset+4::4]:
+                heap.push(item)
+
+        def consume():
+            for event in removed:
+                event.wait()
+            for _ in range(1000 - 1):
+                popped.append(heap.pop(timeout=10))
+
+        threads = [threading.Thread(target=produce, args=(i,)) for i in range(4)]
+        threads += [threading.Thread(target=consume) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        popped += heap.pop_many(len(items))
+        self.assertEqual(len(items) - 4, len(popped))
+        self.assertEqual(set(items) - set(items[:4]), set(popped))
+        self.assertHeap([], items, heap)
+
+    def test_iter_sorted(self):
+        heap = self.filled_heap
+        self.assertSequenceEqual(list(ascii_uppercase), list(heap.iter_sorted()))
+        self.assertSequenceEqual(list('ABC'), heap.nsmallest(3))
+        self.assertHeap(ascii_uppercase, digits, heap)
+
+    def test_snapshot_restore(self):
+        path = self.snapshot_path()
+        heap = self.filled_heap
+        heap.snapshot(path)
+        restored_heap = ConcurrentXHeap.restore(path, key=self.key)
+        self.assertHeap(ascii_uppercase, digits, restored_heap)
+        restored_heap.push('a')
+        self.assertEqual('A', restored_heap.pop(block=False))
+        restored_heap = pickle.loads(pickle.dumps(heap, pickle.HIGHEST_PROTOCOL))
+        self.assertHeap(ascii_uppercase, digits, restored_heap)
+
+    def test_repr(self):
+        heap = self.filled_heap
+        self.assertHeap(heap, [], eval(re.sub(r'key=<.*>', 'key=self.key', repr(heap))))
+
+
+@unittest.skipIf(asyncio is None, 'asyncio not available')
+class AsyncXHeapTestCase(HeapBaseTestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    @staticmethod
+    def key(x):
+        return ord(x)**2
+
+    def test_init(self):
+        self.assertHeap([], [], AsyncXHeap(key=self.key))
+        self.assertHeap(ascii_uppercase, [], AsyncXHeap(ascii_uppercase, key=self.key))
+        self.assertRaises(RuntimeError, AsyncXHeap)
+
+    def test_pop(self):
+        heap = AsyncXHeap(reversed(ascii_uppercase), key=self.key)
+        for c in ascii_uppercase:
+            self.assertEqual(c, self.loop.run_until_complete(heap.pop()))
+        self.assertHeap([], ascii_uppercase, heap)
+
+    def test_pop_waits(self):
+        heap = AsyncXHeap(key=self.key)
+        self.loop.call_later(0.01, heap.push, 'A')
+        self.assertEqual('A', self.loop.run_until_complete(heap.pop()))
+
+    def test_pop_waiters(self):
+        heap = AsyncXHeap(key=self.key)
+        first, second, third = [asyncio.ensure_future(heap.pop()) for _ in range(3)]
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertFalse(first.done())
+        heap.push('B')
+        self.assertEqual('B', self.loop.run_until_complete(first))
+        self.assertFalse(second.done())
+        second.cancel()
+        heap.push_many('CAD')
+        self.assertEqual('A', self.loop.run_until_complete(third))
+        self.assertTrue(second.cancelled())
+        self.assertHeap('CD', 'AB', heap)
+
+    def test_pop_cancelled_after_wakeup(self):
+        heap = AsyncXHeap(key=self.key)
+        first, second = [asyncio.ensure_future(heap.pop()) for _ in range(2)]
+        self.loop.run_until_complete(asyncio.sleep(0))
+        heap.push('A')
+        first.cancel()
+        self.assertEqual('A', self.loop.run_until_complete(second))
+        self.assertTrue(first.cancelled())
+        waiter = asyncio.ensure_future(heap.pop())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        heap.push('B')
+        waiter.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(waiter.cancelled())
+        self.assertHeap('B', 'A', heap)
+        self.assertEqual('B', self.loop.run_until_complete(heap.pop()))
+
+    def test_pop_nowait(self):
+        heap = AsyncXHeap('A', key=self.key)
+        self.assertEqual('A', heap.pop_nowait())
+        self.assertRaises(asyncio.QueueEmpty, heap.pop_nowait)
+
+    def test_remove(self):
+        heap = AsyncXHeap('ABC', key=self.key)
+        heap.remove('A')
+        self.assertEqual('B', self.loop.run_until_complete(heap.pop()))
+        self.assertHeap('C', 'AB', heap)
+
+    def test_merge(self):
+        heap = AsyncXHeap(key=self.key)
+        waiter = asyncio.ensure_future(heap.pop())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        heap |= XHeap('BA', key=self.key)
+        self.assertEqual('A', self.loop.run_until_complete(waiter))
+        self.assertHeap('B', 'A', heap)
+
+    def test_repr(self):
+        heap = AsyncXHeap(ascii_uppercase, key=self.key)
+        self.assertHeap(heap, [], eval(re.sub(r'key=<.*>', 'key=self.key', repr(heap))))
+
+
+class TimerHeapTestCase(unittest.TestCase):
+
+    def test_schedule(self):
+        heap = TimerHeap()
+        self.assertEqual(0, len(heap))
+        self.assertIsNone(heap.next_deadline())
+        handle = heap.schedule(5.0, 'A')
+        heap.schedule(3.0, 'B')
+        self.assertEqual(2, len(heap))
+        self.assertEqual(3.0, heap.next_deadline())
+        self.assertEqual((5.0, 'A', True), (handle.deadline, handle.payload, handle.active))
+        heap.check()
+
+    def test_expire(self):
+        heap = TimerHeap()
+        for i, c in enumerate(ascii_uppercase):
+            heap.schedule(i // 2, c)
+        self.assertEqual([], heap.expire(-1))
+        self.assertEqual(list('AB'), heap.expire(0))
+        self.assertEqual(list('CDEFGH'), heap.expire(3))
+        self.assertEqual(list('IJ'), heap.expire(4.5))
+        self.assertEqual(16, len(heap))
+        self.assertEqual(list(ascii_uppercase[10:]), heap.expire(100))
+        self.assertEqual(0, len(heap))
+        heap.check()
+
+    def test_cancel(self):
+        heap = TimerHeap()
+        handles = [heap.schedule(i, c) for i, c in enumerate(ascii_uppercase)]
+        self.assertTrue(heap.cancel(handles[0]))
+        self.assertFalse(heap.cancel(handles[0]))
+        self.assertFalse(handles[0].active)
+        self.assertEqual(1, heap.next_deadline())
+        for handle in handles[2::2]:
+            heap.cancel(handle)
+        heap.check()
+        self.assertEqual(13, len(heap))
+        self.assertEqual(list('BDF'), heap.expire(5))
+        self.assertFalse(heap.cancel(handles[1]))
+        self.assertEqual(list(ascii_uppercase[7::2]), heap.expire(100))
+        heap.check()
+
+    def test_sweep(self):
+        heap = TimerHeap()
+        handles = [heap.schedule(i, i) for i in range(100)]
+        for handle in handles[:60]:
+            heap.cancel(handle)
+        self.assertEqual(40, len(heap))
+        self.assertLess(len(heap._heap), 100)
+        heap.check()
+        self.assertEqual(list(range(60, 100)), heap.expire(100))
+
+    def test_check_variant_invalid(self):
+        heap = TimerHeap()
+        for i in range(10):
+            heap.schedule(i, i)
+        heap._heap[3][0] = 100
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_iter(self):
+        heap = TimerHeap()
+        handles = [heap.schedule(i, c) for i, c in enumerate('ABC')]
+        heap.cancel(handles[1])
+        self.assertEqual({'A', 'C'}, set(handle.payload for handle in heap))
+
+    def test_iter_sorted(self):
+        heap = TimerHeap()
+        handles = [heap.schedule(-i, c) for i, c in enumerate(ascii_uppercase)]
+        heap.cancel(handles[-1])
+        self.assertSequenceEqual(list(reversed(ascii_uppercase[:-1])), [handle.payload for handle in heap.iter_sorted()])
+        self.assertSequenceEqual(list('YXW'), [handle.payload for handle in heap.nsmallest(3)])
+        self.assertEqual(25, len(heap))
+
+    def test_repr(self):
+        heap = TimerHeap()
+        heap.schedule(2, 'B')
+        heap.schedule(1, 'A')
+        self.assertEqual("TimerHeap([<timer 'A' at 1>, <timer 'B' at 2>])", repr(heap))
+
+
+class BoundedHeapTestCase(HeapBaseTestCase):
+
+    @staticmethod
+    def key(x):
+        return -ord(x)
+
+    def test_init(self):
+        self.assertHeap([], [], BoundedHeap(3))
+        self.assertHeap('XYZ', ascii_uppercase[:-3], BoundedHeap(3, ascii_uppercase))
+        self.assertHeap('ABC', ascii_uppercase[3:], BoundedHeap(3, ascii_uppercase, key=self.key))
+        self.assertHeap(ascii_uppercase, [], BoundedHeap(100, ascii_uppercase))
+
+    def test_init_error(self):
+        self.assertRaises(RuntimeError, BoundedHeap, 0)
+
+    def test_check_variant_invalid(self):
+        heap = BoundedHeap(3, 'ABC')
+        heap.append('D')
+        self.assertRaises(InvalidHeapError, heap.check)
+
+    def test_peek(self):
+        self.assertEqual('X', BoundedHeap(3, ascii_uppercase).peek())
+        self.assertEqual('C', BoundedHeap(3, ascii_uppercase, key=self.key).peek())
+
+    def test_push(self):
+        heap = BoundedHeap(3)
+        self.assertIsNone(heap.push('M'))
+        self.assertIsNone(heap.push('A'))
+        self.assertIsNone(heap.push('Z'))
+        self.assertEqual('A', heap.push('B'))
+        self.assertEqual('B', heap.push('N'))
+        self.assertEqual('A', heap.pushpop('A'))
+        self.assertHeap('MNZ', 'AB', heap)
+
+    def test_push_key(self):
+        heap = BoundedHeap(3, key=self.key)
+        for c in 'MAZ':
+            self.assertIsNone(heap.push(c))
+        self.assertEqual('Z', heap.push('Y'))
+        self.assertEqual('Y', heap.push('B'))
+        self.assertHeap('ABM', 'YZ', heap)
+
+    def test_push_many(self):
+        heap = BoundedHeap(5)
+        heap.push_many('AB')
+        self.assertHeap('AB', [], heap)
+        heap.push_many(ascii_uppercase)
+        self.assertHeap('VWXYZ', ascii_uppercase[:-5], heap)
+        heap = BoundedHeap(5, key=self.key)
+        heap.push_many(reversed(ascii_uppercase))
+        self.assertHeap('ABCDE', ascii_uppercase[5:], heap)
+
+    def test_pop(self):
+        heap = BoundedHeap(3, ascii_uppercase, key=self.key)
+        self.assertSequenceEqual(['C', 'B', 'A'], [heap.pop() for _ in range(3)])
+        self.assertRaises(IndexError, heap.pop)
+
+    def test_pop_many(self):
+        heap = BoundedHeap(5, ascii_uppercase)
+        self.assertSequenceEqual(list('VW'), heap.pop_many(2))
+        self.assertSequenceEqual(list('XYZ'), list(heap.drain()))
+        heap = BoundedHeap(5, ascii_uppercase, key=self.key)
+        self.assertSequenceEqual(list('EDCBA'), heap.pop_many(10))
+
+    def test_remove(self):
+        for key in (None, self.key):
+            heap = BoundedHeap(10, ascii_uppercase, key=key)
+            wanted = set(heap)
+            for c in sorted(wanted):
+                heap.remove(c)
+                wanted.remove(c)
+                self.assertHeap(wanted, [c], heap)
+            self.assertRaises(KeyError, heap.remove, 'A')
+
+    def test_poppush(self):
+        heap = BoundedHeap(3, 'ABC')
+        self.assertEqual('A', heap.poppush('Z'))
+        self.assertHeap('BCZ', 'A', heap)
+
+    def test_top(self):
+        self.assertSequenceEqual(list('ZYX'), BoundedHeap(3, ascii_uppercase).top())
+        self.assertSequenceEqual(list('ABC'), BoundedHeap(3, ascii_uppercase, key=self.key).top())
+
+    def test_merge(self):
+        heap = BoundedHeap(3, 'ABC')
+        heap |= Heap('XYZ')
+        self.assertHeap('XYZ', 'ABC', heap)
+
+    def test_iter_sorted(self):
+        self.assertSequenceEqual(list('XYZ'), list(BoundedHeap(3, ascii_uppercase).iter_sorted()))
+        self.assertSequenceEqual(list('CBA'), list(BoundedHeap(3, ascii_uppercase, key=self.key).iter_sorted()))
+
+    def test_repr(self):
+        heap = BoundedHeap(3, ascii_uppercase, key=self.key)
+        copy = eval(re.sub(r'key=<.*>', 'key=self.key', repr(heap)))
+        self.assertHeap(heap, [], copy)
+        self.assertEqual(3, copy.maxsize)
+
+
+class ExternalHeapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, self.directory)
+
+    def external_heap(self, iterable=[], **kwargs):
+        kwargs.setdefault('buffer_size', 4)
+        kwargs.setdefault('block_size', 3)
+        heap = ExternalHeap(iterable, directory=self.directory, **kwargs)
+        self.addCleanup(heap.close)
+        return heap
+
+    def test_init_error(self):
+        self.assertRaises(RuntimeError, ExternalHeap, buffer_size=0)
+        self.assertRaises(RuntimeError, ExternalHeap, block_size=0)
+        self.assertRaises(RuntimeError, ExternalHeap, max_runs=0)
+
+    def test_spill(self):
+        heap = self.external_heap(reversed(ascii_uppercase))
+        self.assertEqual(26, len(heap))
+        self.assertEqual(6, len(os.listdir(self.directory)))
+        self.assertEqual('A', heap.peek())
+        self.assertEqual(list(ascii_uppercase), list(heap.drain()))
+        self.assertEqual([], os.listdir(self.directory))
+        self.assertRaises(IndexError, heap.pop)
+
+    def test_push_pop(self):
+        heap = self.external_heap(ascii_uppercase[::2], use_mmap=False)
+        self.assertEqual(list('ACE'), heap.pop_many(3))
+        for c in ascii_uppercase[1::2]:
+            heap.push(c)
+        heap.check()
+        self.assertEqual('B', heap.pop())
+        self.assertEqual(sorted(set(ascii_uppercase) - set('ABCE')), heap.pop_many(30))
+        self.assertEqual(0, len(heap))
+
+    def test_key(self):
+        heap = self.external_heap(ascii_uppercase, key=lambda x: -ord(x))
+        heap.push('a')
+        self.assertEqual('a', heap.peek())
+        self.assertEqual(list('aZYX'), heap.pop_many(4))
+
+    def test_max_runs(self):
+        heap = self.external_heap(digits + ascii_uppercase, max_runs=2)
+        self.assertLessEqual(len(os.listdir(self.directory)), 3)
+        self.assertEqual(list(digits + ascii_uppercase), list(heap.drain()))
+
+    def test_close(self):
+        with self.external_heap(ascii_uppercase) as heap:
+            self.assertEqual('A', heap.pop())
+        self.assertEqual(0, len(heap))
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_repr(self):
+        heap = self.external_heap('ba')
+        self.assertEqual('ExternalHeap(2 items, 0 runs, key=None)', repr(heap))
+
+
+class MergeIterTestCase(HeapBaseTestCase):
+
+    @staticmethod
+    def key(x):
+        return ord(x)**2
+
+    def test_merge_iter(self):
+        heaps = [Heap('AD'), XHeap('BE', key=self.key), OrderHeap('CF', key=self.key)]
+        self.assertSequenceEqual(list('ABCDEF'), list(merge_iter(*heaps)))
+        for heap in heaps:
+            self.assertEqual(0, len(heap))
+        self.assertSequenceEqual([], list(merge_iter()))
+        self.assertSequenceEqual([], list(merge_iter(Heap(), [])))
+
+    def test_merge_iter_stop_early(self):
+        heaps = [Heap('AD'), XHeap('BE', key=self.key), PairingHeap('CF', key=self.key)]
+        self.assertSequenceEqual(list('ABC'), list(islice(merge_iter(*heaps), 3)))
+        self.assertHeap('D', 'A', heaps[0])
+        self.assertHeap('E', 'B', heaps[1])
+        self.assertHeap('F', 'C', heaps[2])
+
+    def test_merge_iter_sorted_iterables(self):
+        self.assertSequenceEqual(list('ABCDEF'), list(merge_iter('BE', Heap('CF'), iter('AD'))))
+
+    def test_merge_iter_key(self):
+        heaps = [OrderHeap('AD', key=lambda x: -ord(x)), MaxHeap('BE'), 'FC']
+        self.assertSequenceEqual(list('FEDCBA'), list(merge_iter(*heaps, key=lambda x: -ord(x))))
+
+    def test_merge_iter_not_consuming(self):
+        heaps = [Heap('AD'), XHeap('0BE', key=self.key), RemovalHeap('CF')]
+        heaps[1].remove('0')
+        self.assertSequenceEqual(list('ABCDEF'), list(merge_iter(*heaps, consume=False)))
+        self.assertHeap('AD', [], heaps[0])
+        self.assertHeap('BE', '0', heaps[1])
+        self.assertHeap('CF', [], heaps[2])
+
+    def test_merge_iter_error(self):
+        self.assertRaises(TypeError, list, merge_iter(Heap(), reverse=True))
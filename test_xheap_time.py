@@ -2,8 +2,19 @@
 
 from __future__ import unicode_literals
 
+import argparse
+import json
+import platform
+import sys
 from timeit import repeat
 
+import xheap
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
 
 class HeapTimeCase(object):
 
@@ -55,7 +66,7 @@ class HeapTimeCase(object):
                     'random.shuffle(values);'
                     'from sortedcontainers import SortedList;'
                 ),
-                'SortedList(values, load=100)',
+                'SortedList(values)',
                 1,
             ),
         ]
@@ -110,7 +121,7 @@ class HeapTimeCase(object):
                     'values = list(range({size}));'
                     'random.shuffle(values);'
                     'from sortedcontainers import SortedList;'
-                    'heap = SortedList(values, load=100);'
+                    'heap = SortedList(values);'
                 ),
                 'heap.pop(0)',
                 None,
@@ -174,7 +185,7 @@ class HeapTimeCase(object):
                     'values = list(range(0, {size} * 2, 2));'
                     'random.shuffle(values);'
                     'from sortedcontainers import SortedList;'
-                    'heap = SortedList(values, load=100);'
+                    'heap = SortedList(values);'
                     'random.shuffle(values);'
                     'i = 0;'
                 ),
@@ -183,6 +194,248 @@ class HeapTimeCase(object):
             ),
         ]
 
+    def time_push_many(self):
+        return [
+            'push_many',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'from heapq import heapify, heappush;'
+                    'heap = list(values);'
+                    'heapify(heap);'
+                    'batch = [value + 1 for value in values];'
+                ),
+                'for value in batch: heappush(heap, value)',
+                1,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                    'batch = [value + 1 for value in values];'
+                ),
+                'heap.push_many(batch)',
+                1,
+            ),
+            (
+                'RemovalHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'from xheap import RemovalHeap;'
+                    'heap = RemovalHeap(values);'
+                    'batch = [value + 1 for value in values];'
+                ),
+                'heap.push_many(batch)',
+                1,
+            ),
+        ]
+
+    def time_pop_many(self):
+        return [
+            'pop_many',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from heapq import heapify, heappop;'
+                    'heapify(values);'
+                ),
+                '[heappop(values) for _ in range({size} // 2)]',
+                1,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                ),
+                'heap.pop_many({size} // 2)',
+                1,
+            ),
+            (
+                'RemovalHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import RemovalHeap;'
+                    'heap = RemovalHeap(values);'
+                ),
+                'heap.pop_many({size} // 2)',
+                1,
+            ),
+        ]
+
+
+    def time_poppush(self):
+        return [
+            'poppush',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from heapq import heapify, heapreplace;'
+                    'heapify(values);'
+                ),
+                'heapreplace(values, next(new_values))',
+                None,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                ),
+                'heap.poppush(next(new_values))',
+                None,
+            ),
+            (
+                'MaxHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import MaxHeap;'
+                    'heap = MaxHeap(values);'
+                ),
+                'heap.poppush(next(new_values))',
+                None,
+            ),
+            (
+                'DaryHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import DaryHeap;'
+                    'heap = DaryHeap(values);'
+                ),
+                'heap.poppush(next(new_values))',
+                None,
+            ),
+            (
+                'CompactHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import CompactHeap;'
+                    'heap = CompactHeap(values, typecode="q");'
+                ),
+                'heap.poppush(next(new_values))',
+                None,
+            ),
+        ]
+
+    def time_pushpop(self):
+        return [
+            'pushpop',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from heapq import heapify, heappushpop;'
+                    'heapify(values);'
+                ),
+                'heappushpop(values, next(new_values))',
+                None,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                ),
+                'heap.pushpop(next(new_values))',
+                None,
+            ),
+            (
+                'MaxHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import MaxHeap;'
+                    'heap = MaxHeap(values);'
+                ),
+                'heap.pushpop(next(new_values))',
+                None,
+            ),
+            (
+                'DaryHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import DaryHeap;'
+                    'heap = DaryHeap(values);'
+                ),
+                'heap.pushpop(next(new_values))',
+                None,
+            ),
+            (
+                'CompactHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import CompactHeap;'
+                    'heap = CompactHeap(values, typecode="q");'
+                ),
+                'heap.pushpop(next(new_values))',
+                None,
+            ),
+        ]
 
 class OrderHeapTimeCase(object):
 
@@ -213,6 +466,18 @@ class OrderHeapTimeCase(object):
                 'OrderHeap(values, key=lambda x: -x)',
                 1,
             ),
+            (
+                'MaxHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import MaxHeap;'
+                ),
+                'MaxHeap(values)',
+                1,
+            ),
             (
                 'XHeap',
                 (
@@ -234,7 +499,7 @@ class OrderHeapTimeCase(object):
                     'random.shuffle(values);'
                     'from sortedcontainers import SortedList;'
                 ),
-                'SortedList(values, key=lambda x: -x, load=100)',
+                'SortedList(values, key=lambda x: -x)',
                 1,
             ),
         ]
@@ -266,6 +531,18 @@ class OrderHeapTimeCase(object):
                 'heap.pop()',
                 None,
             ),
+            (
+                'MaxHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'from xheap import MaxHeap;'
+                    'heap = MaxHeap(values);'
+                ),
+                'heap.pop()',
+                None,
+            ),
             (
                 'XHeap',
                 (
@@ -285,7 +562,7 @@ class OrderHeapTimeCase(object):
                     'random.seed(0);'
                     'values = list(range({size}));'
                     'from sortedcontainers import SortedList;'
-                    'heap = SortedList(values, key=lambda x: -x, load=100);'
+                    'heap = SortedList(values, key=lambda x: -x);'
                 ),
                 'heap.pop(0)',
                 None,
@@ -326,6 +603,21 @@ class OrderHeapTimeCase(object):
                 'heap.push(values[i] + 1); i += 1',
                 None,
             ),
+            (
+                'MaxHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'from xheap import MaxHeap;'
+                    'heap = MaxHeap(values);'
+                    'random.shuffle(values);'
+                    'i = 0;'
+                ),
+                'heap.push(values[i] + 1); i += 1',
+                None,
+            ),
             (
                 'XHeap',
                 (
@@ -349,7 +641,7 @@ class OrderHeapTimeCase(object):
                     'values = list(range(0, {size} * 2, 2));'
                     'random.shuffle(values);'
                     'from sortedcontainers import SortedList;'
-                    'heap = SortedList(values, key=lambda x: -x, load=100);'
+                    'heap = SortedList(values, key=lambda x: -x);'
                     'random.shuffle(values);'
                     'i = 0;'
                 ),
@@ -359,27 +651,36 @@ class OrderHeapTimeCase(object):
         ]
 
 
-class RemovalHeapTimeCase(object):
-
-    def time_remove(self):
+    def time_poppush(self):
         return [
-            'remove',
+            'poppush',
             (
-                'RemovalHeap',
+                'heapq',
                 (
                     'import random;'
                     'random.seed(0);'
                     'values = list(range({size}));'
                     'random.shuffle(values);'
-                    'from xheap import RemovalHeap;'
-                    'heap = RemovalHeap((-x, x) for x in values);'
-                    'i = 0;'
-                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from heapq import heapify, heapreplace;'
+                    'heap = [(-x, x) for x in values];'
+                    'heapify(heap);'
                 ),
+                'x = next(new_values); heapreplace(heap, (-x, x))',
+                None,
+            ),
+            (
+                'OrderHeap',
                 (
-                    'heap.remove((-values[i], values[i]));'
-                    'i += 1;'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import OrderHeap;'
+                    'heap = OrderHeap(values, key=lambda x: -x);'
                 ),
+                'heap.poppush(next(new_values))',
                 None,
             ),
             (
@@ -389,65 +690,1921 @@ class RemovalHeapTimeCase(object):
                     'random.seed(0);'
                     'values = list(range({size}));'
                     'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
                     'from xheap import XHeap;'
                     'heap = XHeap(values, key=lambda x: -x);'
-                    'i = 0;'
-                    'random.shuffle(values);'
-                ),
-                (
-                    'heap.remove(values[i]);'
-                    'i += 1;'
                 ),
+                'heap.poppush(next(new_values))',
                 None,
             ),
             (
-                'SortedList',
+                'IndexHeap',
                 (
                     'import random;'
                     'random.seed(0);'
                     'values = list(range({size}));'
                     'random.shuffle(values);'
-                    'from sortedcontainers import SortedList;'
-                    'heap = SortedList(values, key=lambda x: -x, load=100);'
-                    'i = 0;'
-                    'random.shuffle(values);'
-                ),
-                (
-                    'heap.remove(values[i]);'
-                    'i += 1;'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import IndexHeap;'
+                    'heap = IndexHeap(values, key=lambda x: -x);'
                 ),
+                'heap.poppush(next(new_values))',
                 None,
             ),
         ]
 
-
-initial_sizes = [10**3, 10**4, 10**5, 10**6]
-repetitions = 5
-def perform_time_configs(configs):
-    for _, setup, stmt, number in configs:
-        try:
-            yield [min(repeat(stmt.format(size=size), setup.format(size=size), number=(number or size), repeat=repetitions)) for size in initial_sizes]
-        except ImportError as exc:
+    def time_pushpop(self):
+        return [
+            'pushpop',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from heapq import heapify, heappushpop;'
+                    'heap = [(-x, x) for x in values];'
+                    'heapify(heap);'
+                ),
+                'x = next(new_values); heappushpop(heap, (-x, x))',
+                None,
+            ),
+            (
+                'OrderHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import OrderHeap;'
+                    'heap = OrderHeap(values, key=lambda x: -x);'
+                ),
+                'heap.pushpop(next(new_values))',
+                None,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import XHeap;'
+                    'heap = XHeap(values, key=lambda x: -x);'
+                ),
+                'heap.pushpop(next(new_values))',
+                None,
+            ),
+            (
+                'IndexHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                    'from xheap import IndexHeap;'
+                    'heap = IndexHeap(values, key=lambda x: -x);'
+                ),
+                'heap.pushpop(next(new_values))',
+                None,
+            ),
+        ]
+
+    def time_init_costly(self):
+        return [
+            'init costly',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from heapq import heapify;'
+                ),
+                'heap = [(key(x), x) for x in values]; heapify(heap)',
+                1,
+            ),
+            (
+                'OrderHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import OrderHeap;'
+                ),
+                'OrderHeap(values, key=key)',
+                1,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import XHeap;'
+                ),
+                'XHeap(values, key=key)',
+                1,
+            ),
+            (
+                'IndexHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import IndexHeap;'
+                ),
+                'IndexHeap(values, key=key)',
+                1,
+            ),
+        ]
+
+    def time_push_costly(self):
+        return [
+            'push costly',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from heapq import heapify, heappush;'
+                    'heap = [(key(x), x) for x in values];'
+                    'heapify(heap);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                ),
+                'x = next(new_values); heappush(heap, (key(x), x))',
+                None,
+            ),
+            (
+                'OrderHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import OrderHeap;'
+                    'heap = OrderHeap(values, key=key);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                ),
+                'heap.push(next(new_values))',
+                None,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import XHeap;'
+                    'heap = XHeap(values, key=key);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                ),
+                'heap.push(next(new_values))',
+                None,
+            ),
+            (
+                'IndexHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import IndexHeap;'
+                    'heap = IndexHeap(values, key=key);'
+                    'new_values = iter(random.sample(range({size}, 2 * {size}), {size}));'
+                ),
+                'heap.push(next(new_values))',
+                None,
+            ),
+        ]
+
+class RemovalHeapTimeCase(object):
+
+    def time_remove(self):
+        return [
+            'remove',
+            (
+                'RemovalHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import RemovalHeap;'
+                    'heap = RemovalHeap((-x, x) for x in values);'
+                    'i = 0;'
+                    'random.shuffle(values);'
+                ),
+                (
+                    'heap.remove((-values[i], values[i]));'
+                    'i += 1;'
+                ),
+                None,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import XHeap;'
+                    'heap = XHeap(values, key=lambda x: -x);'
+                    'i = 0;'
+                    'random.shuffle(values);'
+                ),
+                (
+                    'heap.remove(values[i]);'
+                    'i += 1;'
+                ),
+                None,
+            ),
+            (
+                'SortedList',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from sortedcontainers import SortedList;'
+                    'heap = SortedList(values, key=lambda x: -x);'
+                    'i = 0;'
+                    'random.shuffle(values);'
+                ),
+                (
+                    'heap.remove(values[i]);'
+                    'i += 1;'
+                ),
+                None,
+            ),
+        ]
+
+
+    def time_peek_tombstones(self):
+        return [
+            'peek 40% removed',
+            (
+                'RemovalHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import RemovalHeap\n'
+                    'heap = RemovalHeap(values)\n'
+                    'for x in range(2 * {size} // 5): heap.remove(x)'
+                ),
+                'heap.peek()',
+                1,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(values, key=lambda x: x)\n'
+                    'for x in range(2 * {size} // 5): heap.remove(x)'
+                ),
+                'heap.peek()',
+                1,
+            ),
+            (
+                'IndexHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import IndexHeap\n'
+                    'heap = IndexHeap(values, key=lambda x: x)\n'
+                    'for x in range(2 * {size} // 5): heap.remove(x)'
+                ),
+                'heap.peek()',
+                1,
+            ),
+        ]
+
+    def time_remove_all(self):
+        return [
+            'remove all',
+            (
+                'RemovalHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import RemovalHeap;'
+                    'heap = RemovalHeap(values);'
+                    'random.shuffle(values);'
+                ),
+                'for x in values: heap.remove(x)',
+                1,
+            ),
+            (
+                'RemovalHeap(step=64)',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import RemovalHeap;'
+                    'heap = RemovalHeap(values, sweep_step=64);'
+                    'random.shuffle(values);'
+                ),
+                'for x in values: heap.remove(x)',
+                1,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import XHeap;'
+                    'heap = XHeap(values, key=lambda x: -x);'
+                    'random.shuffle(values);'
+                ),
+                'for x in values: heap.remove(x)',
+                1,
+            ),
+            (
+                'XHeap(step=64)',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import XHeap;'
+                    'heap = XHeap(values, key=lambda x: -x, sweep_step=64);'
+                    'random.shuffle(values);'
+                ),
+                'for x in values: heap.remove(x)',
+                1,
+            ),
+            (
+                'IndexHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'from xheap import IndexHeap;'
+                    'heap = IndexHeap(values, key=lambda x: -x);'
+                    'random.shuffle(values);'
+                ),
+                'for x in values: heap.remove(x)',
+                1,
+            ),
+        ]
+
+class DaryHeapTimeCase(object):
+
+    def time_push_costly(self):
+        return [
+            'push_costly',
+            (
+                'heapq',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from heapq import heapify, heappush;'
+                    'heap = list(values); heapify(heap);'
+                    'values = [Costly(x + 1) for x in range(0, {size} * 2, 2)]; random.shuffle(values);'
+                    'i = 0;'
+                ),
+                'heappush(heap, values[i]); i += 1',
+                None,
+            ),
+            (
+                'Heap',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                    'values = [Costly(x + 1) for x in range(0, {size} * 2, 2)]; random.shuffle(values);'
+                    'i = 0;'
+                ),
+                'heap.push(values[i]); i += 1',
+                None,
+            ),
+            (
+                'DaryHeap(4)',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import DaryHeap;'
+                    'heap = DaryHeap(values, arity=4);'
+                    'values = [Costly(x + 1) for x in range(0, {size} * 2, 2)]; random.shuffle(values);'
+                    'i = 0;'
+                ),
+                'heap.push(values[i]); i += 1',
+                None,
+            ),
+            (
+                'DaryHeap(8)',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import DaryHeap;'
+                    'heap = DaryHeap(values, arity=8);'
+                    'values = [Costly(x + 1) for x in range(0, {size} * 2, 2)]; random.shuffle(values);'
+                    'i = 0;'
+                ),
+                'heap.push(values[i]); i += 1',
+                None,
+            ),
+        ]
+
+    def time_push_costly_descending(self):
+        return [
+            'push_costly_desc',
+            (
+                'heapq',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from heapq import heapify, heappush;'
+                    'heap = list(values); heapify(heap);'
+                    'values = [Costly(-x - 1) for x in range(0, {size} * 2, 2)];'
+                    'i = 0;'
+                ),
+                'heappush(heap, values[i]); i += 1',
+                None,
+            ),
+            (
+                'Heap',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                    'values = [Costly(-x - 1) for x in range(0, {size} * 2, 2)];'
+                    'i = 0;'
+                ),
+                'heap.push(values[i]); i += 1',
+                None,
+            ),
+            (
+                'DaryHeap(4)',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import DaryHeap;'
+                    'heap = DaryHeap(values, arity=4);'
+                    'values = [Costly(-x - 1) for x in range(0, {size} * 2, 2)];'
+                    'i = 0;'
+                ),
+                'heap.push(values[i]); i += 1',
+                None,
+            ),
+            (
+                'DaryHeap(8)',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import DaryHeap;'
+                    'heap = DaryHeap(values, arity=8);'
+                    'values = [Costly(-x - 1) for x in range(0, {size} * 2, 2)];'
+                    'i = 0;'
+                ),
+                'heap.push(values[i]); i += 1',
+                None,
+            ),
+        ]
+
+    def time_pop_costly(self):
+        return [
+            'pop_costly',
+            (
+                'heapq',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from heapq import heapify, heappop;'
+                    'heap = list(values); heapify(heap);'
+                    'i = 0;'
+                ),
+                'heappop(heap)',
+                None,
+            ),
+            (
+                'Heap',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                    'i = 0;'
+                ),
+                'heap.pop()',
+                None,
+            ),
+            (
+                'DaryHeap(4)',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import DaryHeap;'
+                    'heap = DaryHeap(values, arity=4);'
+                    'i = 0;'
+                ),
+                'heap.pop()',
+                None,
+            ),
+            (
+                'DaryHeap(8)',
+                (
+                    'class Costly(object):\n'
+                    '    def __init__(self, value): self.value = value\n'
+                    '    def __lt__(self, other): return self.value < other.value\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [Costly(x) for x in range(0, {size} * 2, 2)];'
+                    'random.shuffle(values);'
+                    'from xheap import DaryHeap;'
+                    'heap = DaryHeap(values, arity=8);'
+                    'i = 0;'
+                ),
+                'heap.pop()',
+                None,
+            ),
+        ]
+
+
+class PairingHeapTimeCase(object):
+
+    def time_dijkstra(self):
+        return [
+            'dijkstra',
+            (
+                'heapq',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'n = {size} // 10\n'
+                    'graph = [[(random.randrange(n), random.randrange(1, 100)) for _ in range(5)] for _ in range(n)]\n'
+                    'from heapq import heappop, heappush\n'
+                    'def dijkstra():\n'
+                    '    dist = {{0: 0}}\n'
+                    '    done = set()\n'
+                    '    heap = [(0, 0)]\n'
+                    '    while heap:\n'
+                    '        d, u = heappop(heap)\n'
+                    '        if u in done: continue\n'
+                    '        done.add(u)\n'
+                    '        for v, w in graph[u]:\n'
+                    '            if d + w < dist.get(v, d + w + 1):\n'
+                    '                dist[v] = d + w\n'
+                    '                heappush(heap, (d + w, v))\n'
+                ),
+                'dijkstra()',
+                1,
+            ),
+            (
+                'IndexHeap',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'n = {size} // 10\n'
+                    'graph = [[(random.randrange(n), random.randrange(1, 100)) for _ in range(5)] for _ in range(n)]\n'
+                    'from xheap import IndexHeap\n'
+                    'def dijkstra():\n'
+                    '    dist = {{0: 0}}\n'
+                    '    heap = IndexHeap([0], key=dist.__getitem__)\n'
+                    '    while heap:\n'
+                    '        u = heap.pop()\n'
+                    '        d = dist[u]\n'
+                    '        for v, w in graph[u]:\n'
+                    '            if v not in dist:\n'
+                    '                dist[v] = d + w\n'
+                    '                heap.push(v)\n'
+                    '            elif d + w < dist[v] and v in heap:\n'
+                    '                dist[v] = d + w\n'
+                    '                heap.decrease_key(v)\n'
+                ),
+                'dijkstra()',
+                1,
+            ),
+            (
+                'PairingHeap',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'n = {size} // 10\n'
+                    'graph = [[(random.randrange(n), random.randrange(1, 100)) for _ in range(5)] for _ in range(n)]\n'
+                    'from xheap import PairingHeap\n'
+                    'def dijkstra():\n'
+                    '    dist = {{0: 0}}\n'
+                    '    heap = PairingHeap([0], key=dist.__getitem__)\n'
+                    '    while heap:\n'
+                    '        u = heap.pop()\n'
+                    '        d = dist[u]\n'
+                    '        for v, w in graph[u]:\n'
+                    '            if v not in dist:\n'
+                    '                dist[v] = d + w\n'
+                    '                heap.push(v)\n'
+                    '            elif d + w < dist[v] and v in heap:\n'
+                    '                dist[v] = d + w\n'
+                    '                heap.decrease_key(v)\n'
+                ),
+                'dijkstra()',
+                1,
+            ),
+        ]
+
+
+class ArrayHeapTimeCase(object):
+
+    def time_push_many(self):
+        return [
+            'push_many',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'keys = [random.random() for _ in range({size})];'
+                    'ids = list(range({size}));'
+                    'from heapq import heapify;'
+                    'heap = [];'
+                ),
+                'heap.extend(zip(keys, ids)); heapify(heap)',
+                1,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'keys = [random.random() for _ in range({size})];'
+                    'ids = list(range({size}));'
+                    'from xheap import Heap;'
+                    'heap = Heap();'
+                ),
+                'heap.push_many(zip(keys, ids))',
+                1,
+            ),
+            (
+                'ArrayHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'keys = [random.random() for _ in range({size})];'
+                    'ids = list(range({size}));'
+                    'import numpy;'
+                    'keys = numpy.array(keys);'
+                    'ids = numpy.array(ids);'
+                    'from xheap import ArrayHeap;'
+                    'heap = ArrayHeap();'
+                ),
+                'heap.push_many(keys, ids)',
+                1,
+            ),
+        ]
+
+    def time_pop_many(self):
+        return [
+            'pop_many',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'keys = [random.random() for _ in range({size})];'
+                    'ids = list(range({size}));'
+                    'from heapq import heapify, heappop;'
+                    'heap = list(zip(keys, ids));'
+                    'heapify(heap);'
+                ),
+                '[heappop(heap) for _ in range({size} // 10)]',
+                1,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'keys = [random.random() for _ in range({size})];'
+                    'ids = list(range({size}));'
+                    'from xheap import Heap;'
+                    'heap = Heap(zip(keys, ids));'
+                ),
+                'heap.pop_many({size} // 10)',
+                1,
+            ),
+            (
+                'ArrayHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'keys = [random.random() for _ in range({size})];'
+                    'ids = list(range({size}));'
+                    'import numpy;'
+                    'from xheap import ArrayHeap;'
+                    'heap = ArrayHeap(keys, ids);'
+                ),
+                'heap.pop_many({size} // 10)',
+                1,
+            ),
+        ]
+
+
+class CompactHeapTimeCase(object):
+
+    def time_init(self):
+        return [
+            'init',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from heapq import heapify;'
+                ),
+                'heapify(list(values))',
+                1,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import Heap;'
+                ),
+                'Heap(values)',
+                1,
+            ),
+            (
+                'CompactHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import CompactHeap;'
+                ),
+                'CompactHeap(values)',
+                1,
+            ),
+        ]
+
+    def time_pop(self):
+        return [
+            'pop',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from heapq import heapify, heappop;'
+                    'heap = list(values);'
+                    'heapify(heap);'
+                ),
+                'heappop(heap)',
+                None,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                ),
+                'heap.pop()',
+                None,
+            ),
+            (
+                'CompactHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import CompactHeap;'
+                    'heap = CompactHeap(values);'
+                ),
+                'heap.pop()',
+                None,
+            ),
+        ]
+
+    def time_push(self):
+        return [
+            'push',
+            (
+                'heapq',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'new_values = [random.random() for _ in range({size})];'
+                    'i = 0;'
+                    'from heapq import heapify, heappush;'
+                    'heap = list(values);'
+                    'heapify(heap);'
+                ),
+                'heappush(heap, new_values[i]); i += 1',
+                None,
+            ),
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'new_values = [random.random() for _ in range({size})];'
+                    'i = 0;'
+                    'from xheap import Heap;'
+                    'heap = Heap(values);'
+                ),
+                'heap.push(new_values[i]); i += 1',
+                None,
+            ),
+            (
+                'CompactHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'new_values = [random.random() for _ in range({size})];'
+                    'i = 0;'
+                    'from xheap import CompactHeap;'
+                    'heap = CompactHeap(values);'
+                ),
+                'heap.push(new_values[i]); i += 1',
+                None,
+            ),
+        ]
+
+
+class ConcurrentXHeapTimeCase(object):
+
+    def time_pop(self):
+        return [
+            'pop',
+            (
+                'PriorityQueue',
+                (
+                    'try:\n'
+                    '    from queue import PriorityQueue\n'
+                    'except ImportError:\n'
+                    '    from Queue import PriorityQueue\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'heap = PriorityQueue();'
+                    '[heap.put((-x, x)) for x in values];'
+                ),
+                'heap.get()',
+                None,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'from xheap import XHeap;'
+                    'heap = XHeap(values, key=lambda x: -x);'
+                ),
+                'heap.pop()',
+                None,
+            ),
+            (
+                'ConcurrentXHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'from xheap import ConcurrentXHeap;'
+                    'heap = ConcurrentXHeap(values, key=lambda x: -x);'
+                ),
+                'heap.pop()',
+                None,
+            ),
+        ]
+
+    def time_push(self):
+        return [
+            'push',
+            (
+                'PriorityQueue',
+                (
+                    'try:\n'
+                    '    from queue import PriorityQueue\n'
+                    'except ImportError:\n'
+                    '    from Queue import PriorityQueue\n'
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'new_values = [x + 1 for x in values];'
+                    'i = 0;'
+                    'heap = PriorityQueue();'
+                    '[heap.put((-x, x)) for x in values];'
+                ),
+                'heap.put((-new_values[i], new_values[i])); i += 1',
+                None,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'new_values = [x + 1 for x in values];'
+                    'i = 0;'
+                    'from xheap import XHeap;'
+                    'heap = XHeap(values, key=lambda x: -x);'
+                ),
+                'heap.push(new_values[i]); i += 1',
+                None,
+            ),
+            (
+                'ConcurrentXHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range(0, {size} * 2, 2));'
+                    'random.shuffle(values);'
+                    'new_values = [x + 1 for x in values];'
+                    'i = 0;'
+                    'from xheap import ConcurrentXHeap;'
+                    'heap = ConcurrentXHeap(values, key=lambda x: -x);'
+                ),
+                'heap.push(new_values[i]); i += 1',
+                None,
+            ),
+        ]
+
+
+class AsyncXHeapTimeCase(object):
+
+    def time_wakeup(self):
+        return [
+            'wakeup',
+            (
+                'PriorityQueue',
+                (
+                    'import asyncio\n'
+                    'heap = asyncio.PriorityQueue()\n'
+                    'async def consume(n, received):\n'
+                    '    for _ in range(n):\n'
+                    '        await heap.get()\n'
+                    '        received.set()\n'
+                    'async def produce(n, received):\n'
+                    '    for i in range(n):\n'
+                    '        heap.put_nowait(i)\n'
+                    '        await received.wait()\n'
+                    '        received.clear()\n'
+                    'async def run(n):\n'
+                    '    received = asyncio.Event()\n'
+                    '    await asyncio.gather(consume(n, received), produce(n, received))\n'
+                    'loop = asyncio.new_event_loop()\n'
+                ),
+                'loop.run_until_complete(run({size} // 100))',
+                1,
+            ),
+            (
+                'AsyncXHeap',
+                (
+                    'import asyncio\n'
+                    'from xheap import AsyncXHeap\n'
+                    'heap = AsyncXHeap(key=lambda x: x)\n'
+                    'async def consume(n, received):\n'
+                    '    for _ in range(n):\n'
+                    '        await heap.pop()\n'
+                    '        received.set()\n'
+                    'async def produce(n, received):\n'
+                    '    for i in range(n):\n'
+                    '        heap.push(i)\n'
+                    '        await received.wait()\n'
+                    '        received.clear()\n'
+                    'async def run(n):\n'
+                    '    received = asyncio.Event()\n'
+                    '    await asyncio.gather(consume(n, received), produce(n, received))\n'
+                    'loop = asyncio.new_event_loop()\n'
+                ),
+                'loop.run_until_complete(run({size} // 100))',
+                1,
+            ),
+            (
+                'XHeap+polling',
+                (
+                    'import asyncio\n'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(key=lambda x: x)\n'
+                    'async def consume(n, received):\n'
+                    '    for _ in range(n):\n'
+                    '        while not heap:\n'
+                    '            await asyncio.sleep(0.001)\n'
+                    '        heap.pop()\n'
+                    '        received.set()\n'
+                    'async def produce(n, received):\n'
+                    '    for i in range(n):\n'
+                    '        heap.push(i)\n'
+                    '        await received.wait()\n'
+                    '        received.clear()\n'
+                    'async def run(n):\n'
+                    '    received = asyncio.Event()\n'
+                    '    await asyncio.gather(consume(n, received), produce(n, received))\n'
+                    'loop = asyncio.new_event_loop()\n'
+                ),
+                'loop.run_until_complete(run({size} // 100))',
+                1,
+            ),
+        ]
+
+
+class TimerHeapTimeCase(object):
+
+    def time_timeouts(self):
+        return [
+            'timeouts',
+            (
+                'heapq',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'n = {size}\n'
+                    'delays = [random.uniform(1, 1000) for _ in range(n)]\n'
+                    'cancelled = [random.random() < 0.9 for _ in range(n)]\n'
+                    'from heapq import heappop, heappush\n'
+                    'def run():\n'
+                    '    heap = []\n'
+                    '    entries = []\n'
+                    '    for i in range(n):\n'
+                    '        entry = [i + delays[i], i, True]\n'
+                    '        heappush(heap, entry)\n'
+                    '        entries.append(entry)\n'
+                    '        if i >= 10 and cancelled[i - 10]:\n'
+                    '            entries[i - 10][2] = False\n'
+                    '        while heap and heap[0][0] <= i:\n'
+                    '            heappop(heap)\n'
+                ),
+                'run()',
+                1,
+            ),
+            (
+                'XHeap',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'n = {size}\n'
+                    'delays = [random.uniform(1, 1000) for _ in range(n)]\n'
+                    'cancelled = [random.random() < 0.9 for _ in range(n)]\n'
+                    'from xheap import XHeap\n'
+                    'deadlines = [i + delay for i, delay in enumerate(delays)]\n'
+                    'def run():\n'
+                    '    heap = XHeap(key=deadlines.__getitem__)\n'
+                    '    for i in range(n):\n'
+                    '        heap.push(i)\n'
+                    '        if i >= 10 and cancelled[i - 10] and i - 10 in heap:\n'
+                    '            heap.remove(i - 10)\n'
+                    '        while heap and deadlines[heap.peek()] <= i:\n'
+                    '            heap.pop()\n'
+                ),
+                'run()',
+                1,
+            ),
+            (
+                'TimerHeap',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'n = {size}\n'
+                    'delays = [random.uniform(1, 1000) for _ in range(n)]\n'
+                    'cancelled = [random.random() < 0.9 for _ in range(n)]\n'
+                    'from xheap import TimerHeap\n'
+                    'def run():\n'
+                    '    heap = TimerHeap()\n'
+                    '    handles = []\n'
+                    '    for i in range(n):\n'
+                    '        handles.append(heap.schedule(i + delays[i], i))\n'
+                    '        if i >= 10 and cancelled[i - 10]:\n'
+                    '            heap.cancel(handles[i - 10])\n'
+                    '        heap.expire(i)\n'
+                ),
+                'run()',
+                1,
+            ),
+        ]
+
+
+class BoundedHeapTimeCase(object):
+
+    def time_top100(self):
+        return [
+            'top100',
+            (
+                'nlargest',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size} * 10)];'
+                    'from heapq import nlargest;'
+                ),
+                'nlargest(100, values)',
+                1,
+            ),
+            (
+                'Heap+pushpop',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size} * 10)];'
+                    'from xheap import Heap;'
+                    'heap = Heap(values[:100]);'
+                    'rest = values[100:];'
+                ),
+                '[heap.pushpop(value) for value in rest]',
+                1,
+            ),
+            (
+                'BoundedHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size} * 10)];'
+                    'from xheap import BoundedHeap;'
+                    'heap = BoundedHeap(100);'
+                ),
+                'heap.push_many(values)',
+                1,
+            ),
+        ]
+
+    def time_top100_key(self):
+        return [
+            'top100_key',
+            (
+                'nlargest',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size} * 10)];'
+                    'from heapq import nlargest;'
+                ),
+                'nlargest(100, values, key=abs)',
+                1,
+            ),
+            (
+                'OrderHeap+pushpop',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size} * 10)];'
+                    'from xheap import OrderHeap;'
+                    'heap = OrderHeap(values[:100], key=abs);'
+                    'rest = values[100:];'
+                ),
+                '[heap.pushpop(value) for value in rest]',
+                1,
+            ),
+            (
+                'BoundedHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size} * 10)];'
+                    'from xheap import BoundedHeap;'
+                    'heap = BoundedHeap(100, key=abs);'
+                ),
+                'heap.push_many(values)',
+                1,
+            ),
+        ]
+
+
+class MergeIterTimeCase(object):
+
+    def time_merge_all(self):
+        return [
+            'merge_all',
+            (
+                'heapq.merge',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'from xheap import OrderHeap;'
+                    'heaps = [OrderHeap((random.random() for _ in range({size} // 8)), key=lambda x: -x) for _ in range(8)];'
+                    'from heapq import merge;'
+                ),
+                'list(merge(*[sorted(heap, key=lambda x: -x) for heap in heaps], key=lambda x: -x))',
+                1,
+            ),
+            (
+                'merge_iter',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'from xheap import OrderHeap;'
+                    'heaps = [OrderHeap((random.random() for _ in range({size} // 8)), key=lambda x: -x) for _ in range(8)];'
+                    'from xheap import merge_iter;'
+                ),
+                'list(merge_iter(*heaps, key=lambda x: -x))',
+                1,
+            ),
+            (
+                'merge_iter(consume=False)',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'from xheap import OrderHeap;'
+                    'heaps = [OrderHeap((random.random() for _ in range({size} // 8)), key=lambda x: -x) for _ in range(8)];'
+                    'from xheap import merge_iter;'
+                ),
+                'list(merge_iter(*heaps, key=lambda x: -x, consume=False))',
+                1,
+            ),
+        ]
+
+    def time_merge_first100(self):
+        return [
+            'merge_first100',
+            (
+                'heapq.merge',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'from xheap import OrderHeap;'
+                    'heaps = [OrderHeap((random.random() for _ in range({size} // 8)), key=lambda x: -x) for _ in range(8)];'
+                    'from heapq import merge;'
+                    'from itertools import islice;'
+                ),
+                'list(islice(merge(*[sorted(heap, key=lambda x: -x) for heap in heaps], key=lambda x: -x), 100))',
+                1,
+            ),
+            (
+                'merge_iter',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'from xheap import OrderHeap;'
+                    'heaps = [OrderHeap((random.random() for _ in range({size} // 8)), key=lambda x: -x) for _ in range(8)];'
+                    'from xheap import merge_iter;'
+                    'from itertools import islice;'
+                ),
+                'list(islice(merge_iter(*heaps, key=lambda x: -x), 100))',
+                1,
+            ),
+            (
+                'merge_iter(consume=False)',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'from xheap import OrderHeap;'
+                    'heaps = [OrderHeap((random.random() for _ in range({size} // 8)), key=lambda x: -x) for _ in range(8)];'
+                    'from xheap import merge_iter;'
+                    'from itertools import islice;'
+                ),
+                'list(islice(merge_iter(*heaps, key=lambda x: -x, consume=False), 100))',
+                1,
+            ),
+        ]
+
+
+class NsmallestTimeCase(object):
+
+    def time_next50(self):
+        return [
+            'next50',
+            (
+                'sorted',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'values = list(range({size}))\n'
+                    'random.shuffle(values)\n'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(values, key=lambda x: -x)\n'
+                    'for x in values[::3]: heap.remove(x)\n'
+                ),
+                'sorted(heap, key=lambda x: -x)[:50]',
+                10,
+            ),
+            (
+                'heapq.nsmallest',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'values = list(range({size}))\n'
+                    'random.shuffle(values)\n'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(values, key=lambda x: -x)\n'
+                    'for x in values[::3]: heap.remove(x)\n'
+                    'from heapq import nsmallest\n'
+                ),
+                'nsmallest(50, heap, key=lambda x: -x)',
+                10,
+            ),
+            (
+                'XHeap.nsmallest',
+                (
+                    'import random\n'
+                    'random.seed(0)\n'
+                    'values = list(range({size}))\n'
+                    'random.shuffle(values)\n'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(values, key=lambda x: -x)\n'
+                    'for x in values[::3]: heap.remove(x)\n'
+                ),
+                'heap.nsmallest(50)',
+                10,
+            ),
+        ]
+
+
+class ExternalHeapTimeCase(object):
+
+    def time_push_drain(self):
+        return [
+            'push+drain',
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import Heap, ExternalHeap;'
+                ),
+                'heap = Heap(); heap.push_many(values); list(heap.drain())',
+                1,
+            ),
+            (
+                'ExternalHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import Heap, ExternalHeap;'
+                ),
+                'heap = ExternalHeap(values, buffer_size=max({size}//10, 1)); list(heap.drain())',
+                1,
+            ),
+            (
+                'ExternalHeap(no mmap)',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import Heap, ExternalHeap;'
+                ),
+                'heap = ExternalHeap(values, buffer_size=max({size}//10, 1), use_mmap=False); list(heap.drain())',
+                1,
+            ),
+        ]
+
+    def time_interleaved(self):
+        return [
+            'push+pop',
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import Heap, ExternalHeap;'
+                ),
+                'heap = Heap(values); [heap.pushpop(value) for value in values]',
+                1,
+            ),
+            (
+                'ExternalHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = [random.random() for _ in range({size})];'
+                    'from xheap import Heap, ExternalHeap;'
+                ),
+                'heap = ExternalHeap(values, buffer_size=max({size}//10, 1))\nfor value in values: heap.push(value); heap.pop()',
+                1,
+            ),
+        ]
+
+
+class ShardedXHeapTimeCase(object):
+
+    def time_push_many(self):
+        return [
+            'push_many',
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import ShardedXHeap, XHeap;'
+                ),
+                'XHeap(key=key).push_many(values)',
+                1,
+            ),
+            (
+                'ShardedXHeap(2)',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import ShardedXHeap, XHeap;'
+                ),
+                'heap = ShardedXHeap(key=key, shards=2); heap.push_many(values); heap.close()',
+                1,
+            ),
+            (
+                'ShardedXHeap(4)',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import ShardedXHeap, XHeap;'
+                ),
+                'heap = ShardedXHeap(key=key, shards=4); heap.push_many(values); heap.close()',
+                1,
+            ),
+        ]
+
+    def time_pop_many(self):
+        return [
+            'push_many+pop_many',
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import ShardedXHeap, XHeap;'
+                ),
+                'heap = XHeap(values, key=key); heap.pop_many(len(values) // 10)',
+                1,
+            ),
+            (
+                'ShardedXHeap(4)',
+                (
+                    'import random;'
+                    'random.seed(0);'
+                    'values = list(range({size}));'
+                    'random.shuffle(values);'
+                    'key = lambda x: sum(range(x % 100));'
+                    'from xheap import ShardedXHeap, XHeap;'
+                ),
+                'heap = ShardedXHeap(values, key=key, shards=4); heap.pop_many(len(values) // 10); heap.close()',
+                1,
+            ),
+        ]
+
+
+class ExecutorTimeCase(object):
+
+    def time_init(self):
+        return [
+            'init(compress)',
+            (
+                'OrderHeap',
+                (
+                    'import zlib;'
+                    'items = [str(i).encode() * 30 for i in range({size})];'
+                    'from xheap import OrderHeap;'
+                ),
+                'OrderHeap(items, key=zlib.compress)',
+                1,
+            ),
+            (
+                'OrderHeap(threads)',
+                (
+                    'import zlib;'
+                    'items = [str(i).encode() * 30 for i in range({size})];'
+                    'from xheap import OrderHeap;'
+                    'from concurrent.futures import ThreadPoolExecutor;'
+                    'executor = ThreadPoolExecutor(4);'
+                ),
+                'OrderHeap(items, key=zlib.compress, executor=executor)',
+                1,
+            ),
+            (
+                'OrderHeap(processes)',
+                (
+                    'import zlib;'
+                    'items = [str(i).encode() * 30 for i in range({size})];'
+                    'from xheap import OrderHeap;'
+                    'from concurrent.futures import ProcessPoolExecutor;'
+                    'executor = ProcessPoolExecutor(4);'
+                ),
+                'OrderHeap(items, key=zlib.compress, executor=executor)',
+                1,
+            ),
+        ]
+
+
+class SnapshotTimeCase(object):
+
+    def time_restore(self):
+        return [
+            'restore',
+            (
+                'XHeap(items)',
+                (
+                    'import os, random, tempfile\n'
+                    'random.seed(0)\n'
+                    'items = [\'task%d\' % i for i in range({size})]\n'
+                    'priorities = dict((item, random.random()) for item in items)\n'
+                    'key = lambda item: priorities[item]\n'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(items, key=key, stable=True)\n'
+                ),
+                'XHeap(items, key=key, stable=True)',
+                1,
+            ),
+            (
+                'XHeap.restore',
+                (
+                    'import os, random, tempfile\n'
+                    'random.seed(0)\n'
+                    'items = [\'task%d\' % i for i in range({size})]\n'
+                    'priorities = dict((item, random.random()) for item in items)\n'
+                    'key = lambda item: priorities[item]\n'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(items, key=key, stable=True)\n'
+                    'path = os.path.join(tempfile.gettempdir(), \'xheap_snapshot\')\n'
+                    'heap.snapshot(path)\n'
+                ),
+                'XHeap.restore(path, key=key)',
+                1,
+            ),
+        ]
+
+    def time_save(self):
+        return [
+            'save',
+            (
+                'pickle tuples',
+                (
+                    'import os, random, tempfile\n'
+                    'random.seed(0)\n'
+                    'items = [\'task%d\' % i for i in range({size})]\n'
+                    'priorities = dict((item, random.random()) for item in items)\n'
+                    'key = lambda item: priorities[item]\n'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(items, key=key, stable=True)\n'
+                    'import pickle\n'
+                    'path = os.path.join(tempfile.gettempdir(), \'xheap_snapshot\')\n'
+                    'def save():\n'
+                    '    with open(path, \'wb\') as f: pickle.dump((heap[:], heap._item_set), f, pickle.HIGHEST_PROTOCOL)\n'
+                ),
+                'save()',
+                1,
+            ),
+            (
+                'XHeap.snapshot',
+                (
+                    'import os, random, tempfile\n'
+                    'random.seed(0)\n'
+                    'items = [\'task%d\' % i for i in range({size})]\n'
+                    'priorities = dict((item, random.random()) for item in items)\n'
+                    'key = lambda item: priorities[item]\n'
+                    'from xheap import XHeap\n'
+                    'heap = XHeap(items, key=key, stable=True)\n'
+                    'path = os.path.join(tempfile.gettempdir(), \'xheap_snapshot\')\n'
+                ),
+                'heap.snapshot(path)',
+                1,
+            ),
+        ]
+
+
+class MemoryCase(object):
+
+    def memory_floats(self):
+        return [
+            'floats',
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'from xheap import Heap;'
+                ),
+                'heap = Heap(random.random() for _ in range({size}))',
+            ),
+            (
+                'CompactHeap',
+                (
+                    'import random;'
+                    'from xheap import CompactHeap;'
+                ),
+                'heap = CompactHeap((random.random() for _ in range({size})), typecode="d")',
+            ),
+            (
+                'ArrayHeap',
+                (
+                    'import random;'
+                    'import numpy;'
+                    'from xheap import ArrayHeap;'
+                    'ArrayHeap(numpy.random.rand(1), numpy.arange(1));'
+                ),
+                'heap = ArrayHeap(numpy.random.rand({size}), numpy.arange({size}))',
+            ),
+        ]
+
+    def memory_ints(self):
+        return [
+            'ints',
+            (
+                'Heap',
+                (
+                    'import random;'
+                    'from xheap import Heap;'
+                ),
+                'heap = Heap(random.randrange(2**40) for _ in range({size}))',
+            ),
+            (
+                'CompactHeap',
+                (
+                    'import random;'
+                    'from xheap import CompactHeap;'
+                ),
+                'heap = CompactHeap((random.randrange(2**40) for _ in range({size})), typecode="q")',
+            ),
+            (
+                'CompactHeap(i)',
+                (
+                    'import random;'
+                    'from xheap import CompactHeap;'
+                ),
+                'heap = CompactHeap((random.randrange(2**30) for _ in range({size})), typecode="i")',
+            ),
+        ]
+
+    def memory_keyed(self):
+        return [
+            'keyed',
+            (
+                'OrderHeap',
+                (
+                    'import random;'
+                    'from xheap import OrderHeap;'
+                    'values = [random.random() for _ in range({size})];'
+                ),
+                'heap = OrderHeap(values, key=float)',
+            ),
+            (
+                'XHeap',
+                (
+                    'import random;'
+                    'from xheap import XHeap;'
+                    'values = [random.random() for _ in range({size})];'
+                ),
+                'heap = XHeap(values, key=float)',
+            ),
+            (
+                'IndexHeap',
+                (
+                    'import random;'
+                    'from xheap import IndexHeap;'
+                    'values = [random.random() for _ in range({size})];'
+                ),
+                'heap = IndexHeap(values, key=float)',
+            ),
+        ]
+
+
+time_cases = (HeapTimeCase(), OrderHeapTimeCase(), RemovalHeapTimeCase(), DaryHeapTimeCase(), PairingHeapTimeCase(), ArrayHeapTimeCase(), CompactHeapTimeCase(), ConcurrentXHeapTimeCase(), AsyncXHeapTimeCase(), TimerHeapTimeCase(), BoundedHeapTimeCase(), MergeIterTimeCase(), NsmallestTimeCase(), SnapshotTimeCase(), ExternalHeapTimeCase(), ShardedXHeapTimeCase(), ExecutorTimeCase())
+memory_cases = (MemoryCase(),)
+separator = '--------------------------------------------------------------------'
+
+
+def iter_case_configs(cases, prefix, select):
+    """Yields (case name, label, configs) of all methods starting with prefix whose case name or label contains select."""
+    for case in cases:
+        case_name = case.__class__.__name__.replace('TimeCase', '').replace('Case', '')
+        for method in sorted(dir(case)):
+            if not method.startswith(prefix) or not callable(getattr(case, method)):
+                continue
+            configs = getattr(case, method)()
+            label, configs = configs[0], configs[1:]
+            if select.lower() in '{case_name}.{label}'.format(case_name=case_name, label=label).lower():
+                yield case_name, label, configs
+
+
+def perform_time_configs(configs, sizes, repetitions):
+    """Yields (config, best time per size) of all configs; configs whose imports fail are skipped."""
+    for config in configs:
+        _, setup, stmt, number = config
+        try:
+            yield config, [min(repeat(stmt.format(size=size), setup.format(size=size), number=(number or size), repeat=repetitions)) for size in sizes]
+        except ImportError:
             pass
 
 
-for htc in (HeapTimeCase(), OrderHeapTimeCase(), RemovalHeapTimeCase()):
-    config_methods = [getattr(htc, method) for method in dir(htc) if method.startswith('time_') and callable(getattr(htc, method))]
-    configs_list = [config_method() for config_method in config_methods]
-    align_label = max(len(cs[0]) for cs in configs_list)
-    align_module = max(len(c[0]) for cs in configs_list for c in cs)
+def measure_memory_configs(configs, sizes):
+    """Yields (config, traced bytes per item per size) of all configs; configs whose imports fail are skipped."""
+    for config in configs:
+        _, setup, stmt = config
+        results = []
+        for size in sizes:
+            namespace = {}
+            try:
+                exec(setup.format(size=size), namespace)
+            except ImportError:
+                break
+            tracemalloc.start()
+            exec(stmt.format(size=size), namespace)
+            results.append(tracemalloc.get_traced_memory()[0] / size)
+            tracemalloc.stop()
+        else:
+            yield config, results
+
+
+def run_time_cases(cases, sizes, repetitions, select):
+    """Prints the times in ms (and relative to the first config of each label); returns them by case.label.config."""
+    report = {}
+    case_configs = list(iter_case_configs(cases, 'time_', select))
+    align_label, align_name = _alignments(case_configs)
+    for case_name, label, configs in case_configs:
+        baseline_results = None
+        for i, (config, results) in enumerate(perform_time_configs(configs, sizes, repetitions)):
+            baseline_results = baseline_results or results
+            printed_label = ('{case_name}.{label}'.format(case_name=case_name, label=label) if i == 0 else '').ljust(align_label)
+            print(printed_label, config[0].ljust(align_name), ' '.join('{:8.2f} ({:5.2f}x)'.format(result*1000, result/baseline_result) for result, baseline_result in zip(results, baseline_results)))
+            report['{case_name}.{label}.{name}'.format(case_name=case_name, label=label, name=config[0])] = dict(zip(map(str, sizes), results))
+        print(separator)
+    return report
+
+
+def run_memory_cases(cases, sizes, select):
+    """Prints the traced bytes per item; returns them by case.label.config."""
+    report = {}
+    case_configs = list(iter_case_configs(cases, 'memory_', select))
+    align_label, align_name = _alignments(case_configs)
+    for case_name, label, configs in case_configs:
+        for i, (config, results) in enumerate(measure_memory_configs(configs, sizes)):
+            printed_label = ('{case_name}.{label}'.format(case_name=case_name, label=label) if i == 0 else '').ljust(align_label)
+            print(printed_label, config[0].ljust(align_name), ' '.join('{:6.1f} bytes/item'.format(result) for result in results))
+            report['{case_name}.{label}.{name}'.format(case_name=case_name, label=label, name=config[0])] = dict(zip(map(str, sizes), results))
+        print(separator)
+    return report
+
+
+def _alignments(case_configs):
+    """Returns the widths of the label column and the config name column."""
+    if not case_configs:
+        return 0, 0
+    align_label = max(len(case_name) + 1 + len(label) for case_name, label, _ in case_configs)
+    align_name = max(len(config[0]) for _, _, configs in case_configs for config in configs)
+    return align_label, align_name
+
+
+def compare_reports(report, baseline, tolerance):
+    """Prints and returns all results which are more than tolerance worse than those of baseline."""
+    regressions = []
+    for kind in ('time', 'memory'):
+        for name, results in sorted(report[kind].items()):
+            baseline_results = baseline.get(kind, {}).get(name, {})
+            for size, result in sorted(results.items(), key=lambda size_result: int(size_result[0])):
+                baseline_result = baseline_results.get(size)
+                if baseline_result and result > baseline_result * (1 + tolerance):
+                    regressions.append((kind, name, size, baseline_result, result))
+                    print('regression: {kind} of {name} for {size} items: {baseline_result:.6g} -> {result:.6g} ({ratio:.2f}x)'.format(kind=kind, name=name, size=size, baseline_result=baseline_result, result=result, ratio=result/baseline_result))
+    return regressions
+
 
-    for configs in configs_list:
-        label, configs = configs[0], configs[1:]
-        results = list(perform_time_configs(configs))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the xheap classes against heapq (and sortedcontainers if installed).')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10**3, 10**4, 10**5, 10**6], help='heap sizes (default: 10^3 to 10^6)')
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions per measurement; the best is taken (default: 5)')
+    parser.add_argument('-k', '--select', default='', help='run only the cases whose "case.label" contains this (e.g. "XHeap" or "pop")')
+    parser.add_argument('--no-time', action='store_true', help='skip the time cases')
+    parser.add_argument('--no-memory', action='store_true', help='skip the memory cases')
+    parser.add_argument('--json', metavar='PATH', help='write the results to PATH')
+    parser.add_argument('--baseline', metavar='PATH', help='compare with the results of an earlier --json run; exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown tolerated by --baseline (default: 0.2)')
+    args = parser.parse_args(argv)
 
-        baseline_config = configs[0]
-        baseline_results = results[0]
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'xheap': xheap.__version__,
+        'sizes': args.sizes,
+        'repeat': args.repeat,
+        'time': {},
+        'memory': {},
+    }
+    print('xheap {xheap} on {implementation} {python} ({platform}); sizes: {sizes}'.format(**report))
+    print(separator)
+    if not args.no_time:
+        report['time'] = run_time_cases(time_cases, args.sizes, args.repeat, args.select)
+    if not args.no_memory:
+        if tracemalloc is None:
+            print('memory cases skipped; tracemalloc is not available')
+        else:
+            report['memory'] = run_memory_cases(memory_cases, args.sizes, args.select)
 
-        for i, (config, results) in enumerate(zip(configs, results)):
-            printed_label = (label if i == 0 else '').ljust(align_label)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare_reports(report, baseline, args.tolerance):
+            return 1
+        print('no regressions compared to {path}'.format(path=args.baseline))
+    return 0
 
-            print(printed_label, config[0].ljust(align_module), ' '.join('{:5.2f} ({:5.2f}x)'.format(result*1000, result/baseline_result) for result, baseline_result in zip(results, baseline_results)))
 
-        print('--------------------------------------------------------------------')
-    print('--------------------------------------------------------------------')
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,11 +2,70 @@
 
 from __future__ import unicode_literals
 
-from heapq import heapify, heappushpop, heapreplace, heappop, heappush
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from array import array
+from collections import deque
+from functools import partial
+from heapq import heapify, heappushpop, heapreplace, heappop, heappush, merge as heapq_merge, nlargest, _siftdown
+from itertools import chain, count, islice
+from operator import itemgetter
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from heapq import heapify_max, heappushpop_max, heapreplace_max, heappop_max
+except ImportError:
+    from heapq import _heapify_max as heapify_max, _siftup_max
+    try:
+        from heapq import _heapreplace_max as heapreplace_max, _heappop_max as heappop_max
+    except ImportError:
+        def heappop_max(heap):
+            last_item = heap.pop()
+            if heap:
+                return_item = heap[0]
+                heap[0] = last_item
+                _siftup_max(heap, 0)
+                return return_item
+            return last_item
+
+        def heapreplace_max(heap, item):
+            return_item = heap[0]
+            heap[0] = item
+            _siftup_max(heap, 0)
+            return return_item
+
+    def heappushpop_max(heap, item):
+        if heap and item < heap[0]:
+            item, heap[0] = heap[0], item
+            _siftup_max(heap, 0)
+        return item
 
 __version__ = '0.17'
 __version_info__ = (0, 17)
-__all__ = ['Heap', 'OrderHeap', 'RemovalHeap', 'XHeap', 'InvalidHeapError']
+__all__ = ['Heap', 'MaxHeap', 'DaryHeap', 'BoundedHeap', 'OrderHeap', 'RemovalHeap', 'XHeap', 'ConcurrentXHeap', 'AsyncXHeap', 'ShardedXHeap', 'IndexHeap', 'PairingHeap', 'TimerHeap', 'ArrayHeap', 'CompactHeap', 'ExternalHeap', 'merge_iter', 'InvalidHeapError']
 
 
 class Heap(list):
@@ -29,9 +88,48 @@ class Heap(list):
     def push(self, item):
         heappush(self, item)
 
+    def push_many(self, iterable):
+        """Pushes all items at once; heapifies instead of pushing item by item if the batch outgrows the heap."""
+        items = list(iterable)
+        if len(items) < super(Heap, self).__len__():
+            for item in items:
+                heappush(self, item)
+        else:
+            self.extend(items)
+            heapify(self)
+
+    def merge(self, other):
+        """Pushes all items of the other heap into this heap; the other heap stays untouched."""
+        self.push_many(other)
+
     def pop(self):
         return heappop(self)
 
+    def pop_many(self, k):
+        """Pops the k smallest items (or all if there are less); sorts instead of popping item by item if k is large."""
+        if 3*k < super(Heap, self).__len__():
+            return [heappop(self) for _ in range(k)]
+        self.sort()
+        return_items = self[:k]
+        del self[:k]
+        return return_items
+
+    def drain(self):
+        """Pops and yields all items in order; the remaining items stay in the heap if you stop early."""
+        while self:
+            yield heappop(self)
+
+    def iter_sorted(self):
+        """
+        Yields all items in order without changing the heap; walks down the heap with a frontier heap of indices;
+        i.e. O(log k) per item for the first k items. Don't change the heap while iterating.
+        """
+        return _iter_sorted(self)
+
+    def nsmallest(self, k):
+        """Returns the first k items in order (what pop_many(k) would return) without changing the heap; O(k log k)."""
+        return list(islice(self.iter_sorted(), k))
+
     def remove(self, item):
         raise NotImplementedError
 
@@ -55,44 +153,461 @@ class Heap(list):
             if self[index] < self[parent_index]:
                 raise InvalidHeapError('heap invariant (heap[{parent_index}] <= heap[{index}]) violated: {parent} !<= {item}'.format(parent=self[parent_index], parent_index=parent_index, item=self[index], index=index))
 
+    def snapshot(self, path):
+        """
+        Saves the heap as it is (heap list, stored keys, item set) to path; see restore. The key function is not saved
+        as lambdas cannot be pickled. Numeric keys and items are saved as unboxed arrays.
+        """
+        entries, state = self._snapshot()
+        state.pop('key', None)
+        with open(path, 'wb') as snapshot_file:
+            pickle.dump((entries, state), snapshot_file, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def restore(cls, path, key=None):
+        """Loads a heap saved by snapshot; keyed heaps need their key again. Neither calls key nor heapifies."""
+        with open(path, 'rb') as snapshot_file:
+            entries, state = pickle.load(snapshot_file)
+        if isinstance(entries, tuple):
+            if not key:
+                raise RuntimeError('specify key when restoring {name}'.format(name=cls.__name__))
+            state['key'] = key
+        return _restored(cls, entries, state)
+
+    def _snapshot(self):
+        """Returns the packed heap list and the attributes to save."""
+        state = self._snapshot_state()
+        return _packed_entries(self[:], state.get('key') is not None), state
+
+    def _snapshot_state(self):
+        """Returns a copy of the attributes; the sequence counter is saved by value and the executor is not saved."""
+        state = dict(self.__dict__)
+        if state.get('_counter') is not None:
+            state['_counter'] = next(self._counter)
+            self._counter = count(state['_counter'])
+        if state.get('executor') is not None:
+            state['executor'] = None
+        return state
+
+    def _restore(self, entries, state):
+        self.__dict__.update(state)
+        if state.get('_counter') is not None:
+            self._counter = count(state['_counter'])
+        self.extend(entries)
+
+    def __reduce__(self):
+        return (_restored, (self.__class__,) + self._snapshot())
+
+    def __ior__(self, other):
+        self.merge(other)
+        return self
+
     def __repr__(self):
         return 'Heap({content})'.format(content=super(Heap, self).__repr__())
 
 
+class MaxHeap(Heap):
+    """
+    MaxHeap is a heap that pops its largest item first. Unlike OrderHeap with a negating key, it stores the items
+    as they are; thus, it needs neither a key call nor a tuple per item.
+
+    Heap Invariant: a[k] >= a[2*k+1] and a[k] >= a[2*k+2]
+    """
+
+    def push(self, item):
+        self.append(item)
+        index = len(self)-1
+        while index:
+            parent_index = (index-1) >> 1
+            parent = self[parent_index]
+            if not parent < item:
+                break
+            self[index] = parent
+            index = parent_index
+        self[index] = item
+
+    def push_many(self, iterable):
+        items = list(iterable)
+        if len(items) < super(Heap, self).__len__():
+            for item in items:
+                self.push(item)
+        else:
+            self.extend(items)
+            heapify_max(self)
+
+    def pop(self):
+        return heappop_max(self)
+
+    def pop_many(self, k):
+        if 3*k < super(Heap, self).__len__():
+            return [heappop_max(self) for _ in range(k)]
+        self.sort(reverse=True)
+        return_items = self[:k]
+        del self[:k]
+        return return_items
+
+    def drain(self):
+        while self:
+            yield heappop_max(self)
+
+    def iter_sorted(self):
+        return _iter_sorted(self, frontier_class=MaxHeap)
+
+    def heapify(self):
+        heapify_max(self)
+
+    def poppush(self, item):
+        return heapreplace_max(self, item)
+    replace = poppush
+
+    def pushpop(self, item):
+        return heappushpop_max(self, item)
+
+    def check_invariant(self):
+        for index in range(super(Heap, self).__len__()-1, 0, -1):
+            parent_index = (index-1) >> 1
+            if self[parent_index] < self[index]:
+                raise InvalidHeapError('heap invariant (heap[{parent_index}] >= heap[{index}]) violated: {parent} !>= {item}'.format(parent=self[parent_index], parent_index=parent_index, item=self[index], index=index))
+
+    def __repr__(self):
+        return 'MaxHeap({content})'.format(content=super(Heap, self).__repr__())
+
+
+class DaryHeap(Heap):
+    """
+    DaryHeap is a heap whose nodes have arity children instead of 2; useful when
+        - comparisons are expensive and you push a lot as pushing compares only once per level
+        - the heap is large as it has log(arity) times less levels
+    Beware that it cannot use the C implementation of heapq.
+
+    Heap Invariant: a[k] <= a[arity*k+1], ..., a[k] <= a[arity*k+arity]
+    """
+
+    def __init__(self, iterable=[], arity=4):
+        if arity < 2:
+            raise RuntimeError('arity must be at least 2: {arity}'.format(arity=arity))
+        self.arity = arity
+        super(DaryHeap, self).__init__(iterable)
+
+    def push(self, item):
+        self.append(item)
+        self._sift_up(len(self)-1)
+
+    def push_many(self, iterable):
+        items = list(iterable)
+        if len(items) < len(self):
+            for item in items:
+                self.append(item)
+                self._sift_up(len(self)-1)
+        else:
+            self.extend(items)
+            self.heapify()
+
+    def pop(self):
+        last_item = super(Heap, self).pop()
+        if not self:
+            return last_item
+        return_item = self[0]
+        self[0] = last_item
+        self._sift_down(0)
+        return return_item
+
+    def pop_many(self, k):
+        if 3*k < len(self):
+            return [self.pop() for _ in range(k)]
+        self.sort()
+        return_items = self[:k]
+        del self[:k]
+        return return_items
+
+    def drain(self):
+        while self:
+            yield self.pop()
+
+    def iter_sorted(self):
+        return _iter_sorted(self, arity=self.arity)
+
+    def heapify(self):
+        for index in range((len(self)-2) // self.arity, -1, -1):
+            self._sift_down(index)
+
+    def poppush(self, item):
+        return_item = self[0]
+        self[0] = item
+        self._sift_down(0)
+        return return_item
+    replace = poppush
+
+    def pushpop(self, item):
+        if self and self[0] < item:
+            item, self[0] = self[0], item
+            self._sift_down(0)
+        return item
+
+    def check_invariant(self):
+        for index in range(len(self)-1, 0, -1):
+            parent_index = (index-1) // self.arity
+            if self[index] < self[parent_index]:
+                raise InvalidHeapError('heap invariant (heap[{parent_index}] <= heap[{index}]) violated: {parent} !<= {item}'.format(parent=self[parent_index], parent_index=parent_index, item=self[index], index=index))
+
+    def _sift_up(self, index):
+        item = self[index]
+        arity = self.arity
+        while index:
+            parent_index = (index-1) // arity
+            parent = self[parent_index]
+            if not item < parent:
+                break
+            self[index] = parent
+            index = parent_index
+        self[index] = item
+
+    def _sift_down(self, index):
+        item = self[index]
+        arity = self.arity
+        end_index = len(self)
+        child_index = arity*index + 1
+        while child_index < end_index:
+            child = self[child_index]
+            for sibling_index in range(child_index+1, min(child_index+arity, end_index)):
+                sibling = self[sibling_index]
+                if sibling < child:
+                    child_index, child = sibling_index, sibling
+            if not child < item:
+                break
+            self[index] = child
+            index = child_index
+            child_index = arity*index + 1
+        self[index] = item
+
+    def __repr__(self):
+        return 'DaryHeap({content}, arity={arity})'.format(content=super(Heap, self).__repr__(), arity=self.arity)
+
+
+class BoundedHeap(Heap):
+    """
+    BoundedHeap keeps only the maxsize largest items (by key if given) of all items pushed; useful for streaming top-k.
+    Its root is the smallest item kept; so, push rejects any item not larger than that with a single comparison and
+    without a key call (if there is no key) or a tuple (if there is a key). Like OrderHeap, items with equal keys
+    are compared with each other. Removing an item scans the heap; i.e. O(maxsize).
+    """
+
+    def __init__(self, maxsize, iterable=[], key=None):
+        if maxsize < 1:
+            raise RuntimeError('maxsize must be at least 1: {maxsize}'.format(maxsize=maxsize))
+        self.maxsize = maxsize
+        self.key = key
+        if key is None:
+            super(BoundedHeap, self).__init__(nlargest(maxsize, iterable))
+        else:
+            _list = list(iterable)
+            super(BoundedHeap, self).__init__(nlargest(maxsize, zip(map(key, _list), _list), key=_first))
+
+    def peek(self):
+        return self[0] if self.key is None else self[0][-1]
+
+    def push(self, item):
+        """Pushes the item; returns the item dropped (the smallest one or the item itself) or None if none was dropped."""
+        if self.key is None:
+            if super(Heap, self).__len__() < self.maxsize:
+                heappush(self, item)
+                return None
+            if not self[0] < item:
+                return item
+            return heapreplace(self, item)
+        item_key = self.key(item)
+        if super(Heap, self).__len__() < self.maxsize:
+            heappush(self, (item_key, item))
+            return None
+        if not self[0][0] < item_key:
+            return item
+        return heapreplace(self, (item_key, item))[-1]
+    pushpop = push
+
+    def push_many(self, iterable):
+        """Pushes all items; same as push but without a method call per item."""
+        maxsize, key = self.maxsize, self.key
+        iterator = iter(iterable)
+        for item in iterator:
+            if super(Heap, self).__len__() >= maxsize:
+                break
+            heappush(self, item if key is None else (key(item), item))
+        else:
+            return
+        self.push(item)
+        if key is None:
+            top = self[0]
+            for item in iterator:
+                if top < item:
+                    heapreplace(self, item)
+                    top = self[0]
+        else:
+            top_key = self[0][0]
+            for item in iterator:
+                item_key = key(item)
+                if top_key < item_key:
+                    heapreplace(self, (item_key, item))
+                    top_key = self[0][0]
+
+    def pop(self):
+        return heappop(self) if self.key is None else heappop(self)[-1]
+
+    def pop_many(self, k):
+        return_items = super(BoundedHeap, self).pop_many(k)
+        return return_items if self.key is None else [item_tuple[-1] for item_tuple in return_items]
+
+    def drain(self):
+        while self:
+            yield self.pop()
+
+    def iter_sorted(self):
+        if self.key is None:
+            return _iter_sorted(self)
+        return (item_tuple[-1] for item_tuple in _iter_sorted(self))
+
+    def remove(self, item):
+        for index, entry in enumerate(super(Heap, self).__iter__()):
+            if (entry if self.key is None else entry[-1]) == item:
+                break
+        else:
+            raise KeyError(item)
+        last_entry = super(Heap, self).pop()
+        if index == super(Heap, self).__len__():
+            return
+        self[index] = last_entry
+        if index and last_entry < self[(index-1) >> 1]:
+            _siftdown(self, 0, index)
+        else:
+            _siftup(self, index)
+
+    def poppush(self, item):
+        return_item = self.pop()
+        self.push(item)
+        return return_item
+    replace = poppush
+
+    def top(self):
+        """Returns the items kept sorted from largest to smallest; like heapq.nlargest."""
+        if self.key is None:
+            return sorted(super(Heap, self).__iter__(), reverse=True)
+        return [item_tuple[-1] for item_tuple in sorted(super(Heap, self).__iter__(), key=_first, reverse=True)]
+
+    def check_invariant(self):
+        super(BoundedHeap, self).check_invariant()
+        if super(Heap, self).__len__() > self.maxsize:
+            raise InvalidHeapError('heap exceeds maxsize: {size} > {maxsize}'.format(size=super(Heap, self).__len__(), maxsize=self.maxsize))
+
+    def __iter__(self):
+        if self.key is None:
+            return super(Heap, self).__iter__()
+        return (item_tuple[-1] for item_tuple in super(Heap, self).__iter__())
+
+    def __contains__(self, item):
+        return item in iter(self)
+
+    def __repr__(self):
+        return 'BoundedHeap({maxsize}, {content}, key={key})'.format(maxsize=self.maxsize, content=list(self), key=self.key)
+
+
 class OrderHeap(Heap):
     """
     OrderHeap is a heap that allows you to specify the sorting criteria which might come in handy for
         - several heaps for the same set of items but different orders
         - reversing the heap order aka max-heap
+
+    Items with equal keys are compared with each other. Use stable=True if that's expensive or impossible (e.g. dicts);
+    then, a sequence number breaks ties instead and items with equal keys are popped in insertion order.
+
+    Checking whether an item is in the heap scans the whole heap. Use membership=True to make that O(1); then, the heap
+    counts its items in a dict which costs roughly 40-100 bytes per distinct item.
+
+    If the key is expensive, pass an executor (e.g. concurrent.futures.ProcessPoolExecutor); then, __init__ and
+    push_many compute the keys in chunks on the executor and heapify once.
     """
 
-    def __init__(self, iterable=[], key=None):
+    def __init__(self, iterable=[], key=None, stable=False, membership=False, executor=None):
         if not key:
             raise RuntimeError('specify key when using OrderHeap; otherwise, just use Heap')
         self.key = key
-        super(OrderHeap, self).__init__((key(item), item) for item in iterable)
+        self.executor = executor
+        self._counter = count() if stable else None
+        _list = list(iterable)
+        self._item_set = _Multiset(_list) if membership else None
+        super(OrderHeap, self).__init__(_item_tuples(key, self._counter, _list, executor))
 
     def peek(self):
-        return self[0][1]
+        return self[0][-1]
 
     def push(self, item):
-        super(OrderHeap, self).push((self.key(item), item))
+        if self._counter is None:
+            heappush(self, (self.key(item), item))
+        else:
+            heappush(self, (self.key(item), next(self._counter), item))
+        if self._item_set is not None:
+            self._item_set.add(item)
+
+    def push_many(self, iterable):
+        _list = list(iterable)
+        super(OrderHeap, self).push_many(_item_tuples(self.key, self._counter, _list, self.executor))
+        if self._item_set is not None:
+            self._item_set.update(_list)
+
+    def merge(self, other):
+        item_tuples = _merged_item_tuples(self, other)
+        if item_tuples is None:
+            return super(OrderHeap, self).merge(other)
+        super(OrderHeap, self).push_many(item_tuples)
+        if self._item_set is not None:
+            self._item_set.update(item_tuple[-1] for item_tuple in item_tuples)
 
     def pop(self):
-        return super(OrderHeap, self).pop()[1]
+        return_item = heappop(self)[-1]
+        if self._item_set is not None:
+            self._item_set.remove(return_item)
+        return return_item
+
+    def pop_many(self, k):
+        return_items = [item_tuple[-1] for item_tuple in super(OrderHeap, self).pop_many(k)]
+        if self._item_set is not None:
+            for return_item in return_items:
+                self._item_set.remove(return_item)
+        return return_items
+
+    def drain(self):
+        while self:
+            yield self.pop()
+
+    def iter_sorted(self):
+        return (item_tuple[-1] for item_tuple in _iter_sorted(self))
 
     def poppush(self, item):
-        return heapreplace(self, (self.key(item), item))[1]
+        if self._counter is None:
+            return_item = heapreplace(self, (self.key(item), item))[-1]
+        else:
+            return_item = heapreplace(self, (self.key(item), next(self._counter), item))[-1]
+        if self._item_set is not None:
+            self._item_set.add(item)
+            self._item_set.remove(return_item)
+        return return_item
     replace = poppush
 
     def pushpop(self, item):
-        return heappushpop(self, (self.key(item), item))[1]
+        if self._counter is None:
+            return_item = heappushpop(self, (self.key(item), item))[-1]
+        else:
+            return_item = heappushpop(self, (self.key(item), next(self._counter), item))[-1]
+        if self._item_set is not None and return_item is not item:
+            self._item_set.add(item)
+            self._item_set.remove(return_item)
+        return return_item
 
     def __iter__(self):
-        return (item_tuple[1] for item_tuple in super(Heap, self).__iter__())
+        return (item_tuple[-1] for item_tuple in super(Heap, self).__iter__())
 
     def __contains__(self, item):
-        return item in iter(self)
+        if self._item_set is None:
+            return item in iter(self)
+        return item in self._item_set
 
     def __repr__(self):
         return 'OrderHeap({content}, key={key})'.format(content=list(self), key=self.key)
@@ -103,11 +618,23 @@ class RemovalHeap(Heap):
     RemovalHeap is a heap that allows you to remove an item without knowing its index in the heap; useful when
         - users want cancel tasks from a task queue
         - you have two queues of same items, pop an item from one and you want to remove it from the other, too
+
+    Removed items stay in the heap until they are swept. Sweeping starts once less than sweep_ratio of the heap
+    is alive. With sweep_step=None, a sweep rebuilds the whole heap at once. Otherwise, the tombstones are
+    compacted incrementally in chunks of sweep_step heap slots per remove/pop, which keeps those operations
+    free of O(n) latency spikes.
+
+    Items must be unique unless you pass duplicates=True. Then, each item is counted: remove drops one occurrence
+    of an item and len counts all occurrences. The count for each item is kept in a dict instead of a set.
     """
 
-    def __init__(self, iterable=[]):
+    def __init__(self, iterable=[], duplicates=False, sweep_ratio=0.5, sweep_step=None):
+        self.duplicates = duplicates
+        self.sweep_ratio = sweep_ratio
+        self.sweep_step = sweep_step
+        self._sweep_index = 0
         _list = list(iterable)
-        self._item_set = set(_list)
+        self._item_set = _Multiset(_list) if duplicates else set(_list)
         if len(_list) != len(self._item_set):
             raise RuntimeError('duplicate items not allowed: {_list}'.format(_list=_list))
         super(RemovalHeap, self).__init__(_list)
@@ -120,11 +647,19 @@ class RemovalHeap(Heap):
         return return_item
 
     def push(self, item):
-        if item in self._item_set:
+        if item in self._item_set and not self.duplicates:
             raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
         heappush(self, item)
         self._item_set.add(item)
 
+    def push_many(self, iterable):
+        _list = list(iterable)
+        new_items = _list if self.duplicates else set(_list)
+        if not self.duplicates and (len(_list) != len(new_items) or not self._item_set.isdisjoint(new_items)):
+            raise RuntimeError('duplicate items not allowed: {_list}'.format(_list=_list))
+        super(RemovalHeap, self).push_many(_list)
+        self._item_set.update(new_items)
+
     def pop(self):
         return_item = heappop(self)
         while return_item not in self._item_set:
@@ -133,12 +668,49 @@ class RemovalHeap(Heap):
         self.sweep()
         return return_item
 
+    def pop_many(self, k):
+        item_set = self._item_set
+        return_items = []
+        if 3*k < len(item_set):
+            while len(return_items) < k:
+                return_item = heappop(self)
+                if return_item in item_set:
+                    item_set.remove(return_item)
+                    return_items.append(return_item)
+        else:
+            self.sort()
+            index = 0
+            while len(return_items) < k and item_set:
+                return_item = self[index]
+                if return_item in item_set:
+                    item_set.remove(return_item)
+                    return_items.append(return_item)
+                index += 1
+            del self[:index]
+        self.sweep()
+        return return_items
+
+    def drain(self):
+        item_set = self._item_set
+        try:
+            while item_set:
+                return_item = heappop(self)
+                if return_item in item_set:
+                    item_set.remove(return_item)
+                    yield return_item
+        finally:
+            self.sweep()
+
+    def iter_sorted(self):
+        """Same as Heap.iter_sorted but skips tombstones."""
+        return _alive_items(_iter_sorted(self), self._item_set, self.duplicates)
+
     def remove(self, item):
         self._item_set.remove(item)
         self.sweep()
 
     def poppush(self, item):
-        if item in self._item_set:
+        if item in self._item_set and not self.duplicates:
             raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
         self._item_set.add(item)
         while self[0] not in self._item_set:
@@ -149,7 +721,7 @@ class RemovalHeap(Heap):
     replace = poppush
 
     def pushpop(self, item):
-        if item in self._item_set:
+        if item in self._item_set and not self.duplicates:
             raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
         self._item_set.add(item)
         return_item = heappushpop(self, item)
@@ -159,9 +731,15 @@ class RemovalHeap(Heap):
         return return_item
 
     def sweep(self):
-        if 2*len(self._item_set) < super(RemovalHeap, self).__len__():
-            self[:] = list(self)
-            self.heapify()
+        if not self._sweep_index:
+            if len(self._item_set) >= self.sweep_ratio*super(RemovalHeap, self).__len__():
+                return
+            if self.sweep_step is None:
+                self[:] = list(self)
+                self.heapify()
+                return
+            self._sweep_index = super(RemovalHeap, self).__len__()
+        self._sweep_index = _sweep_chunk(self, self._item_set.__contains__, self._sweep_index, self.sweep_step)
 
     def __iter__(self):
         return iter(self._item_set)
@@ -173,6 +751,8 @@ class RemovalHeap(Heap):
         return len(self._item_set)
 
     def __repr__(self):
+        if self.duplicates:
+            return 'RemovalHeap({content}, duplicates=True)'.format(content=list(self))
         return 'RemovalHeap({content})'.format(content=list(self))
 
 
@@ -180,68 +760,154 @@ class XHeap(Heap):
     """Hybrid of OrderHeap and RemovalHeap."""
 
     # order + removal
-    def __init__(self, iterable=[], key=None):
+    def __init__(self, iterable=[], key=None, stable=False, duplicates=False, sweep_ratio=0.5, sweep_step=None, executor=None):
         if not key:
             raise RuntimeError('specify key when using XHeap; otherwise, just use RemovalHeap')
         self.key = key
+        self.executor = executor
+        self._counter = count() if stable else None
+        self.duplicates = duplicates
+        self.sweep_ratio = sweep_ratio
+        self.sweep_step = sweep_step
+        self._sweep_index = 0
         _list = list(iterable)
-        self._item_set = set(_list)
+        self._item_set = _Multiset(_list) if duplicates else set(_list)
         if len(_list) != len(self._item_set):
             raise RuntimeError('duplicate items not allowed: {_list}'.format(_list=_list))
-        super(XHeap, self).__init__((key(item), item) for item in _list)
+        super(XHeap, self).__init__(_item_tuples(key, self._counter, _list, executor))
 
     # order
     def peek(self):
-        return_item = self[0][1]
+        return_item = self[0][-1]
         while return_item not in self._item_set:
             heappop(self)
-            return_item = self[0][1]
+            return_item = self[0][-1]
         return return_item
 
     # order + removal
     def push(self, item):
-        if item in self._item_set:
+        if item in self._item_set and not self.duplicates:
             raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
-        heappush(self, (self.key(item), item))
+        if self._counter is None:
+            heappush(self, (self.key(item), item))
+        else:
+            heappush(self, (self.key(item), next(self._counter), item))
         self._item_set.add(item)
 
+    def push_many(self, iterable):
+        _list = list(iterable)
+        self._push_many(_list, _item_tuples(self.key, self._counter, _list, self.executor))
+
+    def merge(self, other):
+        item_tuples = _merged_item_tuples(self, other)
+        if item_tuples is None:
+            return super(XHeap, self).merge(other)
+        self._push_many([item_tuple[-1] for item_tuple in item_tuples], item_tuples)
+
+    def _push_many(self, _list, item_tuples):
+        new_items = _list if self.duplicates else set(_list)
+        if not self.duplicates and (len(_list) != len(new_items) or not self._item_set.isdisjoint(new_items)):
+            raise RuntimeError('duplicate items not allowed: {_list}'.format(_list=_list))
+        super(XHeap, self).push_many(item_tuples)
+        self._item_set.update(new_items)
+
     def pop(self):
-        return_item = heappop(self)[1]
+        return_item = heappop(self)[-1]
         while return_item not in self._item_set:
-            return_item = heappop(self)[1]
+            return_item = heappop(self)[-1]
         self._item_set.remove(return_item)
         self.sweep()
         return return_item
 
+    def pop_many(self, k):
+        item_set = self._item_set
+        return_items = []
+        if 3*k < len(item_set):
+            while len(return_items) < k:
+                return_item = heappop(self)[-1]
+                if return_item in item_set:
+                    item_set.remove(return_item)
+                    return_items.append(return_item)
+        else:
+            self.sort()
+            index = 0
+            while len(return_items) < k and item_set:
+                return_item = self[index][-1]
+                if return_item in item_set:
+                    item_set.remove(return_item)
+                    return_items.append(return_item)
+                index += 1
+            del self[:index]
+        self.sweep()
+        return return_items
+
+    def drain(self):
+        item_set = self._item_set
+        try:
+            while item_set:
+                return_item = heappop(self)[-1]
+                if return_item in item_set:
+                    item_set.remove(return_item)
+                    yield return_item
+        finally:
+            self.sweep()
+
+    def iter_sorted(self):
+        """Same as Heap.iter_sorted but skips tombstones."""
+        return _alive_items((item_tuple[-1] for item_tuple in _iter_sorted(self)), self._item_set, self.duplicates)
+
     def remove(self, item):
         self._item_set.remove(item)
         self.sweep()
 
     def sweep(self):
-        if 2*len(self._item_set) < super(XHeap, self).__len__():
-            self[:] = (item_tuple for item_tuple in super(XHeap, self).__iter__() if item_tuple[1] in self._item_set)
-            self.heapify()
+        if not self._sweep_index:
+            if len(self._item_set) >= self.sweep_ratio*super(XHeap, self).__len__():
+                return
+            if self.sweep_step is None:
+                self[:] = self._alive_item_tuples()
+                self.heapify()
+                return
+            self._sweep_index = super(XHeap, self).__len__()
+        item_set = self._item_set
+        self._sweep_index = _sweep_chunk(self, lambda item_tuple: item_tuple[-1] in item_set, self._sweep_index, self.sweep_step)
+
+    def _alive_item_tuples(self):
+        """Returns one item tuple per item occurrence alive; i.e. without tombstones."""
+        counts = dict.copy(self._item_set) if self.duplicates else dict.fromkeys(self._item_set, 1)
+        item_tuples = []
+        for item_tuple in super(XHeap, self).__iter__():
+            if counts.get(item_tuple[-1]):
+                counts[item_tuple[-1]] -= 1
+                item_tuples.append(item_tuple)
+        return item_tuples
 
     # order + removal
     def poppush(self, item):
-        if item in self._item_set:
+        if item in self._item_set and not self.duplicates:
             raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
         self._item_set.add(item)
-        while self[0][1] not in self._item_set:
+        while self[0][-1] not in self._item_set:
             heappop(self)
-        return_item = heapreplace(self, (self.key(item), item))[1]
+        if self._counter is None:
+            return_item = heapreplace(self, (self.key(item), item))[-1]
+        else:
+            return_item = heapreplace(self, (self.key(item), next(self._counter), item))[-1]
         self._item_set.remove(return_item)
         return return_item
     replace = poppush
 
     # order + removal
     def pushpop(self, item):
-        if item in self._item_set:
+        if item in self._item_set and not self.duplicates:
             raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
         self._item_set.add(item)
-        return_item = heappushpop(self, (self.key(item), item))[1]
+        if self._counter is None:
+            return_item = heappushpop(self, (self.key(item), item))[-1]
+        else:
+            return_item = heappushpop(self, (self.key(item), next(self._counter), item))[-1]
         while return_item not in self._item_set:
-            return_item = heappop(self)[1]
+            return_item = heappop(self)[-1]
         self._item_set.remove(return_item)
         return return_item
 
@@ -258,8 +924,1742 @@ class XHeap(Heap):
         return len(self._item_set)
 
     def __repr__(self):
+        if self.duplicates:
+            return 'XHeap({content}, key={key}, duplicates=True)'.format(content=list(self), key=self.key)
         return 'XHeap({content}, key={key})'.format(content=list(self), key=self.key)
 
 
+class ConcurrentXHeap(XHeap):
+    """
+    Thread-safe XHeap; all methods hold a single lock. Like queue.PriorityQueue, pop can block until an item arrives.
+    Keys are computed outside of the lock to keep contention low; producers should prefer push_many for batches.
+    """
+
+    def __init__(self, iterable=[], key=None, stable=False, duplicates=False, sweep_ratio=0.5, sweep_step=None, executor=None):
+        self._lock = threading.RLock()
+        self._not_empty = threading.Condition(self._lock)
+        super(ConcurrentXHeap, self).__init__(iterable, key=key, stable=stable, duplicates=duplicates, sweep_ratio=sweep_ratio, sweep_step=sweep_step, executor=executor)
+
+    def _snapshot(self):
+        with self._lock:
+            entries, state = super(ConcurrentXHeap, self)._snapshot()
+        del state['_lock'], state['_not_empty']
+        return entries, state
+
+    def _restore(self, entries, state):
+        self._lock = threading.RLock()
+        self._not_empty = threading.Condition(self._lock)
+        super(ConcurrentXHeap, self)._restore(entries, state)
+
+    def peek(self):
+        with self._lock:
+            return super(ConcurrentXHeap, self).peek()
+
+    def push(self, item):
+        key = self.key(item)
+        with self._lock:
+            if item in self._item_set and not self.duplicates:
+                raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
+            if self._counter is None:
+                heappush(self, (key, item))
+            else:
+                heappush(self, (key, next(self._counter), item))
+            self._item_set.add(item)
+            self._not_empty.notify()
+
+    def push_many(self, iterable):
+        _list = list(iterable)
+        item_tuples = _item_tuples(self.key, self._counter, _list, self.executor)
+        with self._lock:
+            self._push_many(_list, item_tuples)
+            self._not_empty.notify(len(_list))
+
+    def merge(self, other):
+        with self._lock:
+            super(ConcurrentXHeap, self).merge(other)
+            self._not_empty.notify_all()
+
+    def pop(self, block=True, timeout=None):
+        """
+        Pops the smallest item. If block is true, waits until an item is available or timeout (in seconds, None means
+        forever) has passed; then raises queue.Empty like queue.PriorityQueue.get. Never blocks if block is false.
+        """
+        with self._lock:
+            item_set = self._item_set
+            if not item_set:
+                if not block:
+                    raise Empty
+                if timeout is None:
+                    while not item_set:
+                        self._not_empty.wait()
+                elif timeout < 0:
+                    raise ValueError('timeout must be a non-negative number')
+                else:
+                    end_time = _monotonic() + timeout
+                    while not item_set:
+                        remaining = end_time - _monotonic()
+                        if remaining <= 0.0:
+                            raise Empty
+                        self._not_empty.wait(remaining)
+            return_item = heappop(self)[-1]
+            while return_item not in item_set:
+                return_item = heappop(self)[-1]
+            item_set.remove(return_item)
+            super(ConcurrentXHeap, self).sweep()
+            return return_item
+
+    def pop_many(self, k):
+        """Pops the k smallest items (or all if there are less) under one lock hold; never blocks."""
+        with self._lock:
+            return super(ConcurrentXHeap, self).pop_many(k)
+
+    def drain(self):
+        """Pops and yields all items in order; the lock is released while the caller processes an item."""
+        while True:
+            with self._lock:
+                if not self._item_set:
+                    return
+                return_item = super(ConcurrentXHeap, self).pop()
+            yield return_item
+
+    def iter_sorted(self):
+        """Yields all items in order as of now; as the lock cannot be held in between, they are copied beforehand."""
+        return iter(self.nsmallest(len(self._item_set)))
+
+    def nsmallest(self, k):
+        with self._lock:
+            return list(islice(super(ConcurrentXHeap, self).iter_sorted(), k))
+
+    def remove(self, item):
+        with self._lock:
+            super(ConcurrentXHeap, self).remove(item)
+
+    def sweep(self):
+        with self._lock:
+            super(ConcurrentXHeap, self).sweep()
+
+    def poppush(self, item):
+        with self._lock:
+            return super(ConcurrentXHeap, self).poppush(item)
+    replace = poppush
+
+    def pushpop(self, item):
+        with self._lock:
+            return super(ConcurrentXHeap, self).pushpop(item)
+
+    def check_invariant(self):
+        with self._lock:
+            super(ConcurrentXHeap, self).check_invariant()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._item_set))
+
+    def __contains__(self, item):
+        with self._lock:
+            return item in self._item_set
+
+    def __len__(self):
+        with self._lock:
+            return len(self._item_set)
+
+    def __repr__(self):
+        return 'Concurrent' + super(ConcurrentXHeap, self).__repr__()
+
+
+class AsyncXHeap(XHeap):
+    """
+    XHeap for asyncio; await heap.pop() suspends until an item is available. Like asyncio.Queue, each pushed item
+    wakes (at most) one waiting pop, first come, first served; the woken pop takes the item itself once it resumes.
+    So, if it is cancelled in between, the item stays in the heap and wakes the next pop. Not thread-safe; use it
+    from within the event loop only.
+    """
+
+    def __init__(self, iterable=[], key=None, stable=False, duplicates=False, sweep_ratio=0.5, sweep_step=None, executor=None):
+        if asyncio is None:
+            raise ImportError('AsyncXHeap requires asyncio')
+        self._waiters = deque()
+        super(AsyncXHeap, self).__init__(iterable, key=key, stable=stable, duplicates=duplicates, sweep_ratio=sweep_ratio, sweep_step=sweep_step, executor=executor)
+
+    def _snapshot(self):
+        entries, state = super(AsyncXHeap, self)._snapshot()
+        del state['_waiters']
+        return entries, state
+
+    def _restore(self, entries, state):
+        self._waiters = deque()
+        super(AsyncXHeap, self)._restore(entries, state)
+
+    def push(self, item):
+        super(AsyncXHeap, self).push(item)
+        self._wake_waiters()
+
+    def push_many(self, iterable):
+        super(AsyncXHeap, self).push_many(iterable)
+        self._wake_waiters()
+
+    def merge(self, other):
+        super(AsyncXHeap, self).merge(other)
+        self._wake_waiters()
+
+    def pop(self):
+        """Returns an awaitable of the smallest item; it waits until an item is pushed if empty."""
+        return _AsyncPop(self)
+
+    def pop_nowait(self):
+        """Pops the smallest item right away; raises asyncio.QueueEmpty if empty."""
+        if not self._item_set:
+            raise asyncio.QueueEmpty
+        return super(AsyncXHeap, self).pop()
+
+    def _wake_waiters(self):
+        """Wakes one waiting pop per item; the waiters only get a signal, not the item."""
+        waiters = self._waiters
+        woken = 0
+        while waiters and woken < len(self._item_set):
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                woken += 1
+
+    def __repr__(self):
+        return 'Async' + super(AsyncXHeap, self).__repr__()
+
+
+class _AsyncPop(object):
+    """
+    Awaitable of AsyncXHeap.pop. It is an iterator instead of a coroutine to keep this module parseable by Python 2:
+    it yields a waiter future to the task until an item is available and pops that item when the task resumes.
+    """
+
+    def __init__(self, heap):
+        self._heap = heap
+        self._waiter = None
+
+    def __await__(self):
+        return self
+    __iter__ = __await__
+
+    def __next__(self):
+        return self.send(None)
+    next = __next__
+
+    def send(self, value):
+        heap = self._heap
+        if heap._item_set:
+            self._waiter = None
+            raise StopIteration(XHeap.pop(heap))
+        self._waiter = _get_event_loop().create_future()
+        self._waiter._asyncio_future_blocking = True
+        heap._waiters.append(self._waiter)
+        return self._waiter
+
+    def throw(self, exc_type, exc_value=None, traceback=None):
+        self.close()
+        if exc_value is None:
+            exc_value = exc_type() if isinstance(exc_type, type) else exc_type
+        raise exc_value
+
+    def close(self):
+        """Gives up waiting; passes a wake-up on if this pop was woken but did not take the item."""
+        waiter, self._waiter = self._waiter, None
+        if waiter is None:
+            return
+        if waiter.done() and not waiter.cancelled():
+            self._heap._wake_waiters()
+        else:
+            waiter.cancel()
+
+
+class ShardedXHeap(object):
+    """
+    ShardedXHeap spreads its items over worker processes (shards), each holding an XHeap, to use more than one core
+    for key calls, sifting and sweeping. Items are routed to shards by hash; so, remove and in go to the owning shard
+    only. The coordinator caches the top of each shard in a small heap; pop picks the best shard from there and costs
+    one round trip. Each call to a worker costs a pipe round trip (~25us); push_many and pop_many amortize that by
+    talking to all shards at once. Items and keys must be picklable; the workers are forked, so the key needn't be.
+    Items with equal keys on different shards are popped in arbitrary order. Call close (or use with) to stop the
+    workers.
+    """
+
+    def __init__(self, iterable=[], key=None, shards=None, duplicates=False, sweep_ratio=0.5, sweep_step=None):
+        if not key:
+            raise RuntimeError('specify key when using ShardedXHeap')
+        self.key = key
+        self.shards = shards or multiprocessing.cpu_count()
+        context = multiprocessing.get_context('fork') if hasattr(multiprocessing, 'get_context') else multiprocessing
+        self._connections = []
+        self._processes = []
+        for _ in range(self.shards):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_shard_worker, args=(worker_connection, key, duplicates, sweep_ratio, sweep_step))
+            process.daemon = True
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._lens = [0]*self.shards
+        self._versions = [0]*self.shards
+        self._tops = []
+        self.push_many(iterable)
+
+    def peek(self):
+        self._top_shard()
+        return self._tops[0][0][-1]
+
+    def push(self, item):
+        self._call(self._shard(item), 'push', item)
+
+    def push_many(self, iterable):
+        """Pushes all items; each shard computes the keys of its items in parallel."""
+        batches = [[] for _ in range(self.shards)]
+        for item in iterable:
+            batches[self._shard(item)].append(item)
+        self._call_many(dict((shard, ('push_many', batch)) for shard, batch in enumerate(batches) if batch))
+
+    def pop(self):
+        return self._call(self._top_shard(), 'pop')
+
+    def pop_many(self, k):
+        """Pops the k smallest items (or all if there are less) with two round trips to all shards."""
+        smallest = self._call_many(dict((shard, ('_nsmallest_entries', k)) for shard in range(self.shards) if self._lens[shard]))
+        merged = sorted((entry, shard) for shard, entries in smallest.items() for entry in entries)[:k]
+        counts = {}
+        for _, shard in merged:
+            counts[shard] = counts.get(shard, 0) + 1
+        self._call_many(dict((shard, ('pop_many', count)) for shard, count in counts.items()))
+        return [entry[-1] for entry, _ in merged]
+
+    def drain(self):
+        while self:
+            yield self.pop()
+
+    def remove(self, item):
+        self._call(self._shard(item), 'remove', item)
+
+    def check(self):
+        self.check_invariant()
+
+    def check_invariant(self):
+        self._call_many(dict((shard, ('check_invariant',)) for shard in range(self.shards)))
+
+    def close(self):
+        """Stops the workers; the items are lost."""
+        for connection in self._connections:
+            connection.send(('close', ()))
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+        self._lens = [0]*self.shards
+        self._tops = []
+
+    def _shard(self, item):
+        return hash(item) % self.shards
+
+    def _top_shard(self):
+        """Returns the shard with the smallest top; drops outdated tops from the coordinator heap."""
+        tops, versions = self._tops, self._versions
+        while tops and tops[0][2] != versions[tops[0][1]]:
+            heappop(tops)
+        if not tops:
+            raise IndexError('index out of range')
+        return tops[0][1]
+
+    def _call(self, shard, method, *args):
+        self._connections[shard].send((method, args))
+        return self._receive(shard)
+
+    def _call_many(self, calls):
+        """Sends all calls (shard -> (method, args...)) at once and returns the results by shard."""
+        for shard, call in calls.items():
+            self._connections[shard].send((call[0], call[1:]))
+        results, errors = {}, []
+        for shard in calls:
+            try:
+                results[shard] = self._receive(shard)
+            except Exception as exc:
+                errors.append(exc)
+        if errors:
+            raise errors[0]
+        return results
+
+    def _receive(self, shard):
+        error, result, top, length = self._connections[shard].recv()
+        self._lens[shard] = length
+        self._versions[shard] += 1
+        if top is not None:
+            heappush(self._tops, (top, shard, self._versions[shard]))
+            if len(self._tops) > 4*self.shards:
+                self._tops = [entry for entry in self._tops if entry[2] == self._versions[entry[1]]]
+                heapify(self._tops)
+        if error is not None:
+            raise error
+        return result
+
+    def __contains__(self, item):
+        return self._call(self._shard(item), '__contains__', item)
+
+    def __len__(self):
+        return sum(self._lens)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return 'ShardedXHeap({length} items, shards={shards}, key={key})'.format(length=len(self), shards=self.shards, key=self.key)
+
+
+class IndexHeap(Heap):
+    """
+    IndexHeap is an XHeap that keeps track of the position of each item in the heap; useful when
+        - users cancel or reprioritize a large fraction of the items
+        - you need decrease-key+increase-key (e.g. Dijkstra, A*)
+    remove, update, decrease_key and increase_key sift in O(log n) and leave no tombstones behind.
+
+    Unlike the other heaps, it stores a mutable entry per item instead of a tuple. Each entry remembers its position;
+    so, sifting does not need to update a dict and key changes are done in place. Entries only compare keys; items
+    with equal keys pop in arbitrary order unless stable=True.
+    """
+
+    def __init__(self, iterable=[], key=None, stable=False, executor=None):
+        if not key:
+            raise RuntimeError('specify key when using IndexHeap; otherwise, just use RemovalHeap')
+        self.key = key
+        self.executor = executor
+        self._counter = count() if stable else None
+        self._index = {}
+        _list = list(iterable)
+        super(IndexHeap, self).__init__(self._entries(_item_tuples(key, self._counter, _list, executor)))
+        if len(_list) != len(self._index):
+            raise RuntimeError('duplicate items not allowed: {_list}'.format(_list=_list))
+
+    def peek(self):
+        return self[0].item
+
+    def push(self, item):
+        if item in self._index:
+            raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
+        entry = _IndexEntry(self._sort_key(item), item)
+        self._index[item] = entry
+        self.append(entry)
+        self._sift_up(super(Heap, self).__len__()-1)
+
+    def push_many(self, iterable):
+        _list = list(iterable)
+        self._push_many(_list, self._entries(_item_tuples(self.key, self._counter, _list, self.executor)))
+
+    def merge(self, other):
+        item_tuples = _merged_item_tuples(self, other)
+        if item_tuples is None:
+            return super(IndexHeap, self).merge(other)
+        self._push_many([item_tuple[-1] for item_tuple in item_tuples], self._entries(item_tuples))
+
+    def _push_many(self, _list, entries):
+        if len(_list) != len(set(_list)) or any(item in self._index for item in _list):
+            raise RuntimeError('duplicate items not allowed: {_list}'.format(_list=_list))
+        if len(entries) < super(Heap, self).__len__():
+            for entry in entries:
+                self._index[entry.item] = entry
+                self.append(entry)
+                self._sift_up(super(Heap, self).__len__()-1)
+        else:
+            self.extend(entries)
+            self.heapify()
+
+    def _alive_item_tuples(self):
+        """Returns the (key, item) tuples or (key, count, item) tuples for stable heaps of all items."""
+        if self._counter is None:
+            return [(entry.key, entry.item) for entry in super(Heap, self).__iter__()]
+        return [(entry.key[0], entry.key[1], entry.item) for entry in super(Heap, self).__iter__()]
+
+    def pop(self):
+        last_entry = super(Heap, self).pop()
+        if not self:
+            del self._index[last_entry.item]
+            return last_entry.item
+        return_item = self[0].item
+        del self._index[return_item]
+        self[0] = last_entry
+        self._sift_down(0)
+        return return_item
+
+    def pop_many(self, k):
+        if 3*k < super(Heap, self).__len__():
+            return [self.pop() for _ in range(k)]
+        self.sort()
+        return_items = [entry.item for entry in self[:k]]
+        del self[:k]
+        self.heapify()
+        return return_items
+
+    def drain(self):
+        while self:
+            yield self.pop()
+
+    def iter_sorted(self):
+        return (entry.item for entry in _iter_sorted(self))
+
+    def remove(self, item):
+        index = self._index.pop(item).index
+        last_entry = super(Heap, self).pop()
+        if index == super(Heap, self).__len__():
+            return
+        self[index] = last_entry
+        self._sift(index)
+
+    def update(self, item):
+        """Restores the heap invariant after the key of item has changed (either direction)."""
+        entry = self._index[item]
+        entry.key = self._rekeyed(entry)
+        self._sift(entry.index)
+
+    def decrease_key(self, item):
+        """Restores the heap invariant after the key of item has decreased."""
+        entry = self._index[item]
+        key = self._rekeyed(entry)
+        if entry.key < key:
+            raise RuntimeError('key of item increased: {item}'.format(item=item))
+        entry.key = key
+        self._sift_up(entry.index)
+
+    def increase_key(self, item):
+        """Restores the heap invariant after the key of item has increased."""
+        entry = self._index[item]
+        key = self._rekeyed(entry)
+        if key < entry.key:
+            raise RuntimeError('key of item decreased: {item}'.format(item=item))
+        entry.key = key
+        self._sift_down(entry.index)
+
+    def heapify(self):
+        heapify(self)
+        self._reindex()
+
+    def _snapshot(self):
+        state = self._snapshot_state()
+        del state['_index']
+        return _packed_entries(self._alive_item_tuples(), True), state
+
+    def _restore(self, entries, state):
+        self.__dict__.update(state)
+        if state['_counter'] is not None:
+            self._counter = count(state['_counter'])
+        self.extend(self._entries(entries))
+        self._reindex()
+
+    def _reindex(self):
+        self._index = {}
+        for index, entry in enumerate(super(Heap, self).__iter__()):
+            entry.index = index
+            self._index[entry.item] = entry
+
+    def poppush(self, item):
+        if item in self._index:
+            raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
+        return_item = self[0].item
+        del self._index[return_item]
+        entry = _IndexEntry(self._sort_key(item), item)
+        self._index[item] = entry
+        self[0] = entry
+        self._sift_down(0)
+        return return_item
+    replace = poppush
+
+    def pushpop(self, item):
+        if item in self._index:
+            raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
+        entry = _IndexEntry(self._sort_key(item), item)
+        if not self or not self[0].key < entry.key:
+            return item
+        return_item = self[0].item
+        del self._index[return_item]
+        self._index[item] = entry
+        self[0] = entry
+        self._sift_down(0)
+        return return_item
+
+    def check_invariant(self):
+        super(IndexHeap, self).check_invariant()
+        for index, entry in enumerate(super(Heap, self).__iter__()):
+            if self._index.get(entry.item) is not entry or entry.index != index:
+                raise InvalidHeapError('index of {item} violated: {wrong} != {index}'.format(item=entry.item, wrong=entry.index, index=index))
+
+    def _entries(self, item_tuples):
+        """Returns an entry for each (key, item) tuple or (key, count, item) tuple for stable heaps."""
+        if self._counter is None:
+            return [_IndexEntry(item_tuple[0], item_tuple[-1]) for item_tuple in item_tuples]
+        return [_IndexEntry(item_tuple[:2], item_tuple[-1]) for item_tuple in item_tuples]
+
+    def _sort_key(self, item):
+        """Returns the key of a new item; stable heaps add the next sequence number."""
+        if self._counter is None:
+            return self.key(item)
+        return self.key(item), next(self._counter)
+
+    def _rekeyed(self, entry):
+        """Returns the freshly computed key of entry; stable heaps keep the original sequence number."""
+        if self._counter is None:
+            return self.key(entry.item)
+        return self.key(entry.item), entry.key[1]
+
+    def _sift(self, index):
+        if index and self[index].key < self[(index-1) >> 1].key:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    def _sift_up(self, index):
+        entry = self[index]
+        key = entry.key
+        while index:
+            parent_index = (index-1) >> 1
+            parent = self[parent_index]
+            if not key < parent.key:
+                break
+            self[index] = parent
+            parent.index = index
+            index = parent_index
+        self[index] = entry
+        entry.index = index
+
+    def _sift_down(self, index):
+        entry = self[index]
+        key = entry.key
+        end_index = super(Heap, self).__len__()
+        child_index = 2*index + 1
+        while child_index < end_index:
+            child = self[child_index]
+            right_index = child_index + 1
+            if right_index < end_index:
+                right = self[right_index]
+                if right.key < child.key:
+                    child_index, child = right_index, right
+            if not child.key < key:
+                break
+            self[index] = child
+            child.index = index
+            index = child_index
+            child_index = 2*index + 1
+        self[index] = entry
+        entry.index = index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def __repr__(self):
+        return 'IndexHeap({content}, key={key})'.format(content=list(self), key=self.key)
+
+
+class _IndexEntry(object):
+    """Entry of an IndexHeap; compares keys only and remembers its position in the heap."""
+
+    __slots__ = ('key', 'item', 'index')
+
+    def __init__(self, key, item):
+        self.key = key
+        self.item = item
+        self.index = None
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __repr__(self):
+        return '({key!r}, {item!r})'.format(key=self.key, item=self.item)
+
+
+class PairingHeap(object):
+    """
+    PairingHeap is a node-based heap with O(1) push, meld and decrease_key (amortized); useful for decrease-key-heavy
+    workloads like Dijkstra or A* where XHeap would pile up tombstones. Like IndexHeap, it supports remove, update,
+    decrease_key and increase_key for unique items. Only keys are compared; items with equal keys pop in arbitrary order.
+    """
+
+    def __init__(self, iterable=[], key=None):
+        self.key = key
+        self._root = None
+        self._index = {}
+        self.push_many(iterable)
+
+    def peek(self):
+        if self._root is None:
+            raise IndexError('peek from empty heap')
+        return self._root.item
+
+    def push(self, item):
+        if item in self._index:
+            raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
+        node = _PairingNode(item if self.key is None else self.key(item), item)
+        self._index[item] = node
+        self._root = node if self._root is None else _meld(self._root, node)
+
+    def push_many(self, iterable):
+        for item in iterable:
+            self.push(item)
+
+    def merge(self, other):
+        """Pushes all items of the other heap into this heap; the other heap stays untouched."""
+        self.push_many(other)
+
+    def meld(self, other):
+        """Moves all items of the other PairingHeap (with the same key) into this heap in O(1); the other heap is emptied."""
+        if other.key != self.key:
+            raise RuntimeError('cannot meld heaps of different keys: {key} != {other_key}'.format(key=self.key, other_key=other.key))
+        if any(item in self._index for item in other._index):
+            raise RuntimeError('duplicate items not allowed: {other}'.format(other=other))
+        if other._root is not None:
+            self._index.update(other._index)
+            self._root = other._root if self._root is None else _meld(self._root, other._root)
+        other._root = None
+        other._index = {}
+
+    def pop(self):
+        if self._root is None:
+            raise IndexError('pop from empty heap')
+        root = self._root
+        del self._index[root.item]
+        self._root = _merge_pairs(root.child)
+        return root.item
+
+    def pop_many(self, k):
+        return [self.pop() for _ in range(min(k, len(self._index)))]
+
+    def drain(self):
+        while self._root is not None:
+            yield self.pop()
+
+    def iter_sorted(self):
+        """
+        Yields all items in order without changing the heap; walks down the tree with a frontier heap of nodes. Each
+        item costs O(d log k) where d is the number of its children; so, the first pops after many pushes are costly.
+        """
+        if self._root is None:
+            return
+        counter = count()
+        frontier = [(self._root.key, next(counter), self._root)]
+        while frontier:
+            node = heappop(frontier)[-1]
+            yield node.item
+            child = node.child
+            while child is not None:
+                heappush(frontier, (child.key, next(counter), child))
+                child = child.sibling
+
+    def nsmallest(self, k):
+        return list(islice(self.iter_sorted(), k))
+
+    def remove(self, item):
+        node = self._index.pop(item)
+        if node is self._root:
+            self._root = _merge_pairs(node.child)
+            return
+        _cut(node)
+        subheap = _merge_pairs(node.child)
+        if subheap is not None:
+            self._root = _meld(self._root, subheap)
+
+    def update(self, item):
+        """Restores the heap invariant after the key of item has changed (either direction)."""
+        node = self._index[item]
+        key = item if self.key is None else self.key(item)
+        if key < node.key:
+            self._decrease_key(node, key)
+        elif node.key < key:
+            self._increase_key(node, key)
+
+    def decrease_key(self, item):
+        """Restores the heap invariant after the key of item has decreased."""
+        node = self._index[item]
+        key = item if self.key is None else self.key(item)
+        if node.key < key:
+            raise RuntimeError('key of item increased: {item}'.format(item=item))
+        self._decrease_key(node, key)
+
+    def increase_key(self, item):
+        """Restores the heap invariant after the key of item has increased."""
+        node = self._index[item]
+        key = item if self.key is None else self.key(item)
+        if key < node.key:
+            raise RuntimeError('key of item decreased: {item}'.format(item=item))
+        self._increase_key(node, key)
+
+    def poppush(self, item):
+        if item in self._index:
+            raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
+        return_item = self.pop()
+        self.push(item)
+        return return_item
+    replace = poppush
+
+    def pushpop(self, item):
+        if item in self._index:
+            raise RuntimeError('duplicate item not allowed: {item}'.format(item=item))
+        if self._root is None or not self._root.key < (item if self.key is None else self.key(item)):
+            return item
+        return self.poppush(item)
+
+    def check(self):
+        self.check_invariant()
+
+    def check_invariant(self):
+        if self._root is None:
+            return
+        nodes = [self._root]
+        while nodes:
+            node = nodes.pop()
+            if self._index.get(node.item) is not node:
+                raise InvalidHeapError('index of {item} violated'.format(item=node.item))
+            child, prev = node.child, node
+            while child is not None:
+                if child.prev is not prev:
+                    raise InvalidHeapError('links of {item} violated'.format(item=child.item))
+                if child.key < node.key:
+                    raise InvalidHeapError('heap invariant (parent <= child) violated: {parent} !<= {item}'.format(parent=node.item, item=child.item))
+                nodes.append(child)
+                child, prev = child.sibling, child
+
+    def _decrease_key(self, node, key):
+        node.key = key
+        if node is not self._root:
+            _cut(node)
+            self._root = _meld(self._root, node)
+
+    def _increase_key(self, node, key):
+        if node is self._root:
+            self._root = _merge_pairs(node.child)
+        else:
+            _cut(node)
+            subheap = _merge_pairs(node.child)
+            if subheap is not None:
+                self._root = _meld(self._root, subheap)
+        node.key = key
+        node.child = None
+        self._root = node if self._root is None else _meld(self._root, node)
+
+    def __ior__(self, other):
+        self.merge(other)
+        return self
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return 'PairingHeap({content}, key={key})'.format(content=list(self), key=self.key)
+
+
+class TimerHeap(object):
+    """
+    TimerHeap schedules payloads by deadline; built for timeouts which are mostly cancelled before they expire.
+    schedule returns a handle; cancel marks it in O(1) without any hashing (unlike XHeap.remove) and sweeps the
+    cancelled handles once less than sweep_ratio of the heap is alive. Payloads with equal deadlines expire in
+    scheduling order.
+    """
+
+    def __init__(self, sweep_ratio=0.5):
+        self.sweep_ratio = sweep_ratio
+        self._heap = []
+        self._counter = count()
+        self._active = 0
+
+    def schedule(self, deadline, payload):
+        """Schedules payload to expire at deadline; returns the handle to cancel it."""
+        handle = _TimerHandle((deadline, next(self._counter), payload, True))
+        heappush(self._heap, handle)
+        self._active += 1
+        return handle
+
+    def cancel(self, handle):
+        """Cancels the handle; returns False if it has already expired or been cancelled."""
+        if not handle[3]:
+            return False
+        handle[3] = False
+        self._active -= 1
+        if self._active < self.sweep_ratio*len(self._heap):
+            self.sweep()
+        return True
+
+    def expire(self, now):
+        """Returns the payloads of all timers with deadline <= now in deadline order."""
+        heap = self._heap
+        return_payloads = []
+        while heap and heap[0][0] <= now:
+            handle = heappop(heap)
+            if handle[3]:
+                handle[3] = False
+                return_payloads.append(handle[2])
+        self._active -= len(return_payloads)
+        return return_payloads
+
+    def iter_sorted(self):
+        """Yields the handles of all active timers in deadline order without changing the heap."""
+        return (handle for handle in _iter_sorted(self._heap) if handle[3])
+
+    def nsmallest(self, k):
+        """Returns the handles of the next k timers to expire."""
+        return list(islice(self.iter_sorted(), k))
+
+    def next_deadline(self):
+        """Returns the earliest deadline of all timers or None if there is none."""
+        heap = self._heap
+        while heap and not heap[0][3]:
+            heappop(heap)
+        return heap[0][0] if heap else None
+
+    def sweep(self):
+        if self._active < self.sweep_ratio*len(self._heap):
+            self._heap = [handle for handle in self._heap if handle[3]]
+            heapify(self._heap)
+
+    def check(self):
+        self.check_invariant()
+
+    def check_invariant(self):
+        heap = self._heap
+        for index in range(len(heap)-1, 0, -1):
+            parent_index = (index-1) >> 1
+            if heap[index] < heap[parent_index]:
+                raise InvalidHeapError('heap invariant (heap[{parent_index}] <= heap[{index}]) violated: {parent} !<= {item}'.format(parent=heap[parent_index], parent_index=parent_index, item=heap[index], index=index))
+        active = sum(1 for handle in heap if handle[3])
+        if active != self._active:
+            raise InvalidHeapError('number of active timers violated: {active} != {_active}'.format(active=active, _active=self._active))
+
+    def __iter__(self):
+        """Yields the handles of all active timers in arbitrary order."""
+        return (handle for handle in self._heap if handle[3])
+
+    def __len__(self):
+        return self._active
+
+    def __repr__(self):
+        return 'TimerHeap({content})'.format(content=sorted(self))
+
+
+class _TimerHandle(list):
+    """
+    [deadline, sequence number, payload, active] of a timer; compares like a list (deadline, then scheduling order).
+    It has no __init__ of its own as that would slow down schedule considerably.
+    """
+
+    __slots__ = ()
+
+    @property
+    def deadline(self):
+        return self[0]
+
+    @property
+    def payload(self):
+        return self[2]
+
+    @property
+    def active(self):
+        return self[3]
+
+    def __repr__(self):
+        return '<timer {payload!r} at {deadline!r}>'.format(payload=self[2], deadline=self[0])
+
+
+class ArrayHeap(object):
+    """
+    ArrayHeap is a heap of (key, payload) pairs with float64 keys and int64 payloads stored in two NumPy arrays
+    (16 bytes per entry instead of 100+ bytes for an OrderHeap tuple); requires NumPy.
+    push_many and pop_many are vectorized, single pushes and pops are not. Items with equal keys pop in arbitrary order.
+
+    Heap Invariant: keys[k] <= keys[2*k+1] and keys[k] <= keys[2*k+2]
+    """
+
+    def __init__(self, keys=(), payloads=(), capacity=16):
+        if numpy is None:
+            raise ImportError('ArrayHeap requires numpy')
+        self._keys = numpy.empty(capacity, dtype=numpy.float64)
+        self._payloads = numpy.empty(capacity, dtype=numpy.int64)
+        self._size = 0
+        self.push_many(keys, payloads)
+
+    def peek(self):
+        if not self._size:
+            raise IndexError('peek from empty heap')
+        return self._keys[0].item(), self._payloads[0].item()
+
+    def push(self, key, payload):
+        self._reserve(self._size + 1)
+        self._size += 1
+        self._sift_up(self._size - 1, key, payload)
+
+    def push_many(self, keys, payloads):
+        """Pushes all pairs at once; sorts the whole heap (a sorted array is a valid heap) instead of pushing pair by pair if the batch is large."""
+        keys = numpy.asarray(keys, dtype=numpy.float64).ravel()
+        payloads = numpy.asarray(payloads, dtype=numpy.int64).ravel()
+        if len(keys) != len(payloads):
+            raise RuntimeError('keys and payloads differ in length: {keys} != {payloads}'.format(keys=len(keys), payloads=len(payloads)))
+        if 512*len(keys) < self._size:
+            for key, payload in zip(keys.tolist(), payloads.tolist()):
+                self.push(key, payload)
+            return
+        size = self._size + len(keys)
+        self._reserve(size)
+        self._keys[self._size:size] = keys
+        self._payloads[self._size:size] = payloads
+        self._size = size
+        self._sort()
+
+    def merge(self, other):
+        """Pushes all pairs of the other heap into this heap; the other heap stays untouched."""
+        self.push_many(other._keys[:other._size], other._payloads[:other._size])
+
+    def pop(self):
+        if not self._size:
+            raise IndexError('pop from empty heap')
+        return_pair = self._keys[0].item(), self._payloads[0].item()
+        self._size -= 1
+        if self._size:
+            self._sift_down(0, self._keys[self._size].item(), self._payloads[self._size].item())
+        return return_pair
+
+    def pop_many(self, k):
+        """Pops the k smallest pairs (or all if there are less) as arrays of keys and payloads; sorts instead of popping pair by pair if k is large."""
+        k = min(k, self._size)
+        if 512*k < self._size:
+            keys, payloads = zip(*[self.pop() for _ in range(k)]) if k else ((), ())
+            return numpy.array(keys, dtype=numpy.float64), numpy.array(payloads, dtype=numpy.int64)
+        self._sort()
+        keys, payloads = self._keys[:k].copy(), self._payloads[:k].copy()
+        self._size -= k
+        self._keys[:self._size] = self._keys[k:k+self._size]
+        self._payloads[:self._size] = self._payloads[k:k+self._size]
+        return keys, payloads
+
+    def drain(self):
+        while self._size:
+            yield self.pop()
+
+    def iter_sorted(self):
+        """Yields all (key, payload) pairs in order without changing the heap; walks down with a frontier heap of indices."""
+        keys, payloads, size = self._keys, self._payloads, self._size
+        if not size:
+            return
+        frontier = [(keys[0].item(), 0)]
+        while frontier:
+            key, index = heappop(frontier)
+            yield key, payloads[index].item()
+            for child_index in range(2*index + 1, min(2*index + 3, size)):
+                heappush(frontier, (keys[child_index].item(), child_index))
+
+    def nsmallest(self, k):
+        """Returns the k smallest pairs as arrays of keys and payloads without changing the heap; partitions the arrays if k is large."""
+        k = min(k, self._size)
+        if 512*k < self._size:
+            pairs = list(islice(self.iter_sorted(), k))
+            return numpy.array([pair[0] for pair in pairs], dtype=numpy.float64), numpy.array([pair[1] for pair in pairs], dtype=numpy.int64)
+        keys = self._keys[:self._size]
+        indices = numpy.argpartition(keys, k-1)[:k] if 0 < k < self._size else numpy.arange(k)
+        indices = indices[numpy.argsort(keys[indices])]
+        return keys[indices], self._payloads[indices]
+
+    def remove(self, payload):
+        """Removes one pair with the given payload; the lookup is a vectorized O(n) scan."""
+        positions = numpy.flatnonzero(self._payloads[:self._size] == payload)
+        if not len(positions):
+            raise KeyError(payload)
+        index = positions[0].item()
+        self._size -= 1
+        if index == self._size:
+            return
+        key, payload = self._keys[self._size].item(), self._payloads[self._size].item()
+        if index and key < self._keys[(index-1) >> 1]:
+            self._sift_up(index, key, payload)
+        else:
+            self._sift_down(index, key, payload)
+
+    def poppush(self, key, payload):
+        if not self._size:
+            raise IndexError('pop from empty heap')
+        return_pair = self._keys[0].item(), self._payloads[0].item()
+        self._sift_down(0, key, payload)
+        return return_pair
+    replace = poppush
+
+    def pushpop(self, key, payload):
+        if not self._size or not self._keys[0] < key:
+            return key, payload
+        return self.poppush(key, payload)
+
+    def check(self):
+        self.check_invariant()
+
+    def check_invariant(self):
+        keys = self._keys[:self._size]
+        violated = numpy.flatnonzero(keys[1:] < keys[(numpy.arange(1, self._size)-1) >> 1])
+        if len(violated):
+            index = violated[0].item() + 1
+            parent_index = (index-1) >> 1
+            raise InvalidHeapError('heap invariant (keys[{parent_index}] <= keys[{index}]) violated: {parent} !<= {key}'.format(parent=keys[parent_index], parent_index=parent_index, key=keys[index], index=index))
+
+    def _reserve(self, size):
+        """Grows the arrays geometrically to hold at least size pairs."""
+        capacity = len(self._keys)
+        if size <= capacity:
+            return
+        capacity = max(size, 2*capacity)
+        for name in ('_keys', '_payloads'):
+            old_array = getattr(self, name)
+            new_array = numpy.empty(capacity, dtype=old_array.dtype)
+            new_array[:self._size] = old_array[:self._size]
+            setattr(self, name, new_array)
+
+    def _sort(self):
+        order = numpy.argsort(self._keys[:self._size])
+        self._keys[:self._size] = self._keys[:self._size][order]
+        self._payloads[:self._size] = self._payloads[:self._size][order]
+
+    def _sift_up(self, index, key, payload):
+        keys, payloads = self._keys, self._payloads
+        while index:
+            parent_index = (index-1) >> 1
+            if not key < keys[parent_index]:
+                break
+            keys[index] = keys[parent_index]
+            payloads[index] = payloads[parent_index]
+            index = parent_index
+        keys[index] = key
+        payloads[index] = payload
+
+    def _sift_down(self, index, key, payload):
+        keys, payloads = self._keys, self._payloads
+        size = self._size
+        child_index = 2*index + 1
+        while child_index < size:
+            right_index = child_index + 1
+            if right_index < size and keys[right_index] < keys[child_index]:
+                child_index = right_index
+            if not keys[child_index] < key:
+                break
+            keys[index] = keys[child_index]
+            payloads[index] = payloads[child_index]
+            index = child_index
+            child_index = 2*index + 1
+        keys[index] = key
+        payloads[index] = payload
+
+    def __ior__(self, other):
+        self.merge(other)
+        return self
+
+    def __iter__(self):
+        return iter(self._payloads[:self._size].tolist())
+
+    def __contains__(self, payload):
+        return bool(numpy.any(self._payloads[:self._size] == payload))
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return 'ArrayHeap({keys}, {payloads})'.format(keys=self._keys[:self._size].tolist(), payloads=self._payloads[:self._size].tolist())
+
+
+class CompactHeap(array):
+    """
+    CompactHeap is a heap of ints or floats stored unboxed in an array.array of the given typecode; e.g. 'd' takes
+    8 bytes per item where a Heap (list) of floats takes 32. It needs no NumPy but cannot use the C implementation
+    of heapq (which only works on lists); thus, push and pop are slower than Heap's.
+
+    Heap Invariant: a[k] <= a[2*k+1] and a[k] <= a[2*k+2]
+    """
+
+    def __new__(cls, iterable=[], typecode='d'):
+        return super(CompactHeap, cls).__new__(cls, str(typecode))
+
+    def __init__(self, iterable=[], typecode='d'):
+        self.extend(iterable)
+        self.heapify()
+
+    def peek(self):
+        return self[0]
+
+    def push(self, item):
+        self.append(item)
+        self._sift_up(len(self)-1)
+
+    def push_many(self, iterable):
+        """Pushes all items at once; heapifies instead of pushing item by item if the batch outgrows the heap."""
+        items = array(self.typecode, iterable)
+        if len(items) < len(self):
+            for item in items:
+                self.push(item)
+        else:
+            self.extend(items)
+            self.heapify()
+
+    def merge(self, other):
+        """Pushes all items of the other heap into this heap; the other heap stays untouched."""
+        self.push_many(other)
+
+    def pop(self):
+        last_item = super(CompactHeap, self).pop()
+        if not self:
+            return last_item
+        return_item = self[0]
+        self[0] = last_item
+        self._sift_down(0)
+        return return_item
+
+    def pop_many(self, k):
+        """Pops the k smallest items (or all if there are less); sorts instead of popping item by item if k is large."""
+        if 3*k < len(self):
+            return [self.pop() for _ in range(k)]
+        self[:] = array(self.typecode, sorted(self))
+        return_items = self[:k].tolist()
+        del self[:k]
+        return return_items
+
+    def drain(self):
+        while self:
+            yield self.pop()
+
+    def iter_sorted(self):
+        """Yields all items in order without changing the heap; walks down the heap with a frontier heap of indices."""
+        return _iter_sorted(self)
+
+    def nsmallest(self, k):
+        return list(islice(self.iter_sorted(), k))
+
+    def remove(self, item):
+        raise NotImplementedError
+
+    def heapify(self):
+        """Heapifies a temporary list with heapq's C implementation; much faster than sifting in pure Python."""
+        items = self.tolist()
+        heapify(items)
+        self[:] = array(self.typecode, items)
+
+    def poppush(self, item):
+        return_item = self[0]
+        self[0] = item
+        self._sift_down(0)
+        return return_item
+    replace = poppush
+
+    def pushpop(self, item):
+        if self and self[0] < item:
+            item, self[0] = self[0], item
+            self._sift_down(0)
+        return item
+
+    def check(self):
+        self.check_invariant()
+
+    def check_invariant(self):
+        for index in range(len(self)-1, 0, -1):
+            parent_index = (index-1) >> 1
+            if self[index] < self[parent_index]:
+                raise InvalidHeapError('heap invariant (heap[{parent_index}] <= heap[{index}]) violated: {parent} !<= {item}'.format(parent=self[parent_index], parent_index=parent_index, item=self[index], index=index))
+
+    def _sift_up(self, index):
+        item = self[index]
+        while index:
+            parent_index = (index-1) >> 1
+            parent = self[parent_index]
+            if not item < parent:
+                break
+            self[index] = parent
+            index = parent_index
+        self[index] = item
+
+    def _sift_down(self, index):
+        """Moves the item down to a leaf along the smaller children, then back up (like heapq); saves comparisons."""
+        end_index = len(self)
+        start_index = index
+        item = self[index]
+        child_index = 2*index + 1
+        while child_index < end_index:
+            right_index = child_index + 1
+            if right_index < end_index and not self[child_index] < self[right_index]:
+                child_index = right_index
+            self[index] = self[child_index]
+            index = child_index
+            child_index = 2*index + 1
+        while index > start_index:
+            parent_index = (index-1) >> 1
+            parent = self[parent_index]
+            if not item < parent:
+                break
+            self[index] = parent
+            index = parent_index
+        self[index] = item
+
+    def __ior__(self, other):
+        self.merge(other)
+        return self
+
+    def __repr__(self):
+        return 'CompactHeap({content}, typecode={typecode!r})'.format(content=self.tolist(), typecode=str(self.typecode))
+
+
+class ExternalHeap(object):
+    """
+    ExternalHeap holds more items than fit into memory. It buffers up to buffer_size items in a Heap; once the buffer
+    is full, it is sorted and spilled to a temporary file as a run of pickled blocks of block_size items. pop takes
+    the smallest of the buffer and the heads of all runs; runs are read block by block through mmap (or through
+    files buffered with io_size bytes if use_mmap=False). Once there are more than max_runs runs, all of them are
+    merged into one. Items must be picklable; like OrderHeap, items with equal keys are compared with each other.
+
+    Run files are deleted once they are read completely; call close (or use a with block) to delete the rest.
+    """
+
+    def __init__(self, iterable=[], key=None, buffer_size=2**20, block_size=2**12, io_size=2**20, max_runs=64, directory=None, use_mmap=True):
+        if buffer_size < 1 or block_size < 1 or max_runs < 1:
+            raise RuntimeError('buffer_size, block_size and max_runs must be at least 1: {sizes}'.format(sizes=(buffer_size, block_size, max_runs)))
+        self.key = key
+        self.buffer_size = buffer_size
+        self.block_size = block_size
+        self.io_size = io_size
+        self.max_runs = max_runs
+        self.directory = directory
+        self.use_mmap = use_mmap
+        self._buffer = Heap()
+        self._runs = []
+        self._counter = count()
+        self._len = 0
+        self.push_many(iterable)
+
+    def peek(self):
+        buffer, runs = self._buffer, self._runs
+        if runs and (not buffer or runs[0][0] < buffer[0]):
+            entry = runs[0][0]
+        else:
+            entry = buffer[0]
+        return entry if self.key is None else entry[-1]
+
+    def push(self, item):
+        if super(Heap, self._buffer).__len__() >= self.buffer_size:
+            self._spill()
+        heappush(self._buffer, item if self.key is None else (self.key(item), item))
+        self._len += 1
+
+    def push_many(self, iterable):
+        """Pushes all items; fills the buffer in batches and spills it whenever it is full."""
+        key = self.key
+        entries = iter(iterable) if key is None else ((key(item), item) for item in iterable)
+        while True:
+            room = self.buffer_size - super(Heap, self._buffer).__len__()
+            batch = list(islice(entries, max(room, 1)))
+            if not batch:
+                break
+            if not room:
+                self._spill()
+            self._buffer.push_many(batch)
+            self._len += len(batch)
+
+    def pop(self):
+        buffer, runs = self._buffer, self._runs
+        if runs and (not buffer or runs[0][0] < buffer[0]):
+            entry, order, run = runs[0]
+            try:
+                heapreplace(runs, (next(run), order, run))
+            except StopIteration:
+                heappop(runs)
+        else:
+            entry = heappop(buffer)
+        self._len -= 1
+        return entry if self.key is None else entry[-1]
+
+    def pop_many(self, k):
+        """Pops the k smallest items (or all if there are less)."""
+        return [self.pop() for _ in range(min(k, self._len))]
+
+    def drain(self):
+        while self._len:
+            yield self.pop()
+
+    def close(self):
+        """Deletes all run files and empties the heap."""
+        for _, _, run in self._runs:
+            run.close()
+        self._runs = []
+        self._buffer = Heap()
+        self._len = 0
+
+    def check(self):
+        self.check_invariant()
+
+    def check_invariant(self):
+        self._buffer.check_invariant()
+
+    def _spill(self):
+        self._buffer.sort()
+        self._write_run(self._buffer)
+        self._buffer = Heap()
+        if len(self._runs) > self.max_runs:
+            runs = [chain([entry], run) for entry, _, run in self._runs]
+            self._runs = []
+            self._write_run(heapq_merge(*runs))
+
+    def _write_run(self, sorted_entries):
+        handle, path = tempfile.mkstemp(prefix='xheap-', suffix='.run', dir=self.directory)
+        with os.fdopen(handle, 'wb', self.io_size) as run_file:
+            entries = iter(sorted_entries)
+            block = list(islice(entries, self.block_size))
+            while block:
+                pickle.dump(block, run_file, pickle.HIGHEST_PROTOCOL)
+                block = list(islice(entries, self.block_size))
+        run = _read_run(path, self.use_mmap, self.io_size)
+        heappush(self._runs, (next(run), next(self._counter), run))
+
+    def __len__(self):
+        return self._len
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return 'ExternalHeap({length} items, {runs} runs, key={key})'.format(length=self._len, runs=len(self._runs), key=self.key)
+
+
+def merge_iter(*heaps, **kwargs):
+    """
+    Lazily yields the items of all heaps (ordered by key) in global order; O(log k) per item for k heaps.
+    A heap is consumed: each item is popped from its heap just before it is yielded; so, the remaining items stay
+    in their heaps if you stop early. Pass consume=False to read the heaps via iter_sorted instead.
+    Sorted iterables (lists, generators, files, ...) can be merged as well; they are just iterated.
+    All sources must be sorted ascending by key (which defaults to the items themselves).
+    """
+    key = kwargs.pop('key', None)
+    consume = kwargs.pop('consume', True)
+    if kwargs:
+        raise TypeError('unexpected keyword arguments: {kwargs}'.format(kwargs=', '.join(sorted(kwargs))))
+    merge_heap = []
+    for order, heap in enumerate(heaps):
+        if consume and hasattr(heap, 'peek') and hasattr(heap, 'pop'):
+            if heap:
+                item = heap.peek()
+                merge_heap.append((item if key is None else key(item), order, heap, None))
+            continue
+        iterator = heap.iter_sorted() if hasattr(heap, 'iter_sorted') else iter(heap)
+        for item in iterator:
+            merge_heap.append((item if key is None else key(item), order, item, iterator))
+            break
+    heapify(merge_heap)
+    while merge_heap:
+        _, order, source, iterator = merge_heap[0]
+        if iterator is None:
+            yield source.pop()
+            if source:
+                next_item = source.peek()
+                heapreplace(merge_heap, (next_item if key is None else key(next_item), order, source, None))
+            else:
+                heappop(merge_heap)
+            continue
+        yield source
+        for next_item in iterator:
+            heapreplace(merge_heap, (next_item if key is None else key(next_item), order, next_item, iterator))
+            break
+        else:
+            heappop(merge_heap)
+
+
+class _PairingNode(object):
+    """Node of a PairingHeap; prev links to the previous sibling or to the parent for the first child."""
+
+    __slots__ = ('key', 'item', 'child', 'sibling', 'prev')
+
+    def __init__(self, key, item):
+        self.key = key
+        self.item = item
+        self.child = None
+        self.sibling = None
+        self.prev = None
+
+
+def _meld(root, other_root):
+    """Melds two detached pairing heap roots and returns the new root."""
+    if other_root.key < root.key:
+        root, other_root = other_root, root
+    other_root.sibling = root.child
+    if root.child is not None:
+        root.child.prev = other_root
+    other_root.prev = root
+    root.child = other_root
+    return root
+
+
+def _merge_pairs(node):
+    """Melds the list of siblings starting at node in two passes and returns the new root."""
+    roots = []
+    while node is not None:
+        other_node = node.sibling
+        if other_node is None:
+            node.prev = node.sibling = None
+            roots.append(node)
+            break
+        next_node = other_node.sibling
+        node.prev = node.sibling = other_node.prev = other_node.sibling = None
+        roots.append(_meld(node, other_node))
+        node = next_node
+    if not roots:
+        return None
+    root = roots.pop()
+    while roots:
+        root = _meld(roots.pop(), root)
+    return root
+
+
+def _cut(node):
+    """Detaches the subheap rooted at node from its parent and siblings."""
+    if node.prev.child is node:
+        node.prev.child = node.sibling
+    else:
+        node.prev.sibling = node.sibling
+    if node.sibling is not None:
+        node.sibling.prev = node.prev
+    node.prev = node.sibling = None
+
+
+class _Multiset(dict):
+    """Set of items which counts the occurrences of each item; len counts all occurrences."""
+
+    def __init__(self, iterable=()):
+        super(_Multiset, self).__init__()
+        self._len = 0
+        self.update(iterable)
+
+    def add(self, item):
+        self[item] = self.get(item, 0) + 1
+        self._len += 1
+
+    def remove(self, item):
+        item_count = self[item]
+        if item_count == 1:
+            del self[item]
+        else:
+            self[item] = item_count - 1
+        self._len -= 1
+
+    def update(self, iterable):
+        for item in iterable:
+            self.add(item)
+
+    def __iter__(self):
+        for item, item_count in dict.items(self):
+            for _ in range(item_count):
+                yield item
+
+    def __len__(self):
+        return self._len
+
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+def _get_event_loop():
+    """Returns the running event loop or (outside of coroutines) the current one."""
+    try:
+        return asyncio.get_running_loop()
+    except (AttributeError, RuntimeError):
+        return asyncio.get_event_loop()
+
+
+def _first(item_tuple):
+    return item_tuple[0]
+
+
+def _item_tuples(key, counter, iterable, executor=None):
+    """Returns the list of (key, item) tuples or (key, count, item) tuples for stable heaps."""
+    _list = list(iterable)
+    keys = map(key, _list) if executor is None else _executor_keys(key, _list, executor)
+    if counter is None:
+        return list(zip(keys, _list))
+    return list(zip(keys, counter, _list))
+
+
+_key_chunk_size = 2**12
+
+
+def _executor_keys(key, _list, executor):
+    """Returns the keys of all items in order; computed in chunks of _key_chunk_size items on executor."""
+    chunks = [_list[index:index+_key_chunk_size] for index in range(0, len(_list), _key_chunk_size)]
+    return chain.from_iterable(executor.map(partial(_chunk_keys, key), chunks))
+
+
+def _chunk_keys(key, chunk):
+    return list(map(key, chunk))
+
+
+def _merged_item_tuples(heap, other):
+    """Returns the item tuples of other to be pushed into heap or None if other is not ordered by the same key."""
+    if not isinstance(other, (OrderHeap, XHeap, IndexHeap)) or other.key != heap.key:
+        return None
+    item_tuples = other._alive_item_tuples() if isinstance(other, (XHeap, IndexHeap)) else other[:]
+    if heap._counter is None and other._counter is None:
+        return item_tuples
+    if heap._counter is None:
+        return [(item_tuple[0], item_tuple[-1]) for item_tuple in item_tuples]
+    return [(item_tuple[0], next(heap._counter), item_tuple[-1]) for item_tuple in item_tuples]
+
+
+def _iter_sorted(heap, arity=2, frontier_class=None):
+    """
+    Yields the entries of heap (a list/array with the heap invariant) in order by walking a frontier of indices.
+    The frontier is a plain heapq list unless frontier_class (e.g. MaxHeap for max-heaps) is given.
+    """
+    size = list.__len__(heap) if isinstance(heap, list) else len(heap)
+    if not size:
+        return
+    if frontier_class is None:
+        frontier = [(heap[0], 0)]
+        pop, push = partial(heappop, frontier), partial(heappush, frontier)
+    else:
+        frontier = frontier_class([(heap[0], 0)])
+        pop, push = frontier.pop, frontier.push
+    while frontier:
+        entry, index = pop()
+        yield entry
+        first_child_index = arity*index + 1
+        for child_index in range(first_child_index, min(first_child_index+arity, size)):
+            push((heap[child_index], child_index))
+
+
+def _alive_items(items, item_set, duplicates):
+    """Yields the items which are alive; i.e. at most as many occurrences of each item as item_set counts."""
+    yielded = {}
+    for item in items:
+        alive_count = item_set.get(item, 0) if duplicates else int(item in item_set)
+        yielded_count = yielded.get(item, 0)
+        if yielded_count < alive_count:
+            yielded[item] = yielded_count + 1
+            yield item
+
+
+def _restored(cls, entries, state):
+    """Returns a heap of cls from packed entries and attributes without calling __init__, key or heapify."""
+    heap = cls.__new__(cls)
+    heap._restore(_unpacked_entries(entries), state)
+    return heap
+
+
+def _packed_entries(entries, keyed):
+    """Returns the entries as one packed column or, for keyed heaps, a tuple of packed columns of the entry tuples."""
+    if not keyed:
+        return _packed(entries)
+    width = len(entries[0]) if entries else 0
+    return tuple(_packed(list(map(itemgetter(index), entries))) for index in range(width))
+
+
+def _unpacked_entries(entries):
+    if isinstance(entries, tuple):
+        return list(zip(*[_unpacked(column) for column in entries]))
+    return _unpacked(entries)
+
+
+def _packed(column):
+    """Returns an array if all values are floats or all are ints (8 bytes each and a single blob to pickle)."""
+    for typecode, value_type in (('d', float), ('q', int)):
+        if all(type(value) is value_type for value in column):
+            try:
+                return array(typecode, column)
+            except (OverflowError, ValueError):
+                return column
+    return column
+
+
+def _unpacked(column):
+    return column.tolist() if isinstance(column, array) else column
+
+
+def _shard_worker(connection, key, duplicates, sweep_ratio, sweep_step):
+    """Serves the calls of a ShardedXHeap; replies (error, result, top entry, length) to each."""
+    heap = XHeap(key=key, duplicates=duplicates, sweep_ratio=sweep_ratio, sweep_step=sweep_step)
+    while True:
+        method, args = connection.recv()
+        if method == 'close':
+            connection.close()
+            return
+        error = result = None
+        try:
+            if method == '_nsmallest_entries':
+                result = [(key(item), item) for item in heap.nsmallest(*args)]
+            else:
+                result = getattr(heap, method)(*args)
+        except Exception as exc:
+            error = exc
+        top = None
+        if heap:
+            heap.peek()
+            top = heap[0]
+        connection.send((error, result, top, len(heap)))
+
+
+def _read_run(path, use_mmap, io_size):
+    """Yields the entries of a run file block by block; deletes the file once it is read completely or closed."""
+    run_file = open(path, 'rb', io_size)
+    try:
+        reader = mmap.mmap(run_file.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else run_file
+        try:
+            while True:
+                try:
+                    block = pickle.load(reader)
+                except EOFError:
+                    return
+                for entry in block:
+                    yield entry
+        finally:
+            reader.close()
+    finally:
+        run_file.close()
+        os.remove(path)
+
+
+def _siftup(heap, pos):
+    """Same as heapq._siftup but does not rely on len(heap) which removal heaps override."""
+    end_pos = list.__len__(heap)
+    start_pos = pos
+    new_item = heap[pos]
+    child_pos = 2*pos + 1
+    while child_pos < end_pos:
+        right_pos = child_pos + 1
+        if right_pos < end_pos and not heap[child_pos] < heap[right_pos]:
+            child_pos = right_pos
+        heap[pos] = heap[child_pos]
+        pos = child_pos
+        child_pos = 2*pos + 1
+    heap[pos] = new_item
+    _siftdown(heap, start_pos, pos)
+
+
+def _sweep_chunk(heap, alive, index, step):
+    """
+    Removes the tombstones from heap[index-step:index] by moving live items from the end of the heap into their slots.
+    Returns the index to continue with or 0 when the heap has been swept completely.
+    """
+    stop_index = max(index-step, 0)
+    index = min(index, list.__len__(heap))
+    while index > stop_index:
+        index -= 1
+        while index < list.__len__(heap) and not alive(heap[index]):
+            last_item = list.pop(heap)
+            if index == list.__len__(heap):
+                break
+            heap[index] = last_item
+            if index and last_item < heap[(index-1) >> 1]:
+                _siftdown(heap, 0, index)
+            else:
+                _siftup(heap, index)
+    return index
+
+
 class InvalidHeapError(RuntimeError):
     pass